@@ -0,0 +1,163 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from .timesheet import Timesheet
+
+def call(overrides, method, *args):
+    """Run a Timesheet method on a new timesheet, in a worker thread or process.
+
+    Every call gets its own timesheet, so calls running in parallel don't
+    share loaded records or database connections.
+
+    :param dict overrides: User defined configuration values, see :class:`Timesheet`
+    :param str method: Name of the method
+    :param args: Arguments of the method
+    :return: Result of the method
+    """
+    timesheet = Timesheet(**overrides)
+    try:
+        return getattr(timesheet, method)(*args)
+    finally:
+        timesheet.close()
+
+def load(overrides, year, month):
+    """Returns the records of a month, in a worker thread.
+
+    :param dict overrides: User defined configuration values, see :class:`Timesheet`
+    :param int year: Year of the month
+    :param int month: Month number, 1-12
+    :rtype: :class:`RecordStore`
+    """
+    timesheet = Timesheet(**overrides)
+    try:
+        return timesheet.storage.load(year, month)
+    finally:
+        timesheet.close()
+
+class AsyncTimesheet(object):
+    """asyncio facade of :class:`Timesheet` that never blocks the event loop.
+
+    Records are read and written in a thread pool, workbooks are built in a
+    process pool running at most 'export_workers' exports at once. Changes
+    are written one at a time, loads of a month wait for its pending
+    changes, and concurrent loads of the same month share one read.
+    Cancelling an export that didn't start yet drops it, a running one
+    finishes in its worker process.
+
+        async with AsyncTimesheet(records_dir="/srv/records") as timesheet:
+            await timesheet.add_record(date, work_hours, break_time, "", False)
+            await timesheet.export(date)
+    """
+    def __init__(self, io_workers=None, export_workers=2, **overrides):
+        """Constructor.
+
+        :param int io_workers: Number of threads reading and writing records,
+            defaults to the ThreadPoolExecutor default
+        :param int export_workers: Number of processes building workbooks
+        :param overrides: User defined configuration values, see :class:`Timesheet`
+        :raises ValueError: If a key of overrides cannot be configured
+        """
+        Timesheet(**overrides)
+        self.overrides = overrides
+        self.export_workers = export_workers
+        self._threads = ThreadPoolExecutor(max_workers=io_workers)
+        self._processes = None
+        self._exports = asyncio.Semaphore(export_workers)
+        self._writer = asyncio.Lock()
+        self._months = {}
+        self._loads = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def month_lock(self, year, month):
+        """Returns the lock held while a month is read or written."""
+        return self._months.setdefault((year, month), asyncio.Lock())
+
+    async def in_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._threads, function, *args)
+
+    async def load_records(self, date):
+        """Returns the records of the month of a date.
+
+        Concurrent calls for the same month share one read and get the same
+        records object, which must not be changed.
+
+        :param datetime.date date: Date in the month, day is not relevant
+        :rtype: :class:`RecordStore`
+        """
+        key = (date.year, date.month)
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(*key))
+            self._loads[key] = task
+            task.add_done_callback(lambda _: self._loads.pop(key, None))
+        # a cancelled caller must not cancel the read the others wait for
+        return await asyncio.shield(task)
+
+    async def _load(self, year, month):
+        async with self.month_lock(year, month):
+            return await self.in_thread(load, self.overrides, year, month)
+
+    async def write(self, date, method, *args):
+        """Run a Timesheet method changing the records of a month, one change at a time."""
+        async with self._writer, self.month_lock(date.year, date.month):
+            return await self.in_thread(call, self.overrides, method, *args)
+
+    async def add_record(self, date, work_hours, break_time, comment, special):
+        """See :meth:`Timesheet.add_record`."""
+        return await self.write(date, "add_record", date, work_hours, break_time, comment, special)
+
+    async def update_record(self, date, work_hours, break_time, comment, special):
+        """See :meth:`Timesheet.update_record`."""
+        return await self.write(date, "update_record", date, work_hours, break_time, comment, special)
+
+    async def delete_record(self, date):
+        """See :meth:`Timesheet.delete_record`."""
+        return await self.write(date, "delete_record", date)
+
+    async def export(self, date, target=None, force=False):
+        """Export the timesheet of a month in a worker process, see :meth:`Timesheet.export`."""
+        if target is None or isinstance(target, (str, os.PathLike)):
+            return await self.in_process("export", date, target, force)
+        return await self.deliver(await self.in_process("export", date, bytes), target)
+
+    async def export_range(self, start, end, single_workbook=False, target=None, force=False):
+        """Export a range of months in a worker process, see :meth:`Timesheet.export_range`."""
+        if target is None or isinstance(target, (str, os.PathLike)):
+            return await self.in_process("export_range", start, end, single_workbook, target, force)
+        content = await self.in_process("export_range", start, end, single_workbook, bytes)
+        return [await self.deliver(content[0], target)]
+
+    async def deliver(self, content, target):
+        """Hand a workbook built in a worker process over to a target.
+
+        :param bytes content: Content of the workbook
+        :param target: bytes, memoryview or binary file object, which is
+            written in a worker thread
+        """
+        if target is bytes:
+            return content
+        if target is memoryview:
+            return memoryview(content)
+        await self.in_thread(target.write, content)
+        return target
+
+    async def in_process(self, method, *args):
+        """Run an exporting Timesheet method in the process pool."""
+        async with self._exports:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.export_workers)
+            return await asyncio.get_running_loop().run_in_executor(
+                self._processes, call, self.overrides, method, *args)
+
+    async def close(self):
+        """Wait for pending work and shut the worker pools down."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._threads.shutdown)
+        if self._processes is not None:
+            await loop.run_in_executor(None, self._processes.shutdown)
@@ -0,0 +1,362 @@
+import os
+import re
+import sys
+import mmap
+import struct
+from array import array
+from contextlib import ExitStack
+from operator import attrgetter
+from .records import Record
+from .records import RecordStore
+from .storage import file_lock
+from .storage import file_version
+from .storage import lock_location
+from .storage import sync_directory
+from .storage import temp_location
+
+class Archive(object):
+    """Records of the closed months of one year, stored column by column.
+
+    The file starts with a header holding the number of records and the
+    index of every month's first record, followed by fixed width little
+    endian arrays of date ordinals, times and special flags, the offsets of
+    every comment and the comments as one UTF-8 string table. The file is
+    mapped into memory and the columns are read through memoryviews, so
+    loading a month neither parses nor copies the other months.
+    """
+    magic = b"TSA1"
+    # magic, number of records, index of the first record of months 1-12 and the end
+    header = struct.Struct("<4sI13I")
+    # (name, typecode), times are minutes since midnight
+    columns = (("ordinal", "i"), ("start_day", "h"), ("end_day", "h"),
+               ("start_break", "h"), ("end_break", "h"), ("special", "B"))
+
+    def __init__(self, file):
+        """Constructor, maps the archive file into memory.
+
+        :param str file: Name of the archive file
+        :raises ValueError: If the file is not an archive
+        """
+        self.file = file
+        with open(file, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, self.count, *self.starts = self.header.unpack_from(self._view)
+        if magic != self.magic:
+            self.close()
+            raise ValueError("{} is not a timesheet archive".format(file))
+        offset = self.align(self.header.size)
+        self._columns = {}
+        for name, typecode in self.columns + (("comment", "I"),):
+            count = self.count + 1 if name == "comment" else self.count
+            size = array(typecode).itemsize * count
+            self._columns[name] = self.column(offset, size, typecode)
+            offset = self.align(offset + size)
+        self._strings = offset
+
+    @staticmethod
+    def align(offset):
+        """Returns the offset rounded up to the next multiple of 4."""
+        return (offset + 3) & ~3
+
+    def column(self, offset, size, typecode):
+        """Returns a column of the mapped file as memoryview, or as array on big endian machines."""
+        view = self._view[offset:offset + size].cast(typecode)
+        if sys.byteorder == "little":
+            return view
+        swapped = array(typecode, view)
+        swapped.byteswap()
+        return swapped
+
+    def months(self):
+        """Returns the sorted month numbers that have records in the archive."""
+        return [month for month in range(1, 13) if self.starts[month] > self.starts[month - 1]]
+
+    def month_columns(self, month):
+        """Returns the columns of a month's records, sorted by date.
+
+        :param int month: Month number, 1-12
+        :return: Dictionary {column: sequence of int}, without the comments
+        """
+        first, last = self.starts[month - 1], self.starts[month]
+        return {name: self._columns[name][first:last] for name, _ in self.columns}
+
+    def load(self, month):
+        """Returns the records of a month.
+
+        :param int month: Month number, 1-12
+        :rtype: :class:`RecordStore`
+        """
+        first, last = self.starts[month - 1], self.starts[month]
+        offsets = self._columns["comment"][first:last + 1]
+        strings = self._view[self._strings + offsets[0]:self._strings + offsets[-1]]
+        comments = [bytes(strings[begin - offsets[0]:end - offsets[0]]).decode("utf-8")
+                    for begin, end in zip(offsets[:-1], offsets[1:])]
+        columns = self.month_columns(month)
+        return RecordStore(map(Record, columns["ordinal"], columns["start_day"], columns["end_day"],
+                               columns["start_break"], columns["end_break"], comments,
+                               map(bool, columns["special"])))
+
+    def close(self):
+        """Unmap the archive file."""
+        self._columns = {}
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # columns handed out are still in use, the mapping goes with them
+            pass
+
+    @classmethod
+    def write(cls, file, months):
+        """Write an archive file atomically, through a temporary file of its own.
+
+        :param str file: Name of the archive file
+        :param dict months: Records of every month to archive, {month: RecordStore}
+        """
+        records = []
+        starts = [0]
+        for month in range(1, 13):
+            records.extend(months.get(month, ()))
+            starts.append(len(records))
+        comments = [record.comment.encode("utf-8") for record in records]
+        offsets = array("I", [0])
+        for comment in comments:
+            offsets.append(offsets[-1] + len(comment))
+        chunks = [cls.header.pack(cls.magic, len(records), *starts)]
+        for name, typecode in cls.columns:
+            chunks.append(array(typecode, map(int, map(attrgetter(name), records))))
+        chunks.append(offsets)
+        temp_file = temp_location(file)
+        try:
+            with open(temp_file, "wb") as f:
+                for chunk in chunks:
+                    if isinstance(chunk, array):
+                        if sys.byteorder != "little":
+                            chunk.byteswap()
+                        chunk = chunk.tobytes()
+                    f.write(chunk)
+                    f.write(b"\0" * (cls.align(f.tell()) - f.tell()))
+                f.write(b"".join(comments))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        sync_directory(os.path.dirname(file))
+
+class ArchiveStorage(object):
+    """Storage backend wrapper that reads closed months from yearly archives.
+
+    Archived months are loaded from the archive of their year, all other
+    months from the wrapped backend. Changing an archived month moves it
+    back into the backend, so archives never hold stale records.
+    """
+    def __init__(self, backend, config):
+        """Constructor.
+
+        :param backend: Storage backend holding the open months
+        :param config: Timesheet configuration
+        :type config: :class:`configparser.ConfigParser`
+        """
+        self.backend = backend
+        self.config = config
+        # opened archives, {year: (file version, Archive or None)}
+        self._archives = {}
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def archive_location(self, year):
+        """Returns the name of the archive file of a year.
+
+        :param int year: Year
+        """
+        return os.path.join(self.config.get("user_defined", "records_dir"),
+                            self.config.get("user_defined", "archive_name").format(year))
+
+    def year_lock(self, year):
+        """Returns a context manager holding the write lock of a year's archive,
+        see :func:`file_lock`.
+
+        :param int year: Year
+        """
+        name = os.path.basename(self.archive_location(year)) + ".lock"
+        return file_lock(lock_location(self.config, name))
+
+    def archive(self, year):
+        """Returns the archive of a year or None if there is none.
+
+        The archive is opened again whenever its file was written, created or
+        removed since, e.g. by another process archiving months.
+
+        :param int year: Year
+        :rtype: :class:`Archive`
+        """
+        file = self.archive_location(year)
+        version = file_version(file)
+        cached = self._archives.get(year)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        self.forget_archive(year)
+        try:
+            archive = None if version is None else Archive(file)
+        except FileNotFoundError:
+            # removed since, the changed version opens it again next time
+            archive = None
+        self._archives[year] = (version, archive)
+        return archive
+
+    def forget_archive(self, year):
+        """Unmap the archive of a year, it's opened again when needed.
+
+        :param int year: Year
+        """
+        cached = self._archives.pop(year, None)
+        if cached is not None and cached[1] is not None:
+            cached[1].close()
+
+    def archived(self, year, month):
+        """Returns True if a month is in the archive of its year."""
+        archive = self.archive(year)
+        return archive is not None and month in archive.months()
+
+    def archive_years(self):
+        """Returns sorted list of years that have an archive file."""
+        prefix, suffix = self.config.get("user_defined", "archive_name").split("{}")
+        pattern = re.compile(r"{}(\d{{4}}){}$".format(re.escape(prefix), re.escape(suffix)))
+        try:
+            names = os.listdir(self.config.get("user_defined", "records_dir"))
+        except FileNotFoundError:
+            return []
+        return sorted(int(match.group(1)) for match in map(pattern.match, names) if match)
+
+    def months(self):
+        """Returns sorted list of (year, month) tuples that have records."""
+        months = set(self.backend.months())
+        for year in self.archive_years():
+            archive = self.archive(year)
+            if archive is not None:
+                months.update((year, month) for month in archive.months())
+        return sorted(months)
+
+    def version(self, year, month):
+        """Returns a value that changes whenever the records of a month are written,
+        by the backend or into the archive of its year."""
+        return (self.backend.version(year, month), file_version(self.archive_location(year)))
+
+    def load(self, year, month):
+        """Returns the records of a month, from the archive if it's archived.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :rtype: :class:`RecordStore`
+        """
+        if self.archived(year, month):
+            return self.archive(year).load(month)
+        return self.backend.load(year, month)
+
+    def month_columns(self, year, month):
+        """Returns the records of a month as columns, see :meth:`Archive.month_columns`.
+
+        Archived months are read straight from the archive without creating records.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        if self.archived(year, month):
+            return self.archive(year).month_columns(month)
+        records = list(self.backend.load(year, month))
+        return {name: array(typecode, map(int, map(attrgetter(name), records)))
+                for name, typecode in Archive.columns}
+
+    def apply(self, year, month, records, changes):
+        """Persist changes made to the records of a month, see the backend's apply."""
+        if self.archived(year, month):
+            self.unarchive(year, month, records)
+        else:
+            self.backend.apply(year, month, records, changes)
+
+    def save(self, year, month, records):
+        """Replace all records of a month, see the backend's save."""
+        if self.archived(year, month):
+            self.unarchive(year, month, records)
+        else:
+            self.backend.save(year, month, records)
+
+    def unarchive(self, year, month, records):
+        """Move a month out of its archive into the backend.
+
+        The caller holds the month's write lock, the year's lock is taken
+        after it, in the same order as :meth:`archive_months` takes them.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month
+        :type records: :class:`RecordStore`
+        """
+        with self.year_lock(year):
+            self.backend.save(year, month, records)
+            archive = self.archive(year)
+            if archive is not None and month in archive.months():
+                kept = {other: archive.load(other) for other in archive.months() if other != month}
+                self.write_archive(year, kept)
+
+    def archive_months(self, months):
+        """Move months from the backend into the archives of their years.
+
+        Every year's archive is rewritten once with its archived months and
+        the new ones, then the new months are removed from the backend. The
+        write locks of the months are held throughout, then the year's lock,
+        so writers of those months wait instead of losing their changes.
+
+        :param list months: (year, month) tuples to archive
+        :return: Number of archived months
+        """
+        years = {}
+        for year, month in months:
+            years.setdefault(year, []).append(month)
+        count = 0
+        for year, year_months in sorted(years.items()):
+            with ExitStack() as locks:
+                for month in sorted(year_months):
+                    locks.enter_context(self.backend.lock(year, month))
+                locks.enter_context(self.year_lock(year))
+                archive = self.archive(year)
+                content = {}
+                if archive is not None:
+                    content = {month: archive.load(month) for month in archive.months()}
+                moved = []
+                for month in year_months:
+                    records = self.backend.load(year, month)
+                    if len(records):
+                        content[month] = records
+                        moved.append(month)
+                if moved:
+                    self.write_archive(year, content)
+                    for month in moved:
+                        self.backend.save(year, month, RecordStore())
+            count += len(moved)
+        return count
+
+    def write_archive(self, year, months):
+        """Write the archive of a year, removing it if there are no months left.
+
+        :param int year: Year
+        :param dict months: Records of every month to archive, {month: RecordStore}
+        """
+        self.forget_archive(year)
+        file = self.archive_location(year)
+        if any(len(records) for records in months.values()):
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            Archive.write(file, months)
+        elif os.path.isfile(file):
+            os.remove(file)
+
+    def close(self):
+        """Close the backend and unmap all archives."""
+        for year in list(self._archives):
+            self.forget_archive(year)
+        self.backend.close()
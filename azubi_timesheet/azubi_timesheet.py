@@ -9,14 +9,23 @@ Export and print at the end of the month!
 
 import os
 import sys
+import json
+import time
 import argparse
 import datetime
+from . import timings
 from .timesheet import Timesheet
+from .timesheet import TimesheetError
 
 __author__ = "Elisei Roca"
 __version__ = "0.9.1"
 __prog__ = os.path.basename(sys.argv[0])
 
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# output formats of report and query
+FORMATS = ("table", "csv", "json")
+QUERY_FIELDS = ("date", "work_hours", "break_time", "hours", "special", "comment")
+
 def execute(args):
     """Checks which subcommand was given and executes it.
 
@@ -25,21 +34,98 @@ def execute(args):
     """
     timesheet = Timesheet()
     if args.subcommand == "add":
-        if not timesheet.add_record(args.date, args.work_hours, args.break_time, args.comment, args.special):
+        if not run(timesheet, "add_record", date=args.date, work_hours=args.work_hours,
+                   break_time=args.break_time, comment=args.comment, special=args.special):
             print("Exiting. Record already exists.")
             sys.exit(1)
+        warn_day_off(timesheet, args.date)
     elif args.subcommand == "update":
-        if not timesheet.update_record(args.date, args.work_hours, args.break_time, args.comment, args.special):
+        if not run(timesheet, "update_record", date=args.date, work_hours=args.work_hours,
+                   break_time=args.break_time, comment=args.comment, special=args.special):
             print("Exiting. Record with given date not found.")
             sys.exit(1)
+        warn_day_off(timesheet, args.date)
     elif args.subcommand == "delete":
-        if not timesheet.delete_record(args.date):
+        if not run(timesheet, "delete_record", date=args.date):
             print("Exiting. Record with given date not found.")
             sys.exit(1)
     elif args.subcommand == "export":
-        if not timesheet.export(args.date):
+        if args.stdout:
+            # streamed by this process, the daemon can't write to our stdout
+            if args.from_month:
+                timesheet.export_range(args.from_month, args.to_month, True, target=sys.stdout.buffer)
+            else:
+                timesheet.export(args.date, target=sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        elif args.from_month:
+            run(timesheet, "export_range", start=args.from_month, end=args.to_month,
+                single_workbook=args.single_workbook, force=args.force)
+        elif not run(timesheet, "export", date=args.date, force=args.force):
             print("Exiting. No idea why yet.")
             sys.exit(1)
+    elif args.subcommand == "serve":
+        from .daemon import serve
+        serve(args.socket or timesheet.socket_location())
+    elif args.subcommand == "import":
+        try:
+            conflicts = timesheet.import_records(read_rows(args.file, args.file_format))
+        except (OSError, ValueError) as error:
+            print("Exiting. Could not import records: {}".format(error), file=sys.stderr)
+            sys.exit(1)
+        if conflicts:
+            for record in conflicts:
+                print("Skipped record for {}, date already exists.".format(record.date.strftime("%d.%m.%Y")),
+                      file=sys.stderr)
+            sys.exit(1)
+    elif args.subcommand == "team-export":
+        from .team import team_export
+        try:
+            roster = list(read_rows(args.roster))
+        except (OSError, ValueError) as error:
+            print("Exiting. Could not read roster: {}".format(error), file=sys.stderr)
+            sys.exit(1)
+        start = args.from_month or args.date
+        results = team_export(roster, start, args.to_month or start, args.workers, args.single_workbook)
+        for result in results:
+            status = "ok" if result["success"] else "FAILED"
+            detail = ", ".join(result["files"]) if result["success"] else result["error"]
+            print("{:<30} {:<6} {:>7.2f}s  {}".format(result["name"], status, result["seconds"], detail))
+        failed = sum(1 for result in results if not result["success"])
+        print("{} exported, {} failed".format(len(results) - failed, failed))
+        if failed:
+            sys.exit(1)
+    elif args.subcommand == "report":
+        from .report import FIELDS
+        from .report import report
+        timesheets = [timesheet]
+        if args.roster:
+            try:
+                timesheets = [Timesheet(name=entry["name"],
+                                        records_dir=entry["records_dir"],
+                                        exports_dir=entry["exports_dir"]) for entry in read_rows(args.roster)]
+            except (OSError, ValueError, KeyError) as error:
+                print("Exiting. Could not read roster: {}".format(error), file=sys.stderr)
+                sys.exit(1)
+        rows = []
+        for trainee in timesheets:
+            rows.extend(report(trainee, args.from_date, args.to_date, args.period))
+            trainee.close()
+        write_rows(rows, FIELDS, args.report_format, sys.stdout)
+    elif args.subcommand == "query":
+        records = timesheet.query(args.from_date, args.to_date, args.special, args.weekdays,
+                                  args.min_hours, args.max_hours, args.words, args.contains)
+        write_rows(query_rows(records), QUERY_FIELDS, args.query_format, sys.stdout)
+    elif args.subcommand == "archive":
+        months = timesheet.archive_records(args.before)
+        print("Archived {} month(s).".format(months))
+    elif args.subcommand == "rebuild-ledger":
+        months = timesheet.rebuild_ledger()
+        print("Rebuilt carryover ledger with {} month(s).".format(months))
+    elif args.subcommand == "migrate":
+        months = timesheet.migrate_records(args.keep)
+        print("Migrated {} month(s) into the SQLite database.".format(months))
+        if not args.keep and months:
+            timesheet.set_config("storage", "sqlite")
     elif args.list_config:
         timesheet.list_config()
     elif args.set_config:
@@ -48,6 +134,31 @@ def execute(args):
             print("Exiting. Given key '{}' cannot be configured.".format(key))
             sys.exit(1)
 
+def read_rows(file, file_format=None):
+    """Read dictionaries one by one from a CSV or JSON lines file.
+
+    :param str file: Name of file to read, '-' reads from standard input
+    :param str file_format: Either 'csv' or 'jsonl', guessed from the file
+        extension if not given
+    :return: Generator of dictionaries, e.g. records or roster entries
+    """
+    import csv
+    if not file_format:
+        file_format = "csv" if file.lower().endswith(".csv") else "jsonl"
+    f = sys.stdin if file == "-" else open(file, "r", encoding="utf-8", newline="")
+    try:
+        if file_format == "csv":
+            for record in csv.DictReader(f):
+                yield record
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
 def check_date(date, non_interactive, message, attempts=3):
     """Check that date respects format 'DD.MM.YYYY'.
 
@@ -75,6 +186,43 @@ def check_date(date, non_interactive, message, attempts=3):
           file=sys.stderr)
     sys.exit(1)
 
+def check_month(month, name):
+    """Check that month respects format 'MM.YYYY'.
+
+    :param str month: The month supplied from the command line
+    :param str name: Name of the option, used when printing to stderr
+    :return: Validated date object of the first day of the month
+    :rtype: datetime.date
+    """
+    try:
+        return datetime.datetime.strptime(month, "%m.%Y")
+    except ValueError:
+        print("Exiting. Expected {} of following format: 'MM.YYYY'".format(name),
+              file=sys.stderr)
+        sys.exit(1)
+
+def check_weekdays(weekdays):
+    """Check that weekdays are given as names or numbers, e.g. 'mon,fri' or '1,5'.
+
+    :param list weekdays: Values of --weekday, each may list several days
+    :return: Set of weekdays, 0=monday, or None if none were given
+    :rtype: set
+    """
+    if not weekdays:
+        return None
+    days = set()
+    for value in ",".join(weekdays).split(","):
+        value = value.strip().lower()
+        if value[:3] in WEEKDAYS:
+            days.add(WEEKDAYS.index(value[:3]))
+        elif value in ("1", "2", "3", "4", "5", "6", "7"):
+            days.add(int(value) - 1)
+        else:
+            print("Exiting. Expected --weekday as one of {} or 1-7.".format(", ".join(WEEKDAYS)),
+                  file=sys.stderr)
+            sys.exit(1)
+    return days
+
 def check_time_interval(time_interval, non_interactive, name="", attempts=3):
     """Check that time interval respects format 'HH:MM-HH:MM'.
 
@@ -104,16 +252,151 @@ def check_time_interval(time_interval, non_interactive, name="", attempts=3):
           file=sys.stderr)
     sys.exit(1)
 
+def run(timesheet, method, **params):
+    """Runs a Timesheet method in the daemon, or locally if no daemon is running
+    or if its phases are timed.
+
+    :param timesheet: Timesheet to run the method on without daemon
+    :type timesheet: :class:`Timesheet`
+    :param str method: Name of the method, see daemon.OPERATIONS
+    :param params: Parameters of the method
+    :return: Result of the method
+    """
+    socket_file = timesheet.socket_location()
+    if os.path.exists(socket_file) and not timings.active():
+        from .daemon import request
+        try:
+            return request(socket_file, method, **params)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # socket left behind by a daemon that is gone
+            pass
+        except OSError as error:
+            raise TimesheetError("Daemon on {} did not answer: {}".format(socket_file, error))
+    return getattr(timesheet, method)(**params)
+
+def execute_measured(args):
+    """Executes the subcommand, printing the time of its phases and dumping a profile if asked to.
+
+    :param args: The namespace containing the scripts arguments
+    :type args: :class:`argparse.Namespace`
+    """
+    collected = timings.Timings()
+    if args.timings:
+        timings.add_hook(collected)
+    profile = None
+    if args.profile:
+        import cProfile
+        profile = cProfile.Profile()
+    begin = time.perf_counter()
+    try:
+        if profile is None:
+            execute(args)
+        else:
+            profile.runcall(execute, args)
+    finally:
+        total = time.perf_counter() - begin
+        if args.timings:
+            timings.remove_hook(collected)
+            collected.write(sys.stderr, total)
+        if profile is not None:
+            profile.dump_stats(args.profile)
+            print("Profile written to {}, see 'python -m pstats {}'".format(args.profile, args.profile),
+                  file=sys.stderr)
+
+def query_rows(records):
+    """Returns records found by a query as rows of QUERY_FIELDS.
+
+    :param list records: Records returned by :meth:`Timesheet.query`
+    :rtype: list
+    """
+    rows = []
+    for record in records:
+        row = record.to_dict()
+        rows.append({"date": row["date"],
+                     "work_hours": "{}-{}".format(row["start_day"], row["end_day"]),
+                     "break_time": "{}-{}".format(row["start_break"], row["end_break"]),
+                     "hours": round(record.work_minutes / 60, 2),
+                     "special": record.special,
+                     "comment": record.comment})
+    return rows
+
+def write_rows(rows, fields, file_format, out):
+    """Write rows as aligned table, CSV or JSON, numbers right aligned in the table.
+
+    :param list rows: Dictionaries with the given fields, e.g. report rows
+    :param tuple fields: Keys of the rows, in the order of the columns
+    :param str file_format: One of FORMATS
+    :param out: Text file to write to, e.g. sys.stdout
+    """
+    if file_format == "json":
+        json.dump(rows, out, indent=2)
+        out.write("\n")
+    elif file_format == "csv":
+        import csv
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        numeric = [bool(rows) and all(isinstance(row[field], (int, float)) and not isinstance(row[field], bool)
+                                      for row in rows) for field in fields]
+        table = [fields] + [tuple(str(row[field]) for field in fields) for row in rows]
+        widths = [max(len(line[column]) for line in table) for column in range(len(fields))]
+        for line in table:
+            out.write("  ".join(value.rjust(width) if numeric[column] else value.ljust(width)
+                                for column, (value, width) in enumerate(zip(line, widths))).rstrip() + "\n")
+
+def warn_day_off(timesheet, date):
+    """Warns if a record was entered for a weekend day or a holiday.
+
+    :param timesheet: Timesheet the record was entered in
+    :type timesheet: :class:`Timesheet`
+    :param datetime.date date: Date of record
+    """
+    if not timesheet.calendar.is_workday(date):
+        reason = timesheet.calendar.holiday(date) or date.strftime("%A")
+        print("Note: {} is not a workday ({}).".format(date.strftime("%d.%m.%Y"), reason), file=sys.stderr)
+
 def check_args(args):
     """Checks if no arguments were given when running the script and asks for them.
 
     :param args: The namespace containing the scripts arguments
     :type args: :class:`argparse.Namespace`
     """
-    if not args.subcommand == "config":
+    if args.subcommand in ["export", "team-export"] and (args.from_month or args.to_month):
+        args.from_month = check_month(args.from_month or args.to_month, "--from")
+        args.to_month = check_month(args.to_month or args.from_month.strftime("%m.%Y"), "--to")
+        if args.to_month < args.from_month:
+            print("Exiting. Month given with --to is before the one given with --from.",
+                  file=sys.stderr)
+            sys.exit(1)
+        if args.subcommand == "export" and args.stdout and not args.single_workbook:
+            print("Exiting. A range of months needs --single-workbook to be written to --stdout.",
+                  file=sys.stderr)
+            sys.exit(1)
+    elif args.subcommand == "report":
+        args.from_date = check_date(args.from_date, args.non_interactive, "- Enter the FIRST DATE of the report: ")
+        args.to_date = check_date(args.to_date, args.non_interactive, "- Enter the LAST DATE of the report: ")
+        if args.to_date < args.from_date:
+            print("Exiting. Date given with --to is before the one given with --from.",
+                  file=sys.stderr)
+            sys.exit(1)
+    elif args.subcommand == "query":
+        args.from_date = check_date(args.from_date, True, "") if args.from_date else None
+        args.to_date = check_date(args.to_date, True, "") if args.to_date else None
+        if args.from_date and args.to_date and args.to_date < args.from_date:
+            print("Exiting. Date given with --to is before the one given with --from.",
+                  file=sys.stderr)
+            sys.exit(1)
+        args.weekdays = check_weekdays(args.weekdays)
+    elif args.subcommand == "archive":
+        if args.before:
+            args.before = check_month(args.before, "--before")
+        else:
+            args.before = datetime.date.today().replace(day=1)
+    elif not args.subcommand in ["config", "import", "migrate", "rebuild-ledger", "serve"]:
         # checking date
         args.date = check_date(args.date, args.non_interactive, "- Enter the DATE of record: ")
-        if not args.subcommand in ["delete", "export"]:
+        if not args.subcommand in ["delete", "export", "team-export"]:
             # checking comment
             if not args.comment and not args.non_interactive:
                 args.comment=input("- Enter the COMMENT of record, if needed: ")
@@ -149,6 +432,15 @@ def parse_cli(args=None):
                              action="store_true",
                              dest="non_interactive",
                              help="do not ask anything, use default answers automatically")
+    global_args.add_argument("--timings",
+                             action="store_true",
+                             dest="timings",
+                             help="print how long the phases of the subcommand took, e.g. of an export")
+    global_args.add_argument("--profile",
+                             dest="profile",
+                             metavar="FILE",
+                             default="",
+                             help="write a cProfile statistics file of the subcommand")
     # parser with basic settings
     base_parser = argparse.ArgumentParser(add_help=False)
     base_parser.add_argument("-h", "--help",
@@ -181,6 +473,22 @@ def parse_cli(args=None):
                             action="store_true",
                             dest="special",
                             help="special records only need a date and a comment")
+    # parser with month range arguments
+    range_parser = argparse.ArgumentParser(add_help=False,parents=[min_parser])
+    range_parser.add_argument("--from",
+                              dest="from_month",
+                              metavar="MM.YYYY",
+                              default="",
+                              help="first month of a range to export, instead of --date")
+    range_parser.add_argument("--to",
+                              dest="to_month",
+                              metavar="MM.YYYY",
+                              default="",
+                              help="last month of a range to export, instead of --date")
+    range_parser.add_argument("--single-workbook",
+                              action="store_true",
+                              dest="single_workbook",
+                              help="export a range as one workbook with a sheet per month")
 
     subparsers = parser.add_subparsers(title="available subcommands",
                                        dest="subcommand",
@@ -205,10 +513,184 @@ def parse_cli(args=None):
                                           parents=[min_parser])
     # subparser for 'export' subcommand:
     parser_export = subparsers.add_parser("export",
-                                          description=("Export records of a month as .xlxs file."),
+                                          description=("Export records of a month, or of a range of months, as .xlxs file."),
                                           help="export records as .xlsx file",
                                           add_help=False,
-                                          parents=[min_parser])
+                                          parents=[range_parser])
+    parser_export.add_argument("--stdout",
+                               action="store_true",
+                               dest="stdout",
+                               help="write the workbook to standard output instead of 'exports_dir'")
+    parser_export.add_argument("--force",
+                               action="store_true",
+                               dest="force",
+                               help="write the files anew, even if records and layout didn't change")
+    # subparser for 'import' subcommand:
+    parser_import = subparsers.add_parser("import",
+                                          description=("Import many records at once from a CSV or JSON lines file."),
+                                          help="import records from a CSV or JSON lines file",
+                                          add_help=False,
+                                          parents=[base_parser])
+    parser_import.add_argument("-f", "--file",
+                               dest="file",
+                               metavar="FILE",
+                               required=True,
+                               help="file to import, '-' reads from standard input")
+    parser_import.add_argument("--format",
+                               dest="file_format",
+                               choices=["csv", "jsonl"],
+                               default=None,
+                               help="format of the file, guessed from its extension if not given")
+    # subparser for 'team-export' subcommand:
+    parser_team_export = subparsers.add_parser("team-export",
+                                               description=("Export the records of many trainees in parallel. "
+                                                            "The roster is a CSV or JSON lines file with the keys "
+                                                            "'name', 'records_dir' and 'exports_dir'."),
+                                               help="export records of many trainees in parallel",
+                                               add_help=False,
+                                               parents=[range_parser])
+    parser_team_export.add_argument("-r", "--roster",
+                                    dest="roster",
+                                    metavar="FILE",
+                                    required=True,
+                                    help="roster file listing the trainees")
+    parser_team_export.add_argument("-j", "--workers",
+                                    dest="workers",
+                                    type=int,
+                                    default=None,
+                                    help="number of worker processes, defaults to the number of CPUs")
+    # subparser for 'report' subcommand:
+    parser_report = subparsers.add_parser("report",
+                                          description=("Sum up worked hours, breaks, special days, overtime "
+                                                       "and balance per week, month or year."),
+                                          help="show hours statistics of a date range",
+                                          add_help=False,
+                                          parents=[base_parser])
+    parser_report.add_argument("--from",
+                               dest="from_date",
+                               metavar="DD.MM.YYYY",
+                               default="",
+                               help="first day of the report")
+    parser_report.add_argument("--to",
+                               dest="to_date",
+                               metavar="DD.MM.YYYY",
+                               default="",
+                               help="last day of the report")
+    parser_report.add_argument("--by",
+                               dest="period",
+                               choices=["week", "month", "year"],
+                               default="month",
+                               help="period to sum up, defaults to month")
+    parser_report.add_argument("--format",
+                               dest="report_format",
+                               choices=FORMATS,
+                               default="table",
+                               help="output format, defaults to table")
+    parser_report.add_argument("-r", "--roster",
+                               dest="roster",
+                               default="",
+                               help="roster file, report on every trainee listed in it")
+    # subparser for 'query' subcommand:
+    parser_query = subparsers.add_parser("query",
+                                         description=("Find records by date range, kind, weekday, worked hours "
+                                                      "and comment, using an index kept in 'records_dir'."),
+                                         help="find records matching given conditions",
+                                         add_help=False,
+                                         parents=[base_parser])
+    parser_query.add_argument("--from",
+                              dest="from_date",
+                              metavar="DD.MM.YYYY",
+                              default="",
+                              help="first day to search")
+    parser_query.add_argument("--to",
+                              dest="to_date",
+                              metavar="DD.MM.YYYY",
+                              default="",
+                              help="last day to search")
+    query_kind = parser_query.add_mutually_exclusive_group()
+    query_kind.add_argument("--special",
+                            action="store_const",
+                            const=True,
+                            dest="special",
+                            default=None,
+                            help="only special records")
+    query_kind.add_argument("--regular",
+                            action="store_const",
+                            const=False,
+                            dest="special",
+                            help="only records with work hours")
+    parser_query.add_argument("--weekday",
+                              action="append",
+                              dest="weekdays",
+                              metavar="DAY",
+                              default=[],
+                              help="weekday of the records, e.g. 'fri' or '5', may be repeated or comma separated")
+    parser_query.add_argument("--min-hours",
+                              type=float,
+                              dest="min_hours",
+                              default=None,
+                              help="least worked hours")
+    parser_query.add_argument("--max-hours",
+                              type=float,
+                              dest="max_hours",
+                              default=None,
+                              help="most worked hours")
+    parser_query.add_argument("--word",
+                              action="append",
+                              dest="words",
+                              default=[],
+                              help="word the comment must have, may be repeated")
+    parser_query.add_argument("--contains",
+                              dest="contains",
+                              default="",
+                              help="text the comment must contain, case is ignored")
+    parser_query.add_argument("--format",
+                              dest="query_format",
+                              choices=FORMATS,
+                              default="table",
+                              help="output format, defaults to table")
+    # subparser for 'archive' subcommand:
+    parser_archive = subparsers.add_parser("archive",
+                                           description=("Move the records of closed months into one compact "
+                                                        "archive file per year."),
+                                           help="move records of closed months into yearly archives",
+                                           add_help=False,
+                                           parents=[base_parser])
+    parser_archive.add_argument("--before",
+                                dest="before",
+                                metavar="MM.YYYY",
+                                default="",
+                                help="first month to keep open, defaults to the current month")
+    # subparser for 'serve' subcommand:
+    parser_serve = subparsers.add_parser("serve",
+                                         description=("Keep the timesheet in memory and serve add, update, delete, "
+                                                      "query and export on a Unix socket; the other subcommands "
+                                                      "use the daemon while it's running."),
+                                         help="run as daemon serving the timesheet on a Unix socket",
+                                         add_help=False,
+                                         parents=[base_parser])
+    parser_serve.add_argument("--socket",
+                              dest="socket",
+                              metavar="PATH",
+                              default="",
+                              help="socket to listen on, defaults to the configured 'socket'")
+    # subparser for 'rebuild-ledger' subcommand:
+    parser_rebuild_ledger = subparsers.add_parser("rebuild-ledger",
+                                                  description=("Recompute the carryover of every month from its records."),
+                                                  help="recompute the carryover of every month",
+                                                  add_help=False,
+                                                  parents=[base_parser])
+    # subparser for 'migrate' subcommand:
+    parser_migrate = subparsers.add_parser("migrate",
+                                           description=("Move all records files into the SQLite database "
+                                                        "and switch to 'storage=sqlite'."),
+                                           help="move records files into the SQLite database",
+                                           add_help=False,
+                                           parents=[base_parser])
+    parser_migrate.add_argument("--keep",
+                                action="store_true",
+                                dest="keep",
+                                help="keep the records files and the current storage setting")
     # subparser for 'config' subcommand:
     parser_config = subparsers.add_parser("config",
                                           description=("Configure the app with key=value pairs"),
@@ -225,10 +707,11 @@ def parse_cli(args=None):
                              action="store_true",
                              dest="list_config",
                              help="see the app's configuration")
+    argv = sys.argv[1:] if args is None else args
     args = parser.parse_args(args)
     args.parser = parser
     # If no argument is given, print help info:
-    if not sys.argv[1:]:
+    if not argv:
         parser.print_help()
         sys.exit(0)
     return args
@@ -240,7 +723,13 @@ def main(args=None):
     """
     args = parse_cli(args)
     check_args(args)
-    execute(args)
+    try:
+        if args.timings or args.profile:
+            execute_measured(args)
+        else:
+            execute(args)
+    except TimesheetError as error:
+        sys.exit("Exiting. {}".format(error))
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import socket
+import signal
+import threading
+import socketserver
+from datetime import datetime
+from .timesheet import Timesheet
+from .timesheet import TimesheetError
+
+# Timesheet methods served by the daemon, besides 'query'
+OPERATIONS = ("add_record", "update_record", "delete_record", "export", "export_range")
+
+def encode(value):
+    """Returns a value of a request in its JSON form, dates as 'DD.MM.YYYY', times as 'HH:MM'."""
+    if hasattr(value, "toordinal"):
+        return value.strftime("%d.%m.%Y")
+    if hasattr(value, "minute"):
+        return value.strftime("%H:%M")
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    return value
+
+def parse_date(value):
+    return datetime.strptime(value, "%d.%m.%Y")
+
+def parse_interval(value):
+    return tuple(datetime.strptime(item, "%H:%M").time() for item in value)
+
+# parameters that aren't plain JSON values, by name
+DECODERS = {
+    "date": parse_date,
+    "start": parse_date,
+    "end": parse_date,
+    "work_hours": parse_interval,
+    "break_time": parse_interval,
+}
+
+def request(socket_file, operation, timeout=60, **params):
+    """Run an operation in the daemon listening on a socket.
+
+    :param str socket_file: Name of the daemon's socket
+    :param str operation: One of OPERATIONS, or 'query'
+    :param int timeout: Seconds to wait for the answer
+    :param params: Parameters of the Timesheet method
+    :return: Result of the operation
+    :raises OSError: If no daemon is listening on the socket
+    :raises TimesheetError: If the operation failed in the daemon
+    """
+    message = {"op": operation}
+    message.update((key, encode(value)) for key, value in params.items())
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_file)
+        connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as answers:
+            answer = answers.readline()
+    if not answer:
+        raise ConnectionError("Daemon closed the connection without answering")
+    answer = json.loads(answer.decode("utf-8"))
+    if "error" in answer:
+        raise TimesheetError(answer["error"])
+    return answer["result"]
+
+class MonthCache(object):
+    """Storage wrapper keeping loaded months in memory.
+
+    A cached month is used as long as its version didn't change, so
+    commands that bypass the daemon, e.g. import or archive, are picked up;
+    the wrapped :class:`ArchiveStorage` opens archives again once their file
+    changed, so months archived meanwhile are read from and written to the
+    right place.
+    """
+    def __init__(self, backend):
+        """Constructor.
+
+        :param backend: Storage backend to cache
+        """
+        self.backend = backend
+        self._months = {}
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def load(self, year, month):
+        """Returns the records of a month, from memory if its version didn't change."""
+        version = self.backend.version(year, month)
+        cached = self._months.get((year, month))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        records = self.backend.load(year, month)
+        self._months[(year, month)] = (version, records)
+        return records
+
+    def apply(self, year, month, records, changes):
+        """Persist changes made to the records of a month, see the backend's apply."""
+        self._months.pop((year, month), None)
+        self.backend.apply(year, month, records, changes)
+        self._months[(year, month)] = (self.backend.version(year, month), records)
+
+    def save(self, year, month, records):
+        """Replace all records of a month, see the backend's save."""
+        self._months.pop((year, month), None)
+        self.backend.save(year, month, records)
+        self._months[(year, month)] = (self.backend.version(year, month), records)
+
+    def close(self):
+        self._months = {}
+        self.backend.close()
+
+class CachedTimesheet(Timesheet):
+    """Timesheet keeping the months it loaded in memory, see :class:`MonthCache`."""
+    @property
+    def storage(self):
+        if not isinstance(self._storage, MonthCache):
+            self._storage = MonthCache(Timesheet.storage.fget(self))
+        return self._storage
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests of one connection, one JSON object per line each way."""
+    def handle(self):
+        for line in self.rfile:
+            answer = self.server.dispatch(line)
+            self.wfile.write(json.dumps(answer).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+class TimesheetServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a timesheet kept in memory on a Unix socket.
+
+    Connections are handled in threads, but all operations on the timesheet
+    run one at a time, so there is a single writer and every change is on
+    disk before it's answered.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_file):
+        """Constructor, binds the socket readable and writable by the owner only.
+
+        :param str socket_file: Name of the socket
+        """
+        self.socket_file = socket_file
+        self.timesheet = CachedTimesheet()
+        self.config = self.timesheet.config
+        self.lock = threading.Lock()
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_file, RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def dispatch(self, line):
+        """Run one request and return its answer.
+
+        :param bytes line: JSON encoded request
+        :return: Dictionary with 'result', or 'error' if the request failed
+        """
+        try:
+            message = json.loads(line.decode("utf-8"))
+            operation = message.pop("op")
+            params = {key: DECODERS[key](value) if key in DECODERS else value
+                      for key, value in message.items()}
+            with self.lock:
+                self.reload()
+                if operation == "query":
+                    result = self.query(**params)
+                elif operation in OPERATIONS:
+                    result = getattr(self.timesheet, operation)(**params)
+                else:
+                    raise TimesheetError("Unknown operation '{}'.".format(operation))
+            return {"result": result}
+        except TimesheetError as error:
+            return {"error": str(error)}
+        except Exception as error:
+            return {"error": "{}: {}".format(type(error).__name__, error)}
+
+    def reload(self):
+        """Start over with a new timesheet if the configuration file changed."""
+        if Timesheet.read_config(self.timesheet.config_file) is not self.config:
+            self.timesheet.close()
+            self.timesheet = CachedTimesheet()
+            self.config = self.timesheet.config
+
+    def query(self, date):
+        """Returns the record of a date as dictionary, or None.
+
+        :param datetime.date date: Date of record
+        """
+        self.timesheet.load_records(date)
+        record = self.timesheet.records.get(date)
+        return None if record is None else record.to_dict()
+
+    def server_close(self):
+        super().server_close()
+        self.timesheet.close()
+        if os.path.exists(self.socket_file):
+            os.remove(self.socket_file)
+
+def serve(socket_file):
+    """Serve the timesheet on a Unix socket until interrupted or terminated.
+
+    :param str socket_file: Name of the socket
+    :raises TimesheetError: If a daemon is already listening on the socket
+    """
+    if os.path.exists(socket_file):
+        try:
+            request(socket_file, "query", timeout=1, date=datetime.now())
+        except OSError:
+            # left behind by a daemon that didn't shut down cleanly
+            os.remove(socket_file)
+        else:
+            raise TimesheetError("A daemon is already listening on {}.".format(socket_file))
+    os.makedirs(os.path.dirname(os.path.abspath(socket_file)), exist_ok=True)
+    server = TimesheetServer(socket_file)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print("Serving timesheet on {}".format(socket_file), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
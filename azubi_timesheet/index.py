@@ -0,0 +1,179 @@
+import os
+import re
+from bisect import bisect_left
+from bisect import bisect_right
+from .storage import load_json_file
+from .storage import month_key
+from .storage import version_stamp
+from .storage import write_json_file
+
+# words of comments, as indexed and as searched for
+WORD = re.compile(r"\w+")
+# names of the month files, e.g. '2019-10.json'
+MONTH_FILE = re.compile(r"(\d{4})-(\d{2})\.json$")
+
+def words(text):
+    """Returns the distinct lowercase words of a text, sorted."""
+    return sorted(set(WORD.findall(text.lower())))
+
+class RecordIndex(object):
+    """Secondary indexes over the records, kept as one small JSON file per month
+    in a directory in 'records_dir'.
+
+    Every month's file holds the worked minutes and special flag of each of
+    its records by date, the sorted dates of its special records and an
+    inverted index mapping every lowercase word of its comments to the
+    sorted dates using it, so hours, kinds and words are filtered without
+    loading any records. A write re-indexes only its own month, a query
+    reads only the months of its date range. Each file keeps a stamp of the
+    version of the month's records, so months changed behind the index's
+    back, e.g. by another installation, are noticed and indexed again.
+    """
+    def __init__(self, directory):
+        """Constructor.
+
+        :param str directory: Directory of the month files
+        """
+        self.directory = directory
+        # month files read so far, {(year, month): content or None}
+        self._months = {}
+
+    def exists(self):
+        """Returns True if the index was built."""
+        return os.path.isdir(self.directory)
+
+    def location(self, year, month):
+        """Returns the name of a month's file.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        return os.path.join(self.directory, month_key(year, month) + ".json")
+
+    @staticmethod
+    def stamp(version):
+        """Returns a JSON friendly stamp of a month's version, see :func:`version_stamp`."""
+        return version_stamp(version)
+
+    def indexed(self):
+        """Returns sorted list of (year, month) tuples that are in the index."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((int(match.group(1)), int(match.group(2)))
+                      for match in map(MONTH_FILE.match, names) if match)
+
+    def load(self, year, month):
+        """Returns the content of a month's file, None if it's missing or torn.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :return: Dictionary with 'stamp', 'records' {ordinal: [worked minutes,
+            special]}, 'special' and 'tokens' {word: [ordinals]}
+        """
+        key = (year, month)
+        if key not in self._months:
+            try:
+                content = load_json_file(self.location(year, month))
+            except ValueError:
+                # written without fsync, a crash may have torn it
+                content = None
+            if content is not None:
+                content["records"] = {int(ordinal): entry for ordinal, entry in content["records"].items()}
+            self._months[key] = content
+        return self._months[key]
+
+    def current(self, year, month, version):
+        """Returns True if a month is indexed from the given version of its records."""
+        content = self.load(year, month)
+        return content is not None and content["stamp"] == self.stamp(version)
+
+    def add_month(self, year, month, records, version):
+        """Index the records of a month, replacing its former entries.
+
+        The file is derived from the records and checked against their
+        version before use, so it's written without waiting for the disk.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month
+        :type records: :class:`RecordStore`
+        :param version: Version of the records, see the storage's version
+        """
+        content = {"stamp": self.stamp(version), "records": {}, "special": [], "tokens": {}}
+        for record in records:
+            content["records"][record.ordinal] = [record.work_minutes, record.special]
+            if record.special:
+                content["special"].append(record.ordinal)
+            for word in words(record.comment):
+                content["tokens"].setdefault(word, []).append(record.ordinal)
+        write_json_file(self.location(year, month),
+                        dict(content, records={str(ordinal): entry for ordinal, entry in content["records"].items()}),
+                        sync=False)
+        self._months[(year, month)] = content
+
+    def remove_month(self, year, month):
+        """Drop a month from the index.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        try:
+            os.remove(self.location(year, month))
+        except FileNotFoundError:
+            pass
+        self._months[(year, month)] = None
+
+    def search(self, year, month, first=None, last=None, special=None, weekdays=None,
+               min_minutes=None, max_minutes=None, required=(), contains=None):
+        """Returns the dates of a month's records matching all given conditions.
+
+        Text given with contains is looked up as parts of indexed words, so
+        the result may hold records whose comment has the words but not the
+        text as a whole; the caller checks the comments of those.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param int first: Ordinal of the first day, None for no limit
+        :param int last: Ordinal of the last day, None for no limit
+        :param bool special: Only special records if True, only regular if False
+        :param set weekdays: Weekdays to match, 0=monday
+        :param int min_minutes: Least worked minutes
+        :param int max_minutes: Most worked minutes
+        :param required: Words every comment must have
+        :param str contains: Text the comments must contain
+        :return: Sorted list of date ordinals
+        """
+        content = self.load(year, month)
+        if content is None:
+            return []
+        dates = content["special"] if special else sorted(content["records"])
+        dates = dates[0 if first is None else bisect_left(dates, first):
+                      len(dates) if last is None else bisect_right(dates, last)]
+        candidates = None
+        for word in words(" ".join(required)):
+            postings = set(content["tokens"].get(word, ()))
+            candidates = postings if candidates is None else candidates & postings
+        for part in words(contains or ""):
+            postings = set()
+            for word, ordinals in content["tokens"].items():
+                if part in word:
+                    postings.update(ordinals)
+            candidates = postings if candidates is None else candidates & postings
+        found = []
+        for ordinal in dates:
+            if candidates is not None and ordinal not in candidates:
+                continue
+            minutes, record_special = content["records"][ordinal]
+            if special is False and record_special:
+                continue
+            # ordinal 1 is a monday
+            if weekdays is not None and (ordinal - 1) % 7 not in weekdays:
+                continue
+            if min_minutes is not None and minutes < min_minutes:
+                continue
+            if max_minutes is not None and minutes > max_minutes:
+                continue
+            found.append(ordinal)
+        return found
@@ -0,0 +1,106 @@
+from .storage import MonthEntries
+from .storage import month_key
+from .storage import version_stamp
+
+class Ledger(MonthEntries):
+    """Hours balance of every exported month, kept as JSON file next to the exports.
+
+    Each entry holds the hours carried over into the month, the hours the
+    month adds, the closing balance carried over into the next month and a
+    stamp of the version of the records it was computed from, so the
+    carryover chain never depends on formula values cached by Excel and
+    never needs to open a previous export. Entries are keyed by month,
+    changing the records of a month invalidates its entry and all later
+    ones, also when they're changed by other means than the timesheet, e.g.
+    by hand, as the entry's version no longer matches. The entries read,
+    written and dropped since loading are remembered, so they can be checked
+    before they're merged into the file, see Timesheet.save_ledger.
+    """
+    def __init__(self, file):
+        """Constructor, loads the ledger file if it exists.
+
+        :param str file: Name of the ledger file
+        """
+        super().__init__(file)
+        # entries the written ones were computed from, {key: entry}
+        self.read = {}
+        # {key: (year, month, version of the month's records)}
+        self.written = {}
+        # first month whose entry was dropped, (year, month) or None
+        self.dropped = None
+
+    def get(self, year, month):
+        """Returns the entry of a month or None.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :return: Dictionary with 'carryover', 'balance' and 'closing' hours
+        """
+        key = month_key(year, month)
+        entry = self.entries.get(key)
+        if entry is not None and key not in self.written:
+            self.read.setdefault(key, entry)
+        return entry
+
+    def closing(self, year, month, version=None, carryover=None):
+        """Returns the closing balance of a month or None if it's not in the ledger.
+
+        An entry computed from other records than the given version, or
+        from another carryover, is stale: it's dropped together with the
+        entries of all later months and None is returned.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param version: Current version of the month's records, see the
+            storage's version, None to skip checking it
+        :param float carryover: Hours carried over into the month, None to
+            skip checking it
+        """
+        entry = self.get(year, month)
+        if entry is None:
+            return None
+        if ((version is not None and entry.get("version") != version_stamp(version))
+                or (carryover is not None and entry["carryover"] != carryover)):
+            self.invalidate(year, month)
+            return None
+        return entry["closing"]
+
+    def update(self, year, month, carryover, balance, version=None):
+        """Record the balance of an exported month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param float carryover: Hours carried over into the month
+        :param float balance: Hours the month adds to the carryover
+        :param version: Version of the records the balance was computed
+            from, see the storage's version
+        """
+        key = month_key(year, month)
+        self.written[key] = (year, month, version)
+        self.entries[key] = {
+            "carryover": carryover,
+            "balance": balance,
+            "closing": carryover + balance,
+            "version": version_stamp(version),
+        }
+
+    def invalidate(self, year, month):
+        """Drop the entries of a month and of all following months.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :return: True if any entry was dropped
+        """
+        key = month_key(year, month)
+        stale = [other for other in self.entries if other >= key]
+        for other in stale:
+            del self.entries[other]
+            # dropped entries aren't computed from
+            self.read.pop(other, None)
+        if stale and (self.dropped is None or (year, month) < self.dropped):
+            self.dropped = (year, month)
+        return bool(stale)
+
+    def clear(self):
+        """Drop all entries."""
+        self.entries = {}
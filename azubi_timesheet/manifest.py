@@ -0,0 +1,71 @@
+import os
+from .storage import MonthEntries
+from .storage import file_lock
+from .storage import month_key
+
+class ExportManifest(MonthEntries):
+    """Digests of every exported month, kept as JSON file next to the exports.
+
+    Each entry holds a digest of everything that went into the export and
+    the modification time and size of the export file, so an unchanged
+    month is skipped as long as nobody else changed the file since.
+    """
+    def __init__(self, file):
+        """Constructor, loads the manifest file if it exists.
+
+        :param str file: Name of the manifest file
+        """
+        super().__init__(file)
+        # months exported since loading
+        self.written = set()
+
+    @staticmethod
+    def stat(export_file):
+        """Returns modification time and size of an export file, None if it's missing."""
+        try:
+            stat = os.stat(export_file)
+        except FileNotFoundError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def current(self, year, month, export_file):
+        """Returns the entry of a month if its export file is unchanged since, else None.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param str export_file: Name of the month's export file
+        :return: Dictionary with 'digest' and 'stat'
+        """
+        entry = self.entries.get(month_key(year, month))
+        if entry is None or entry["stat"] != self.stat(export_file):
+            return None
+        return entry
+
+    def update(self, year, month, digest, export_file):
+        """Record the digest of a freshly written export.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param str digest: Digest of everything that went into the export
+        :param str export_file: Name of the written export file
+        """
+        key = month_key(year, month)
+        self.written.add(key)
+        self.entries[key] = {
+            "digest": digest,
+            "stat": self.stat(export_file),
+        }
+
+    def save(self):
+        """Merge the entries written since loading into the manifest file.
+
+        The file is read again under its lock, so the entries of exports
+        that ran in the meantime, e.g. of other months, are kept.
+        """
+        with file_lock(self.file + ".lock"):
+            current = MonthEntries(self.file)
+            for key in self.written:
+                current.entries[key] = self.entries[key]
+            current.save()
+        self.entries = current.entries
+        self.written = set()
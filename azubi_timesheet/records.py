@@ -0,0 +1,194 @@
+from datetime import datetime
+from datetime import time
+
+class Record(object):
+    """Single timesheet record.
+
+    The date is kept as ordinal, times as minutes since midnight and the
+    special flag as bool, so records can be compared and summed without
+    parsing strings again.
+    """
+    __slots__ = ("ordinal", "start_day", "end_day", "start_break", "end_break", "comment", "special")
+
+    def __init__(self, ordinal, start_day=0, end_day=0, start_break=0, end_break=0, comment="", special=False):
+        """Constructor, initializes the record fields.
+
+        :param int ordinal: Ordinal of the record's date
+        :param int start_day: Begin of the workday, minutes since midnight
+        :param int end_day: End of the workday, minutes since midnight
+        :param int start_break: Begin of the break, minutes since midnight
+        :param int end_break: End of the break, minutes since midnight
+        :param str comment: Comment for the record
+        :param bool special: Whether the record is special or not
+        """
+        self.ordinal = ordinal
+        self.start_day = start_day
+        self.end_day = end_day
+        self.start_break = start_break
+        self.end_break = end_break
+        self.comment = comment
+        self.special = special
+
+    @classmethod
+    def from_dict(cls, content):
+        """Create a record from a dictionary following the records file schema.
+
+        Missing or empty times default to midnight, 'special' may be missing.
+
+        :param dict content: Record as found in records files
+        :return: Record object
+        :raises ValueError: If date or times don't follow the expected format
+        """
+        date = datetime.strptime((content.get("date") or "").strip(), "%d.%m.%Y")
+        return cls(date.toordinal(),
+                   parse_minutes(content.get("start_day")),
+                   parse_minutes(content.get("end_day")),
+                   parse_minutes(content.get("start_break")),
+                   parse_minutes(content.get("end_break")),
+                   content.get("comment") or "",
+                   str(content.get("special", False)).strip().lower() in ("true", "1", "yes"))
+
+    def to_dict(self):
+        """Returns the record as dictionary following the records file schema."""
+        return {
+            "date": self.date.strftime("%d.%m.%Y"),
+            "start_day": format_minutes(self.start_day),
+            "end_day": format_minutes(self.end_day),
+            "start_break": format_minutes(self.start_break),
+            "end_break": format_minutes(self.end_break),
+            "comment": self.comment,
+            "special": str(self.special)
+        }
+
+    @property
+    def date(self):
+        """Date of the record as datetime.datetime object."""
+        return datetime.fromordinal(self.ordinal)
+
+    @property
+    def break_minutes(self):
+        """Length of the break in minutes."""
+        return self.end_break - self.start_break
+
+    @property
+    def work_minutes(self):
+        """Worked minutes without break, special records count as a full day."""
+        if self.special:
+            return 8 * 60
+        return self.end_day - self.start_day - self.break_minutes
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return "Record({})".format(", ".join(repr(getattr(self, slot)) for slot in self.__slots__))
+
+def parse_minutes(value):
+    """Convert 'HH:MM' string into minutes since midnight, empty values are midnight.
+
+    :param str value: Time string
+    :rtype: int
+    """
+    if not value or not value.strip():
+        return 0
+    parsed = datetime.strptime(value.strip(), "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+def format_minutes(minutes):
+    """Convert minutes since midnight into 'HH:MM' string.
+
+    :param int minutes: Minutes since midnight
+    :rtype: str
+    """
+    return "{:02d}:{:02d}".format(*divmod(minutes, 60))
+
+def minutes_to_time(minutes):
+    """Convert minutes since midnight into datetime.time object.
+
+    :param int minutes: Minutes since midnight
+    :rtype: datetime.time
+    """
+    return time(*divmod(minutes, 60))
+
+def time_to_minutes(value):
+    """Convert datetime.time object into minutes since midnight.
+
+    :param datetime.time value: Time to convert
+    :rtype: int
+    """
+    return value.hour * 60 + value.minute
+
+class RecordStore(object):
+    """Records of one month, indexed by the ordinal of their date.
+
+    Lookup, insert, update and delete are dictionary operations, iterating
+    the store yields the records sorted by date.
+    """
+    def __init__(self, records=()):
+        """Constructor, indexes the given records.
+
+        :param records: Iterable of Record objects
+        """
+        self._records = {}
+        self._order = None
+        for record in records:
+            self.put(record)
+
+    @staticmethod
+    def key(item):
+        """Returns the index key of a date or a record.
+
+        :param item: A datetime.date object or a record
+        :return: Integer ordinal of the date
+        """
+        if isinstance(item, Record):
+            return item.ordinal
+        return item.toordinal()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        if self._order is None:
+            self._order = sorted(self._records)
+        return (self._records[key] for key in self._order)
+
+    def __contains__(self, date):
+        return self.key(date) in self._records
+
+    def get(self, date):
+        """Returns the record of the given date or None.
+
+        :param datetime.date date: Date of record
+        """
+        return self._records.get(self.key(date))
+
+    def put(self, record):
+        """Insert a record, replacing the record of the same date if any.
+
+        :param record: Record to store
+        """
+        key = self.key(record)
+        if key not in self._records:
+            self._order = None
+        self._records[key] = record
+
+    def pop(self, date):
+        """Remove the record of the given date and return it, or None.
+
+        :param datetime.date date: Date of record
+        """
+        record = self._records.pop(self.key(date), None)
+        if record is not None:
+            self._order = None
+        return record
+
+    def to_list(self):
+        """Returns the records as list of dictionaries sorted by date, ready to be written."""
+        return [record.to_dict() for record in self]
@@ -0,0 +1,156 @@
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import date
+from datetime import timedelta
+from itertools import accumulate
+from itertools import repeat
+from operator import add
+from operator import mul
+from operator import sub
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from .storage import month_key
+
+PERIODS = ("week", "month", "year")
+COLUMNS = ("ordinal", "start_day", "end_day", "start_break", "end_break", "special")
+FIELDS = ("name", "period", "from", "to", "workdays", "records", "special_days",
+          "worked_hours", "break_hours", "expected_hours", "overtime_hours", "balance_hours")
+
+def load_columns(storage, start, end):
+    """Load the records from start to end into column arrays, sorted by date.
+
+    :param storage: Storage backend of a timesheet, archived months are read
+        straight from their archive
+    :param datetime.date start: First day
+    :param datetime.date end: Last day
+    :return: Dictionary {column: array.array} with the columns of COLUMNS,
+        times in minutes
+    """
+    columns = {name: array("l") for name in COLUMNS}
+    first, last = start.toordinal(), end.toordinal()
+    for year, month in storage.months():
+        if not (start.year, start.month) <= (year, month) <= (end.year, end.month):
+            continue
+        month_columns = storage.month_columns(year, month)
+        ordinals = month_columns["ordinal"]
+        within = slice(bisect_left(ordinals, first), bisect_right(ordinals, last))
+        for name in COLUMNS:
+            # iterated, arrays only extend arrays of their own type
+            columns[name].extend(iter(month_columns[name][within]))
+    return columns
+
+def periods(start, end, by):
+    """Yields the weeks, months or years from start to end, clipped to them.
+
+    :param datetime.date start: First day
+    :param datetime.date end: Last day
+    :param str by: One of PERIODS
+    :return: Generator of tuples (label, first day, last day)
+    """
+    day = start
+    while day <= end:
+        if by == "week":
+            stop = day + timedelta(days=6 - day.weekday())
+            label = "{}-W{:02d}".format(*day.isocalendar()[:2])
+        elif by == "month":
+            stop = date(day.year + day.month // 12, day.month % 12 + 1, 1) - timedelta(days=1)
+            label = month_key(day.year, day.month)
+        else:
+            stop = date(day.year, 12, 31)
+            label = str(day.year)
+        stop = min(stop, end)
+        yield label, day, stop
+        day = stop + timedelta(days=1)
+
+def running_sums(columns):
+    """Returns running sums of worked minutes, break minutes and special days.
+
+    Special days count 8 hours of work and no break. The sums start with 0,
+    so the total of the records i to j is sums[j] - sums[i].
+
+    :param dict columns: Column arrays, see :func:`load_columns`
+    :return: Tuple of three arrays (worked, breaks, special)
+    """
+    if numpy is not None:
+        _, start_day, end_day, start_break, end_break, special = (
+            numpy.asarray(columns[name], dtype=numpy.int64) for name in COLUMNS)
+        breaks = (end_break - start_break) * (1 - special)
+        worked = (end_day - start_day) * (1 - special) - breaks + special * 480
+        return tuple(numpy.concatenate(([0], numpy.cumsum(values))) for values in (worked, breaks, special))
+    regular = array("l", map(sub, repeat(1), columns["special"]))
+    breaks = array("l", map(mul, map(sub, columns["end_break"], columns["start_break"]), regular))
+    spans = map(mul, map(sub, columns["end_day"], columns["start_day"]), regular)
+    worked = map(sub, spans, breaks)
+    sums = []
+    for values in (worked, breaks, columns["special"]):
+        running = array("q", [0])
+        running.extend(accumulate(values))
+        sums.append(running)
+    worked, breaks, special = sums
+    # special days count 8 hours, added from their running count
+    worked = array("q", map(add, worked, map(mul, special, repeat(480))))
+    return worked, breaks, special
+
+def bounds(ordinals, firsts, lasts):
+    """Returns the index ranges of the records within each period.
+
+    :param ordinals: Sorted date ordinals of the records
+    :param list firsts: Ordinal of every period's first day
+    :param list lasts: Ordinal of every period's last day
+    :return: Tuple of two sequences (lower, upper)
+    """
+    if numpy is not None:
+        ordinals = numpy.asarray(ordinals, dtype=numpy.int64)
+        return (numpy.searchsorted(ordinals, firsts, "left").tolist(),
+                numpy.searchsorted(ordinals, lasts, "right").tolist())
+    return ([bisect_left(ordinals, first) for first in firsts],
+            [bisect_right(ordinals, last) for last in lasts])
+
+def report(timesheet, start, end, by="month"):
+    """Returns the hours statistics of a timesheet per week, month or year.
+
+    The records of the range are loaded into column arrays and summed up
+    with running sums, with NumPy if it's installed, so the totals of every
+    period are a subtraction instead of a loop over its records.
+
+    :param timesheet: Timesheet to report on
+    :type timesheet: :class:`Timesheet`
+    :param datetime.date start: First day
+    :param datetime.date end: Last day
+    :param str by: One of PERIODS
+    :return: List of dictionaries with the keys of FIELDS, hours rounded to
+        two decimals; 'balance_hours' is the overtime summed up from start
+    """
+    start, end = date(start.year, start.month, start.day), date(end.year, end.month, end.day)
+    columns = load_columns(timesheet.storage, start, end)
+    worked, breaks, special = running_sums(columns)
+    spans = list(periods(start, end, by))
+    lower, upper = bounds(columns["ordinal"],
+                          [first.toordinal() for _, first, _ in spans],
+                          [last.toordinal() for _, _, last in spans])
+    name = timesheet.config.get("user_defined", "name")
+    rows = []
+    balance = 0.0
+    for (label, first, last), i, j in zip(spans, lower, upper):
+        workdays = timesheet.calendar.workdays(first, last)
+        worked_hours = float(worked[j] - worked[i]) / 60
+        overtime = worked_hours - workdays * 8
+        balance += overtime
+        rows.append({
+            "name": name,
+            "period": label,
+            "from": first.strftime("%d.%m.%Y"),
+            "to": last.strftime("%d.%m.%Y"),
+            "workdays": workdays,
+            "records": j - i,
+            "special_days": int(special[j] - special[i]),
+            "worked_hours": round(worked_hours, 2),
+            "break_hours": round(float(breaks[j] - breaks[i]) / 60, 2),
+            "expected_hours": workdays * 8,
+            "overtime_hours": round(overtime, 2),
+            "balance_hours": round(balance, 2),
+        })
+    return rows
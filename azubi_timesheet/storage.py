@@ -0,0 +1,574 @@
+import os
+import re
+import json
+import threading
+from contextlib import contextmanager
+from datetime import date
+from datetime import datetime
+from .records import Record
+from .records import RecordStore
+from . import timings
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# how writers of a month keep out of each other's way, see Timesheet.change_month
+LOCKINGS = ("lock", "optimistic")
+# descriptors of the lock files held by this process, see file_lock()
+_held_locks = set()
+
+def _close_inherited_locks():
+    """Close the lock files a forked child inherited, e.g. an export worker
+    forked while another thread held a lock, so the child doesn't keep the
+    lock once the parent releases it."""
+    for fd in list(_held_locks):
+        os.close(fd)
+    _held_locks.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_close_inherited_locks)
+
+@timings.timed("write_json")
+def write_json_file(file, content, sync=True):
+    """Write content to JSON file atomically, creating its directory if needed.
+
+    The content goes to a temporary file of its own first, which then
+    replaces the target, so a crash never leaves a half written file behind
+    and concurrent writers never write into the same temporary file.
+
+    :param str file: Name of file to write
+    :param content: Content to write in file
+    :param bool sync: Wait until the file is on disk, files that can be
+        derived again, e.g. the record index, may skip that
+    """
+    directory = os.path.dirname(file)
+    os.makedirs(directory, exist_ok=True)
+    temp_file = temp_location(file)
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(content, f, indent=2)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file, file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    if sync:
+        sync_directory(directory)
+
+def temp_location(file):
+    """Returns the name of a temporary file to write a file's new content to,
+    one of its own for every process and thread.
+
+    :param str file: Name of the file to replace
+    """
+    return "{}.{}.{}.tmp".format(file, os.getpid(), threading.get_ident())
+
+def sync_directory(directory):
+    """Flush a directory entry to disk, so renames in it survive a crash.
+
+    :param str directory: Name of directory
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def file_lock(file):
+    """Context manager holding an exclusive advisory lock on a lock file.
+
+    Waits until no other process or thread holds the lock. Where fcntl is
+    missing, e.g. on Windows, nothing is locked.
+
+    :param str file: Name of the lock file, created if needed
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    fd = os.open(file, os.O_RDWR | os.O_CREAT, 0o644)
+    _held_locks.add(fd)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the file releases the lock
+        _held_locks.discard(fd)
+        os.close(fd)
+
+def lock_location(config, name):
+    """Returns the name of a lock file in the lock directory in 'records_dir'.
+
+    The lock files stay there once created, out of the way of the records.
+
+    :param config: Timesheet configuration
+    :type config: :class:`configparser.ConfigParser`
+    :param str name: Name of the lock file
+    """
+    return os.path.join(config.get("user_defined", "records_dir"),
+                        config.get("user_defined", "locks_name"), name)
+
+def file_version(file):
+    """Returns inode, modification time and size of a file, None if it's missing.
+
+    Files replaced atomically get a new inode, appended files a new size,
+    so the version changes with every write.
+
+    :param str file: Name of the file
+    """
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def version_stamp(version):
+    """Returns a JSON friendly stamp of a month's version, see the storages' version.
+
+    :param version: Version of a month's records
+    :rtype: str
+    """
+    import hashlib
+    return hashlib.sha1(repr(version).encode("utf-8")).hexdigest()
+
+def load_json_file(file, default_content=None, object_hook=None):
+    """Load JSON file, return content.
+
+    :param str file: Name of file to load
+    :param default_content: Default content to return as loaded content
+    :param object_hook: Function called with every decoded JSON object,
+        e.g. Record.from_dict
+    :return: Content from file
+    """
+    if os.path.isfile(file) and os.path.getsize(file):
+        with open(file, "r", encoding="utf-8") as f:
+            return json.load(f, object_hook=object_hook)
+    return default_content
+
+def month_key(year, month):
+    """Returns the key of a month in files keyed by month, e.g. '2019-10'.
+
+    :param int year: Year of the month
+    :param int month: Month number, 1-12
+    """
+    return "{}-{:02d}".format(year, month)
+
+class MonthEntries(object):
+    """Entries keyed by month, see :func:`month_key`, kept as JSON file."""
+    def __init__(self, file):
+        """Constructor, loads the file if it exists.
+
+        :param str file: Name of the file
+        """
+        self.file = file
+        self.entries = load_json_file(file, {})
+
+    def save(self):
+        """Write the file, entries sorted by month."""
+        write_json_file(self.file, dict(sorted(self.entries.items())))
+
+def month_range(year, month):
+    """Returns ordinals of the first and last day of a month.
+
+    :param int year: Year of the month
+    :param int month: Month number, 1-12
+    :rtype: tuple(int, int)
+    """
+    first = date(year, month, 1).toordinal()
+    following = date(year + month // 12, month % 12 + 1, 1).toordinal()
+    return first, following - 1
+
+class JSONStorage(object):
+    """Keeps the records of every month in its own JSON file in 'records_dir'.
+
+    Changes are appended to a journal next to the month file, one JSON line
+    per added, updated or deleted record. Loading replays the journal over
+    the month file, and once the journal grows past 'compact_size' bytes it
+    is folded into the month file, which is replaced atomically.
+    """
+    name = "json"
+    journal_suffix = ".journal"
+    compact_size = 64 * 1024
+
+    def __init__(self, config):
+        """Constructor, initializes 'config' instance attribute.
+
+        :param config: Timesheet configuration
+        :type config: :class:`configparser.ConfigParser`
+        """
+        self.config = config
+
+    def location(self, year, month):
+        """Returns the name of the records file of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        return os.path.join(
+            self.config.get("user_defined", "records_dir"),
+            self.config.get("user_defined", "records_name").format(year, "{:02d}".format(month))
+        )
+
+    def journal_location(self, year, month):
+        """Returns the name of the journal file of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        return self.location(year, month) + self.journal_suffix
+
+    def lock(self, year, month):
+        """Returns a context manager holding the write lock of a month, see :func:`file_lock`.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        name = os.path.basename(self.location(year, month)) + ".lock"
+        return file_lock(lock_location(self.config, name))
+
+    def version(self, year, month):
+        """Returns a value that changes whenever the records of a month are written.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        return (file_version(self.location(year, month)),
+                file_version(self.journal_location(year, month)))
+
+    def load(self, year, month):
+        """Returns the records of a month, journal replayed.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :rtype: :class:`RecordStore`
+        """
+        records = RecordStore(load_json_file(self.location(year, month), [], Record.from_dict))
+        self.replay(self.journal_location(year, month), records)
+        return records
+
+    def replay(self, journal, records):
+        """Apply the entries of a journal file to records.
+
+        Entries are idempotent, replaying a journal that was already folded
+        into the month file doesn't change anything. Torn lines, left by a
+        crash while appending, are skipped.
+
+        :param str journal: Name of journal file
+        :param records: Records to apply the entries to
+        :type records: :class:`RecordStore`
+        """
+        try:
+            f = open(journal, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["op"] == "delete":
+                    records.pop(datetime.strptime(entry["date"], "%d.%m.%Y"))
+                else:
+                    records.put(Record.from_dict(entry["record"]))
+
+    def apply(self, year, month, records, changes):
+        """Persist changes made to the records of a month.
+
+        Changes are appended to the month's journal with a single write and
+        fsync. A month without file yet, a month that became empty and a
+        journal past 'compact_size' are written as whole month file instead.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month, changes already applied
+        :type records: :class:`RecordStore`
+        :param list changes: Tuples (operation, ordinal, record) with operation
+            being 'add', 'update' or 'delete'; record is None for 'delete'
+        """
+        if len(records) == 0 or not os.path.isfile(self.location(year, month)):
+            self.save(year, month, records)
+            return
+        lines = []
+        for operation, ordinal, record in changes:
+            entry = {"op": operation, "date": date.fromordinal(ordinal).strftime("%d.%m.%Y")}
+            if record is not None:
+                entry["record"] = record.to_dict()
+            lines.append(json.dumps(entry) + "\n")
+        journal = self.journal_location(year, month)
+        with open(journal, "ab+") as f:
+            # start on a fresh line if the last append was torn
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    lines.insert(0, "\n")
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if size > self.compact_size:
+            self.save(year, month, records)
+
+    def compact(self, year, month):
+        """Fold the journal of a month into the month file.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        if os.path.isfile(self.journal_location(year, month)):
+            self.save(year, month, self.load(year, month))
+
+    def save(self, year, month, records):
+        """Replace all records of a month and drop its journal, an empty month
+        removes its file.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month
+        :type records: :class:`RecordStore`
+        """
+        file = self.location(year, month)
+        if len(records) > 0:
+            write_json_file(file, records.to_list())
+        elif os.path.isfile(file):
+            os.remove(file)
+        journal = self.journal_location(year, month)
+        if os.path.isfile(journal):
+            os.remove(journal)
+
+    def months(self):
+        """Returns sorted list of (year, month) tuples that have a records file."""
+        prefix, middle, suffix = self.config.get("user_defined", "records_name").split("{}")
+        pattern = re.compile(r"{}(\d{{4}}){}(\d{{2}}){}$".format(re.escape(prefix), re.escape(middle), re.escape(suffix)))
+        months = set()
+        try:
+            names = os.listdir(self.config.get("user_defined", "records_dir"))
+        except FileNotFoundError:
+            return []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                months.add((int(match.group(1)), int(match.group(2))))
+        return sorted(months)
+
+    def remove(self, year, month):
+        """Remove the records file and journal of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        for file in (self.location(year, month), self.journal_location(year, month)):
+            if os.path.isfile(file):
+                os.remove(file)
+
+    def close(self):
+        pass
+
+class SQLiteStorage(object):
+    """Keeps all records in a single SQLite database in 'records_dir'.
+
+    Dates are stored as ordinals in the primary key, so lookups by date and
+    month ranges use the table's own index; special days get their own index.
+    Every change of a record runs in a transaction, and triggers count up the
+    version of the record's month and keep the table of months with records,
+    also for changes made with other SQLite clients, e.g. by hand.
+    """
+    name = "sqlite"
+    # month of an ordinal as year * 100 + month, ordinal 1 is julian day 1721425.5
+    month_of = "CAST(strftime('%Y%m', {}.date + 1721424.5) AS INTEGER)"
+    # without a conflict clause, which INSERT OR REPLACE of a record would override in the trigger
+    count_version = ("INSERT INTO versions (month, version) SELECT {month}, 0"
+                     " WHERE NOT EXISTS (SELECT 1 FROM versions WHERE month = {month});"
+                     " UPDATE versions SET version = version + 1 WHERE month = {month};")
+    # first and last ordinal of the month of an ordinal
+    first_of = "CAST(julianday({}.date + 1721424.5, 'start of month') - 1721424.5 AS INTEGER)"
+    last_of = "CAST(julianday({}.date + 1721424.5, 'start of month', '+1 month') - 1721425.5 AS INTEGER)"
+    add_month = ("INSERT INTO months (month) SELECT {month}"
+                 " WHERE NOT EXISTS (SELECT 1 FROM months WHERE month = {month});")
+    # checks the records left, a replaced record fires no delete trigger
+    drop_month = ("DELETE FROM months WHERE month = {month}"
+                  " AND NOT EXISTS (SELECT 1 FROM records WHERE date BETWEEN {first} AND {last});")
+    schema = (
+        "CREATE TABLE IF NOT EXISTS records ("
+        " date INTEGER PRIMARY KEY,"
+        " start_day INTEGER NOT NULL,"
+        " end_day INTEGER NOT NULL,"
+        " start_break INTEGER NOT NULL,"
+        " end_break INTEGER NOT NULL,"
+        " comment TEXT NOT NULL,"
+        " special INTEGER NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS records_special ON records (special, date)",
+        # month as year * 100 + month, counted up with every write of its records
+        "CREATE TABLE IF NOT EXISTS versions ("
+        " month INTEGER PRIMARY KEY,"
+        " version INTEGER NOT NULL)",
+        "CREATE TRIGGER IF NOT EXISTS records_insert AFTER INSERT ON records BEGIN "
+        + count_version.format(month=month_of.format("NEW")) + " END",
+        "CREATE TRIGGER IF NOT EXISTS records_update AFTER UPDATE ON records BEGIN "
+        + count_version.format(month=month_of.format("OLD"))
+        + count_version.format(month=month_of.format("NEW")) + " END",
+        "CREATE TRIGGER IF NOT EXISTS records_delete AFTER DELETE ON records BEGIN "
+        + count_version.format(month=month_of.format("OLD")) + " END",
+        # months that have records
+        "CREATE TABLE IF NOT EXISTS months (month INTEGER PRIMARY KEY)",
+        "CREATE TRIGGER IF NOT EXISTS months_insert AFTER INSERT ON records BEGIN "
+        + add_month.format(month=month_of.format("NEW")) + " END",
+        "CREATE TRIGGER IF NOT EXISTS months_update AFTER UPDATE OF date ON records BEGIN "
+        + drop_month.format(month=month_of.format("OLD"), first=first_of.format("OLD"), last=last_of.format("OLD"))
+        + add_month.format(month=month_of.format("NEW")) + " END",
+        "CREATE TRIGGER IF NOT EXISTS months_delete AFTER DELETE ON records BEGIN "
+        + drop_month.format(month=month_of.format("OLD"), first=first_of.format("OLD"), last=last_of.format("OLD")) + " END",
+        # fills the table once for databases written before it existed
+        "INSERT INTO months (month) SELECT DISTINCT " + month_of.format("records")
+        + " FROM records WHERE NOT EXISTS (SELECT 1 FROM months)",
+    )
+    columns = "date, start_day, end_day, start_break, end_break, comment, special"
+
+    def __init__(self, config):
+        """Constructor, initializes 'config' instance attribute.
+
+        :param config: Timesheet configuration
+        :type config: :class:`configparser.ConfigParser`
+        """
+        self.config = config
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Connection to the database, opened and set up on first use."""
+        if self._connection is None:
+            import sqlite3
+            file = self.location()
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            # used by one thread at a time, though not always the same one,
+            # e.g. by the handler threads of the daemon
+            self._connection = sqlite3.connect(file, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                # one transaction, so no write slips in between the triggers and the backfill
+                self._connection.execute("BEGIN IMMEDIATE")
+                for statement in self.schema:
+                    self._connection.execute(statement)
+        return self._connection
+
+    def location(self, year=None, month=None):
+        """Returns the name of the database file, the same for every month."""
+        return os.path.join(
+            self.config.get("user_defined", "records_dir"),
+            self.config.get("user_defined", "database_name")
+        )
+
+    def lock(self, year, month):
+        """Returns a context manager holding the write lock of a month, see :func:`file_lock`.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        name = "{}.{}.lock".format(self.config.get("user_defined", "database_name"), month_key(year, month))
+        return file_lock(lock_location(self.config, name))
+
+    def version(self, year, month):
+        """Returns a value that changes whenever the records of a month are written.
+
+        The month's write counter and its number of records, the latter
+        telling a recreated database apart.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        row = self.connection.execute(
+            "SELECT (SELECT version FROM versions WHERE month = ?),"
+            " (SELECT count(*) FROM records WHERE date BETWEEN ? AND ?)",
+            (year * 100 + month,) + month_range(year, month)).fetchone()
+        return (row[0] or 0, row[1])
+
+    def load(self, year, month):
+        """Returns the records of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :rtype: :class:`RecordStore`
+        """
+        cursor = self.connection.execute(
+            "SELECT {} FROM records WHERE date BETWEEN ? AND ? ORDER BY date".format(self.columns),
+            month_range(year, month))
+        return RecordStore(self.to_record(row) for row in cursor)
+
+    def apply(self, year, month, records, changes):
+        """Persist changes made to the records of a month in one transaction.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month, changes already applied
+        :type records: :class:`RecordStore`
+        :param list changes: Tuples (operation, ordinal, record) with operation
+            being 'add', 'update' or 'delete'; record is None for 'delete'
+        """
+        with self.connection as connection:
+            for operation, ordinal, record in changes:
+                if operation == "delete":
+                    connection.execute("DELETE FROM records WHERE date = ?", (ordinal,))
+                else:
+                    connection.execute("INSERT OR REPLACE INTO records ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(self.columns),
+                                       self.to_row(record))
+
+    def save(self, year, month, records):
+        """Replace all records of a month in one transaction.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month
+        :type records: :class:`RecordStore`
+        """
+        with self.connection as connection:
+            self.save_month(connection, year, month, records)
+
+    def save_month(self, connection, year, month, records):
+        """Replace all records of a month, inside a transaction owned by the caller."""
+        connection.execute("DELETE FROM records WHERE date BETWEEN ? AND ?", month_range(year, month))
+        connection.executemany("INSERT INTO records ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(self.columns),
+                               (self.to_row(record) for record in records))
+
+    def months(self):
+        """Returns sorted list of (year, month) tuples that have records."""
+        return [divmod(month, 100) for (month,) in
+                self.connection.execute("SELECT month FROM months ORDER BY month")]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def to_row(record):
+        return (record.ordinal, record.start_day, record.end_day, record.start_break,
+                record.end_break, record.comment, int(record.special))
+
+    @staticmethod
+    def to_record(row):
+        return Record(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]))
+
+STORAGES = {
+    JSONStorage.name: JSONStorage,
+    SQLiteStorage.name: SQLiteStorage,
+}
+
+def open_storage(config):
+    """Returns the storage backend selected in the configuration.
+
+    :param config: Timesheet configuration
+    :type config: :class:`configparser.ConfigParser`
+    :raises ValueError: If the configured storage is unknown
+    """
+    name = config.get("user_defined", "storage")
+    if name not in STORAGES:
+        raise ValueError("Unknown storage '{}', expected one of: {}".format(name, ", ".join(sorted(STORAGES))))
+    return STORAGES[name](config)
@@ -0,0 +1,48 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .timesheet import Timesheet
+
+def export_trainee(entry, start, end, single_workbook=False):
+    """Export the timesheets of one trainee, never raises.
+
+    :param dict entry: Roster entry with keys 'name', 'records_dir' and 'exports_dir'
+    :param datetime.date start: Date in the first month to export
+    :param datetime.date end: Date in the last month to export
+    :param bool single_workbook: Write all months as sheets of one workbook
+    :return: Dictionary with 'name', 'success', 'error', 'seconds' and 'files'
+    """
+    result = {"name": entry.get("name", ""), "success": False, "error": "", "seconds": 0.0, "files": []}
+    begin = time.perf_counter()
+    try:
+        timesheet = Timesheet(name=entry["name"],
+                              records_dir=entry["records_dir"],
+                              exports_dir=entry["exports_dir"])
+        result["files"] = timesheet.export_range(start, end, single_workbook)
+        result["success"] = True
+        timesheet.close()
+    except Exception as error:
+        result["error"] = "{}: {}".format(type(error).__name__, error)
+    result["seconds"] = time.perf_counter() - begin
+    return result
+
+def team_export(roster, start, end=None, workers=None, single_workbook=False):
+    """Export the timesheets of many trainees in parallel worker processes.
+
+    :param roster: Iterable of dictionaries with keys 'name', 'records_dir' and 'exports_dir'
+    :param datetime.date start: Date in the first month to export
+    :param datetime.date end: Date in the last month to export, defaults to start
+    :param int workers: Number of worker processes, defaults to the number of CPUs
+    :param bool single_workbook: Write all months as sheets of one workbook
+    :return: List of result dictionaries, see :func:`export_trainee`, in roster order
+    """
+    roster = list(roster)
+    if not roster:
+        return []
+    end = end or start
+    workers = min(workers or os.cpu_count() or 1, len(roster))
+    if workers == 1:
+        return [export_trainee(entry, start, end, single_workbook) for entry in roster]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(export_trainee, entry, start, end, single_workbook) for entry in roster]
+        return [future.result() for future in futures]
@@ -1,46 +1,126 @@
 import os
-import sys
-import json
-import locale
 import configparser
+from contextlib import ExitStack
+from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
-from openpyxl import load_workbook
+from .records import Record
+from .records import RecordStore
+from .records import minutes_to_time
+from .records import time_to_minutes
+from . import storage
+from . import timings
+from .ledger import Ledger
+
+PROGRAM_PATH = os.path.dirname(os.path.realpath(__file__))
+CONFIG_FILE = os.path.join(PROGRAM_PATH, os.path.basename(__file__).split(".")[0] + ".ini")
+
+class TimesheetError(Exception):
+    """Raised when an operation on the timesheet cannot be carried out.
+    """
 
 class Timesheet(object):
     """Object for managing work hours timesheet.
     """
-    def __init__(self):
+    user_defined = ("name", "records_dir", "exports_dir", "templates_dir", "storage", "state", "socket", "locking")
+    # attempts of an optimistic write before giving up, see change_month()
+    optimistic_retries = 20
+    # parsed configurations shared by all instances: {config_file: (mtime, config)}
+    _config_cache = {}
+
+    def __init__(self, **overrides):
         """Constructor,  initializes 'config' instance attribute.
 
+        The configuration file is parsed only once per process, unless it
+        changes on disk. Records and exports directories are created when
+        something is written to them.
+
+        :param overrides: User defined configuration values used by this
+            instance only, e.g. records_dir="/path/to/records"
+        :raises ValueError: If a key of overrides cannot be configured
+        """
+        self.config_file = CONFIG_FILE
+        self.overrides = overrides
+        self.config = self.read_config(self.config_file)
+        if overrides:
+            self.config = self.override_config(self.config, overrides)
+        self._storage = None
+        self._calendar = None
+        # months loaded in a batch, {(year, month): (records, changes, version, loaded)}, see batch()
+        self._batch = None
+
+    @classmethod
+    def read_config(cls, config_file):
+        """Returns the configuration with defaults and user defined values.
+
         :param str config_file: Name of configuration file
+        :rtype: :class:`configparser.ConfigParser`
         """
-        program_path = os.path.dirname(os.path.realpath(__file__))
-        config_file_name = os.path.basename(__file__).split(".")[0] + ".ini"
-        self.config_file = os.path.join(program_path, config_file_name)
+        try:
+            mtime = os.stat(config_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        cached = cls._config_cache.get(config_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
         config = configparser.ConfigParser()
-        config.read(self.config_file)
-        self.config = configparser.ConfigParser()
         # default configuration
-        self.config["DEFAULT"] = {}
-        self.config["DEFAULT"]["name"] = ""
-        self.config["DEFAULT"]["records_name"] = "timesheet_{}_{}.json"
-        self.config["DEFAULT"]["records_dir"] = os.path.join(program_path, "data/records")
-        self.config["DEFAULT"]["exports_name"] = "timesheet_{}_{}.xlsx"
-        self.config["DEFAULT"]["exports_dir"] = os.path.join(program_path, "data/exports")
-        self.config["DEFAULT"]["templates_name"] = "template_timesheet_{}_days.xlsx"
-        self.config["DEFAULT"]["templates_dir"] = os.path.join(program_path, "data/templates")
+        config["DEFAULT"] = {}
+        config["DEFAULT"]["name"] = ""
+        config["DEFAULT"]["records_name"] = "timesheet_{}_{}.json"
+        config["DEFAULT"]["records_dir"] = os.path.join(PROGRAM_PATH, "data/records")
+        config["DEFAULT"]["exports_name"] = "timesheet_{}_{}.xlsx"
+        config["DEFAULT"]["exports_dir"] = os.path.join(PROGRAM_PATH, "data/exports")
+        config["DEFAULT"]["bundle_name"] = "timesheet_{}_{}_to_{}_{}.xlsx"
+        config["DEFAULT"]["ledger_name"] = "timesheet_ledger.json"
+        config["DEFAULT"]["manifest_name"] = "timesheet_exports.json"
+        config["DEFAULT"]["index_name"] = "timesheet_index"
+        config["DEFAULT"]["locks_name"] = "timesheet_locks"
+        config["DEFAULT"]["templates_name"] = "template_timesheet_{}_days.xlsx"
+        # no templates_dir: timesheets are built from the layout in workbook.py
+        config["DEFAULT"]["templates_dir"] = ""
+        config["DEFAULT"]["storage"] = "json"
+        config["DEFAULT"]["database_name"] = "timesheet.sqlite3"
+        config["DEFAULT"]["archive_name"] = "timesheet_{}.archive"
+        # no socket: the daemon listens in $XDG_RUNTIME_DIR or else in records_dir
+        config["DEFAULT"]["socket"] = ""
+        # no state: only federal holidays are days off
+        config["DEFAULT"]["state"] = ""
+        config["DEFAULT"]["locking"] = "lock"
         # user defined configuration
-        self.config["user_defined"] = {}
-        self.user_defined = ("name", "records_dir", "exports_dir")
-        if config.has_section("user_defined"):
-            for key in self.user_defined:
-                if config.has_option("user_defined", key) and not self.default_value(config["user_defined"][key]):
-                    self.config["user_defined"][key] = config["user_defined"][key]
-        if not os.path.isdir(self.config.get("user_defined", "records_dir")):
-            os.makedirs(self.config.get("user_defined", "records_dir"))
-        if not os.path.isdir(self.config.get("user_defined", "exports_dir")):
-            os.makedirs(self.config.get("user_defined", "exports_dir"))
+        config["user_defined"] = {}
+        if mtime is not None:
+            stored = configparser.ConfigParser()
+            stored.read(config_file)
+            if stored.has_section("user_defined"):
+                defaults = config["DEFAULT"].values()
+                for key in cls.user_defined:
+                    if stored.has_option("user_defined", key) and not stored["user_defined"][key] in defaults:
+                        config["user_defined"][key] = stored["user_defined"][key]
+        cls._config_cache[config_file] = (mtime, config)
+        return config
+
+    @classmethod
+    def override_config(cls, config, overrides):
+        """Returns a copy of the configuration with some user defined values replaced.
+
+        :param config: Configuration to copy
+        :type config: :class:`configparser.ConfigParser`
+        :param dict overrides: User defined keys and their values
+        :rtype: :class:`configparser.ConfigParser`
+        """
+        for key in overrides:
+            if key not in cls.user_defined:
+                raise ValueError("Given key '{}' cannot be configured.".format(key))
+        copied = configparser.ConfigParser()
+        copied.read_dict({"DEFAULT": config.defaults()})
+        copied["user_defined"] = {}
+        defaults = config["DEFAULT"].values()
+        for key in cls.user_defined:
+            value = overrides.get(key, config["user_defined"][key])
+            if value is not None and not value in defaults:
+                copied["user_defined"][key] = value
+        return copied
 
     def list_config(self):
         for section in ("DEFAULT", "user_defined"):
@@ -53,27 +133,202 @@ class Timesheet(object):
                         print("{} =".format(key))
 
     def set_config(self, key, value):
+        """Store a user defined value in the configuration file.
+
+        Only the given key is changed in the file, values overridden for
+        this instance stay in memory.
+
+        :param str key: One of user_defined
+        :param str value: New value
+        :return: False if the key cannot be configured or the value is invalid
+        """
+        if key == "storage" and value not in storage.STORAGES:
+            return False
+        if key == "state" and value:
+            from .workcalendar import STATES
+            if value not in STATES:
+                return False
+        if key == "locking" and value not in storage.LOCKINGS:
+            return False
         if key in self.user_defined:
-            self.config["user_defined"][key] = value
+            if key == "state" and value != self.config.get("user_defined", "state"):
+                # every month's workdays may have changed
+                ledger_file = self.ledger_location()
+                if os.path.isfile(ledger_file):
+                    with storage.file_lock(ledger_file + ".lock"):
+                        ledger = Ledger(ledger_file)
+                        ledger.clear()
+                        ledger.save()
+            stored = configparser.ConfigParser()
+            stored.read(self.config_file)
+            if not stored.has_section("user_defined"):
+                stored["user_defined"] = {}
+            stored["user_defined"][key] = value
             with open(self.config_file, 'w') as config_file:
-                self.config.write(config_file)
+                stored.write(config_file)
+            self._config_cache.pop(self.config_file, None)
+            self.config = self.read_config(self.config_file)
+            if self.overrides:
+                self.config = self.override_config(self.config, self.overrides)
+            self.close()
             return True
         return False
 
     def default_value(self, value):
         return value in self.config["DEFAULT"].values()
 
+    @property
+    def storage(self):
+        """Storage backend selected with the 'storage' configuration key,
+        reading archived months from their yearly archives."""
+        if self._storage is None:
+            # archives are memory mapped columns, keep them off the startup path
+            from .archive import ArchiveStorage
+            self._storage = ArchiveStorage(storage.open_storage(self.config), self.config)
+        return self._storage
+
+    @property
+    def calendar(self):
+        """Workdays of the federal state selected with the 'state' configuration key."""
+        state = self.config.get("user_defined", "state")
+        if self._calendar is None or self._calendar.state != state:
+            from .workcalendar import WorkCalendar
+            self._calendar = WorkCalendar(state)
+        return self._calendar
+
+    def close(self):
+        """Release the storage backend, it's opened again when needed."""
+        if self._storage is not None:
+            self._storage.close()
+            self._storage = None
+        self._calendar = None
+
     def load_records(self, date):
         """Initializes 'records_file' and 'records' instance attributes.
 
         :param datetime.date date: Date of the records that are to be loaded,
             only year and month are relevant
         """
-        self.records_file = os.path.join(
-            self.config.get("user_defined", "records_dir"),
-            self.config.get("user_defined", "records_name").format(date.year, date.strftime("%m"))
-        )
-        self.records = self.load_json_file(self.records_file, [])
+        key = (date.year, date.month)
+        self.records_month = key
+        self.records_file = self.storage.location(date.year, date.month)
+        with timings.span("load_records", year=date.year, month=date.month):
+            if self._batch is None:
+                self.records = self.storage.load(date.year, date.month)
+            else:
+                if key not in self._batch:
+                    version = self.storage.version(date.year, date.month)
+                    records = self.storage.load(date.year, date.month)
+                    # the records as loaded, to tell changes by others apart when the batch ends
+                    self._batch[key] = (records, [], version, RecordStore(records))
+                self.records = self._batch[key][0]
+
+    def write_records(self, changes):
+        """Persist changes made to the loaded records through the storage backend.
+
+        In a batch, the changes are kept until the batch ends.
+
+        :param list changes: Tuples (operation, ordinal, record) with operation
+            being 'add', 'update' or 'delete'; record is None for 'delete'
+        """
+        year, month = self.records_month
+        if self._batch is not None:
+            self._batch[(year, month)][1].extend(changes)
+            return
+        with timings.span("write_records", year=year, month=month):
+            self.storage.apply(year, month, self.records, changes)
+            self.invalidate_ledger(year, month)
+            self.update_index(year, month, self.records)
+
+    @contextmanager
+    def batch(self):
+        """Context manager deferring the writes of add, update, delete and import.
+
+        The months touched in the batch are loaded once and kept in memory,
+        every changed month is written once when the batch ends, with its
+        changes folded into one per date. A month written by someone else in
+        the meantime is loaded again and gets the folded changes on top,
+        except for the dates someone else changed too: those changes are
+        dropped, the other writer's records are kept and a TimesheetError
+        names the dates after all other changes are written, just as
+        add_record outside a batch refuses a date that exists already. If
+        the batch ends with an exception, nothing is written and the storage
+        backend is closed, so no changed records loaded in the batch are
+        kept. Nested batches are part of the outermost one.
+
+            with timesheet.batch():
+                for date in dates:
+                    timesheet.add_record(date, work_hours, break_time, "", False)
+
+        :raises TimesheetError: If changes were dropped because someone
+            else changed the same dates during the batch
+        """
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = {}
+        try:
+            yield self
+        except BaseException:
+            self._batch = None
+            self.close()
+            raise
+        months, self._batch = self._batch, None
+        dirty = []
+        conflicts = []
+        for (year, month), (records, changes, version, loaded) in sorted(months.items()):
+            changes = self.fold_changes(records, changes)
+            if not changes:
+                continue
+            with self.storage.lock(year, month):
+                if self.storage.version(year, month) != version:
+                    records = self.storage.load(year, month)
+                    rebased = []
+                    for operation, ordinal, record in changes:
+                        date = datetime.fromordinal(ordinal)
+                        if records.get(date) != loaded.get(date):
+                            # added, updated or deleted by someone else meanwhile
+                            conflicts.append(date)
+                            continue
+                        if operation == "delete":
+                            records.pop(date)
+                        else:
+                            records.put(record)
+                        rebased.append((operation, ordinal, record))
+                    changes = rebased
+                    if not changes:
+                        continue
+                self.storage.apply(year, month, records, changes)
+                self.update_index(year, month, records)
+            dirty.append((year, month))
+        if dirty:
+            # the first changed month invalidates the following ones too
+            self.invalidate_ledger(*dirty[0])
+        if conflicts:
+            raise TimesheetError("Records of {} were changed by others during the batch, "
+                                 "their changes in the batch were not written.".format(
+                                     ", ".join(date.strftime("%d.%m.%Y") for date in conflicts)))
+
+    @staticmethod
+    def fold_changes(records, changes):
+        """Returns one change per date with the same effect as a list of changes.
+
+        :param records: Records of the month, changes already applied
+        :type records: :class:`RecordStore`
+        :param list changes: Tuples (operation, ordinal, record), see :meth:`write_records`
+        :return: List of tuples (operation, ordinal, record), sorted by date
+        """
+        first = {}
+        for operation, ordinal, _ in changes:
+            first.setdefault(ordinal, operation)
+        folded = []
+        for ordinal, operation in sorted(first.items()):
+            record = records.get(datetime.fromordinal(ordinal))
+            if record is not None:
+                folded.append(("add" if operation == "add" else "update", ordinal, record))
+            elif operation != "add":
+                folded.append(("delete", ordinal, None))
+        return folded
 
     def netto_workdays(self, start_date, end_date, holidays=[], weekend_days=[5,6]):
         """Calculates number of workdays between two given dates, subtracting weekends.
@@ -100,6 +355,50 @@ class Timesheet(object):
                 num_workdays -= 1
         return num_workdays
 
+    def change_month(self, date, change):
+        """Load the records of a month, run a change on them and write it.
+
+        With 'locking' set to 'lock', the month's write lock is held from
+        loading to writing, so concurrent writers of a month, e.g. a cron job
+        and a human, take turns instead of dropping each other's changes.
+        With 'optimistic', the month is loaded and changed without the lock
+        and written under it only if nobody wrote the month in the meantime,
+        else the change runs again on the fresh records. In a batch, the
+        change is kept until the batch ends.
+
+        :param datetime.date date: Date in the month
+        :param change: Function changing the loaded records, returns a tuple
+            (result, changes) with changes as for :meth:`write_records`
+        :return: Result of change
+        :raises TimesheetError: If the month was written by others during
+            'optimistic_retries' attempts in a row
+        """
+        if self._batch is not None:
+            self.load_records(date)
+            result, changes = change()
+            if changes:
+                self.write_records(changes)
+            return result
+        if self.config.get("user_defined", "locking") != "optimistic":
+            with self.storage.lock(date.year, date.month):
+                self.load_records(date)
+                result, changes = change()
+                if changes:
+                    self.write_records(changes)
+            return result
+        for _ in range(self.optimistic_retries):
+            version = self.storage.version(date.year, date.month)
+            self.load_records(date)
+            result, changes = change()
+            if not changes:
+                return result
+            with self.storage.lock(date.year, date.month):
+                if self.storage.version(date.year, date.month) == version:
+                    self.write_records(changes)
+                    return result
+        raise TimesheetError("Records of {} {} kept changing, gave up after {} attempts.".format(
+            date.strftime("%B"), date.year, self.optimistic_retries))
+
     def add_record(self, date, work_hours, break_time, comment, special):
         """Add a new record in timesheet.
 
@@ -110,13 +409,13 @@ class Timesheet(object):
         :param bool special: Whether the record is special or not
         :rtype: bool
         """
-        self.load_records(date)
-        if not self.record_exists(date):
+        def add():
+            if self.record_exists(date):
+                return False, []
             record = self.create_record(date, work_hours, break_time, comment, special)
-            self.records.append(record)
-            self.write_json_file(self.records_file, self.records)
-            return True
-        return False
+            self.records.put(record)
+            return True, [("add", record.ordinal, record)]
+        return self.change_month(date, add)
 
     def delete_record(self, date):
         """Delete a record from timesheet.
@@ -124,16 +423,11 @@ class Timesheet(object):
         :param datetime.date date: Date of record
         :rtype: bool
         """
-        self.load_records(date)
-        for record in self.records:
-            if date.strftime("%d.%m.%Y") == record["date"]:
-                self.records.remove(record)
-                if len(self.records) > 0:
-                    self.write_json_file(self.records_file, self.records)
-                else:
-                    os.remove(self.records_file)
-                return True
-        return False
+        def delete():
+            if self.records.pop(date) is None:
+                return False, []
+            return True, [("delete", date.toordinal(), None)]
+        return self.change_month(date, delete)
 
     def update_record(self, date, work_hours, break_time, comment, special):
         """Replace a record in timesheet.
@@ -145,34 +439,102 @@ class Timesheet(object):
         :param bool special: Whether the record is special or not
         :rtype: bool
         """
-        self.load_records(date)
         new_record = self.create_record(date, work_hours, break_time, comment, special)
-        for record in self.records:
-            if date.strftime("%d.%m.%Y") == record["date"] and not record == new_record:
-                record.update(new_record)
-                self.write_json_file(self.records_file, self.records)
-                return True
-        return False
+        def update():
+            record = self.records.get(date)
+            if record is None or record == new_record:
+                return False, []
+            self.records.put(new_record)
+            return True, [("update", new_record.ordinal, new_record)]
+        return self.change_month(date, update)
+
+    def import_records(self, records):
+        """Add many records at once, writing every month only once.
+
+        Records are grouped by month, each group is merged against the existing
+        records of that month and written to the storage in a single step.
+
+        :param records: Iterable of dictionaries following the records file schema
+        :return: List of records that were not imported because their date
+            already exists in the timesheet or appears twice in the input
+        :raises ValueError: If a record's date or times don't follow the expected format
+        """
+        buckets = {}
+        conflicts = []
+        for record in records:
+            record = Record.from_dict(record)
+            date = record.date
+            bucket = buckets.setdefault((date.year, date.month), RecordStore())
+            if date in bucket:
+                conflicts.append(record)
+            else:
+                bucket.put(record)
+        def merge(bucket):
+            existing = []
+            changes = []
+            for record in bucket:
+                if record in self.records:
+                    existing.append(record)
+                else:
+                    self.records.put(record)
+                    changes.append(("add", record.ordinal, record))
+            return existing, changes
+        for (year, month), bucket in sorted(buckets.items()):
+            conflicts.extend(self.change_month(datetime(year, month, 1), lambda: merge(bucket)))
+        return conflicts
+
+    def archive_records(self, before):
+        """Move the records of all months before the given one into yearly archives.
+
+        :param datetime.date before: Date in the first month that stays open
+        :return: Number of archived months
+        """
+        months = [month for month in self.storage.backend.months() if month < (before.year, before.month)]
+        return self.storage.archive_months(months)
+
+    def migrate_records(self, keep=False):
+        """Move all records files into the SQLite database in one transaction.
+
+        The write locks of all months are held until their files are removed,
+        so no record written meanwhile is left behind.
+
+        :param bool keep: Keep the records files after they were migrated
+        :return: Number of migrated months
+        """
+        source = storage.JSONStorage(self.config)
+        target = storage.SQLiteStorage(self.config)
+        months = source.months()
+        with ExitStack() as locks:
+            for year, month in months:
+                locks.enter_context(source.lock(year, month))
+            try:
+                with target.connection as connection:
+                    for year, month in months:
+                        target.save_month(connection, year, month, source.load(year, month))
+            finally:
+                target.close()
+            if not keep:
+                for year, month in months:
+                    source.remove(year, month)
+        return len(months)
 
     def create_record(self, date, work_hours, break_time, comment, special):
-        """Create a record as dictionary.
+        """Create a record object.
 
         :param datetime.date date: Date of record
         :param tuple work_hours: Two datetime.time objects representing start and end of workday
         :param tuple break_time: Two datetime.time objects representing start and end of break time
         :param str comment: Comment for the record
         :param bool special: Whether the record is special or not
-        :return: Dictionary with record data
-        """
-        return {
-            "date": date.strftime("%d.%m.%Y"),
-            "start_day": work_hours[0].strftime("%H:%M"),
-            "end_day": work_hours[1].strftime("%H:%M"),
-            "start_break": break_time[0].strftime("%H:%M"),
-            "end_break": break_time[1].strftime("%H:%M"),
-            "comment": comment,
-            "special": str(special)
-        }
+        :return: Record object
+        """
+        return Record(date.toordinal(),
+                      time_to_minutes(work_hours[0]),
+                      time_to_minutes(work_hours[1]),
+                      time_to_minutes(break_time[0]),
+                      time_to_minutes(break_time[1]),
+                      comment,
+                      bool(special))
 
     def write_json_file(self, file, content):
         """Write list of records to JSON file.
@@ -180,20 +542,18 @@ class Timesheet(object):
         :param str file: Name of file to write
         :param content: Content to write in file
         """
-        with open(file, "w", encoding="utf-8") as f:
-            json.dump(content, f, indent=2)
+        storage.write_json_file(file, content)
 
-    def load_json_file(self, file, default_content=None):
+    def load_json_file(self, file, default_content=None, object_hook=None):
         """Load JSON file, return content.
 
         :param str file: Name of file to load
         :param default_content: Default content to return as loaded content
+        :param object_hook: Function called with every decoded JSON object,
+            e.g. Record.from_dict
         :return: Content from file
         """
-        if os.path.isfile(file) and os.path.getsize(file):
-            with open(file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return default_content
+        return storage.load_json_file(file, default_content, object_hook)
 
     def record_exists(self, date):
         """Check if record exists already.
@@ -201,90 +561,649 @@ class Timesheet(object):
         :param datetime.date: Date to look for
         return: Bool with the result
         """
-        for record in self.records:
-            if date.strftime("%d.%m.%Y") == record["date"]:
-                return True
-        return False
+        return date in self.records
+
+    def socket_location(self):
+        """Returns the name of the socket the daemon listens on."""
+        socket_file = self.config.get("user_defined", "socket")
+        if socket_file:
+            return socket_file
+        if os.environ.get("XDG_RUNTIME_DIR"):
+            return os.path.join(os.environ["XDG_RUNTIME_DIR"], "azubi-timesheet.sock")
+        return os.path.join(self.config.get("user_defined", "records_dir"), "timesheet.sock")
+
+    def ledger_location(self):
+        """Returns the name of the ledger file in 'exports_dir'."""
+        return os.path.join(self.config.get("user_defined", "exports_dir"),
+                            self.config.get("user_defined", "ledger_name"))
+
+    def index_location(self):
+        """Returns the name of the record index directory in 'records_dir'."""
+        return os.path.join(self.config.get("user_defined", "records_dir"),
+                            self.config.get("user_defined", "index_name"))
 
-    def extract_carryover_hours(self, file):
-        """Reads excel file, returns carryover hours.
+    def update_index(self, year, month, records):
+        """Index the records of a changed month, if the record index was built.
 
-        :param str file: name of file to read
-        return: number of carryover hours from file
+        Called with the month's write lock held, right after writing it.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :param records: All records of the month
+        :type records: :class:`RecordStore`
         """
-        try:
-            wb = load_workbook(file, data_only=True)
-        except FileNotFoundError:
-            return 0
-        row = wb["Logging"].cell(row=2, column=2).value
-        column = wb["Logging"].cell(row=3, column=2).value
-        return wb["Timesheet"].cell(row=row, column=column).value
+        from .index import RecordIndex
+        index = RecordIndex(self.index_location())
+        if index.exists():
+            index.add_month(year, month, records, self.storage.version(year, month))
 
-    def extract_date(self, record):
-        return datetime.strptime(record["date"], "%d.%m.%Y")
+    def record_index(self, start=None, end=None):
+        """Returns the record index, brought up to date with the storage for a date range.
 
-    def export(self, date):
-        """Export timesheet as .xlsx file
+        The index is built on first use and from then on kept up to date by
+        every change made through the timesheet; months changed otherwise,
+        e.g. archived or migrated, are noticed by their version and indexed
+        again. A month indexed while it's written is stamped with the version
+        read before loading it, so it's indexed again next time.
 
-        :param datetime.date date:  Date of the timesheet to be exported
+        :param datetime.date start: First day, None for no limit
+        :param datetime.date end: Last day, None for no limit
+        :return: Tuple (index, sorted (year, month) tuples with records in the range)
+        :rtype: tuple(:class:`RecordIndex`, list)
         """
-        self.load_records(date)
-        if len(self.records) == 0:
-            exit_message = "Exiting. There are no records for {} {} to export.".format(date.strftime("%B"), date.year)
-            sys.exit(exit_message)
-        self.records.sort(key=self.extract_date)
-
-        total_days = (date.replace(month = date.month % 12 +1, day = 1)-timedelta(days=1)).day
-        start_month = date.replace(day = 1)
-        end_month = date.replace(day = total_days)
-        workdays = self.netto_workdays(start_month, end_month, weekend_days=(5,6))
-        template_file = os.path.join(self.config.get("user_defined", "templates_dir"),
-            self.config.get("user_defined", "templates_name").format(workdays))
+        from .index import RecordIndex
+        index = RecordIndex(self.index_location())
+        os.makedirs(index.directory, exist_ok=True)
+        first = (0, 0) if start is None else (start.year, start.month)
+        last = (9999, 12) if end is None else (end.year, end.month)
+        months = [month for month in self.storage.months() if first <= month <= last]
+        for year, month in months:
+            version = self.storage.version(year, month)
+            if not index.current(year, month, version):
+                index.add_month(year, month, self.storage.load(year, month), version)
+        for year, month in set(index.indexed()) - set(months):
+            if first <= (year, month) <= last:
+                index.remove_month(year, month)
+        return index, months
 
-        export_file = os.path.join(
-            self.config.get("user_defined", "exports_dir"),
-            self.config.get("user_defined", "exports_name").format(date.year, date.strftime("%m"))
-        )
-        prev_month = (start_month - timedelta(days=1)).strftime("%m")
-        prev_export_file = os.path.join(
+    def query(self, start=None, end=None, special=None, weekdays=None,
+              min_hours=None, max_hours=None, words=(), contains=None):
+        """Returns the records matching all given conditions, from the record index.
+
+        Only the index files of the months in the date range are read, and
+        only the months holding matches are loaded.
+
+        :param datetime.date start: First day, None for no limit
+        :param datetime.date end: Last day, None for no limit
+        :param bool special: Only special records if True, only regular ones if False
+        :param weekdays: Weekdays to match, 0=monday
+        :param float min_hours: Least worked hours
+        :param float max_hours: Most worked hours
+        :param words: Words every comment must have, case is ignored
+        :param str contains: Text every comment must contain, case is ignored
+        :return: List of records, sorted by date
+        """
+        with timings.span("query"):
+            index, months = self.record_index(start, end)
+            records = []
+            for year, month in months:
+                found = index.search(year, month,
+                                     None if start is None else start.toordinal(),
+                                     None if end is None else end.toordinal(),
+                                     special,
+                                     None if weekdays is None else set(weekdays),
+                                     None if min_hours is None else round(min_hours * 60),
+                                     None if max_hours is None else round(max_hours * 60),
+                                     words, contains)
+                if not found:
+                    continue
+                loaded = self.storage.load(year, month)
+                for ordinal in found:
+                    record = loaded.get(datetime.fromordinal(ordinal))
+                    if record is None:
+                        continue
+                    if contains and contains.lower() not in record.comment.lower():
+                        continue
+                    records.append(record)
+            return records
+
+    def manifest_location(self):
+        """Returns the name of the export manifest in 'exports_dir'."""
+        return os.path.join(self.config.get("user_defined", "exports_dir"),
+                            self.config.get("user_defined", "manifest_name"))
+
+    def carryover_hours(self, ledger, year, month):
+        """Returns the closing balance of a month, to be carried over into the next one.
+
+        Months missing in the ledger, or whose entry is stale because their
+        records or the carryover into them changed since, are computed from
+        their records and added to it, starting with no carryover before the
+        first month that has records. Months without records pass the
+        carryover on unchanged.
+
+        :param ledger: Ledger of exported months
+        :type ledger: :class:`Ledger`
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :return: Hours carried over into the following month
+        """
+        closing = 0
+        for other in self.storage.months():
+            if other > (year, month):
+                break
+            version = self.storage.version(*other)
+            known = ledger.closing(other[0], other[1], version, closing)
+            if known is None:
+                records = self.storage.load(*other)
+                if len(records) == 0:
+                    continue
+                workdays = self.month_workdays(datetime(other[0], other[1], 1))
+                _, rows = self.month_layout(records, workdays)
+                balance = self.hours_balance(records, workdays, rows)
+                ledger.update(other[0], other[1], closing, balance, version)
+                known = closing + balance
+            closing = known
+        return closing
+
+    def rebuild_ledger(self):
+        """Recompute the closing balance of every month with records in one pass.
+
+        :return: Number of months in the rebuilt ledger
+        """
+        ledger = Ledger(self.ledger_location())
+        ledger.clear()
+        months = self.storage.months()
+        if months:
+            self.carryover_hours(ledger, *months[-1])
+        return self.save_ledger(ledger, replace=True)
+
+    def save_ledger(self, ledger, replace=False):
+        """Merge the entries computed since loading a ledger into the ledger file.
+
+        The file is read again under its lock, so entries dropped by writers
+        in the meantime stay dropped, as do the ones found stale while
+        computing, see :meth:`Ledger.closing`: the computed entries are
+        merged up to the first month whose records changed since they were
+        read, or whose entry they were computed from was dropped or replaced.
+
+        :param ledger: Ledger with computed entries, see :meth:`Ledger.update`
+        :type ledger: :class:`Ledger`
+        :param bool replace: Drop all other entries of the file
+        :return: Number of months in the ledger file
+        """
+        ledger_file = self.ledger_location()
+        with storage.file_lock(ledger_file + ".lock"):
+            current = Ledger(ledger_file)
+            if replace:
+                current.clear()
+            elif ledger.dropped is not None:
+                # entries found stale while computing
+                current.invalidate(*ledger.dropped)
+            stale = [key for key, entry in ledger.read.items() if current.entries.get(key) != entry]
+            stale.extend(key for key, (year, month, version) in ledger.written.items()
+                         if self.storage.version(year, month) != version)
+            first_stale = min(stale, default=None)
+            for key in sorted(ledger.written):
+                if first_stale is not None and key >= first_stale:
+                    break
+                current.entries[key] = ledger.entries[key]
+            current.save()
+        return len(current.entries)
+
+    def invalidate_ledger(self, year, month):
+        """Drop the ledger entries depending on the records of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        ledger_file = self.ledger_location()
+        if os.path.isfile(ledger_file):
+            # two writers dropping entries at once must not bring any back
+            with storage.file_lock(ledger_file + ".lock"):
+                ledger = Ledger(ledger_file)
+                if ledger.invalidate(year, month):
+                    ledger.save()
+
+    def previous_month(self, date):
+        """Returns year and month of the month before the given date's month.
+
+        :param datetime.date date: Date in the month
+        :rtype: tuple(int, int)
+        """
+        prev_date = date.replace(day = 1) - timedelta(days=1)
+        return prev_date.year, prev_date.month
+
+    def extract_date(self, record):
+        return record.date
+
+    def export_location(self, year, month):
+        """Returns the name of the export file of a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        """
+        return os.path.join(
             self.config.get("user_defined", "exports_dir"),
-            self.config.get("user_defined", "exports_name").format(date.year, prev_month)
+            self.config.get("user_defined", "exports_name").format(year, "{:02d}".format(month))
         )
-        carryover_hours = self.extract_carryover_hours(prev_export_file)
 
-        # set locale to use weekdays, months full name in german
-        locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
-        wb = load_workbook(template_file)
-        ws = wb["Timesheet"]
-        ws.cell(row=7, column=4).value = self.config.get("user_defined", "name")
+    def template_location(self, workdays):
+        """Returns the name of the template file for a month with given workdays.
+
+        Template files are an optional override of the built-in layout, e.g.
+        'data/templates' of this package holds the former 19 to 23 days ones.
+
+        :param int workdays: Number of workdays in the month
+        :return: Name of the template file, None if 'templates_dir' isn't set
+            or has no template for that many workdays
+        """
+        templates_dir = self.config.get("user_defined", "templates_dir")
+        if not templates_dir:
+            return None
+        template_file = os.path.join(templates_dir,
+            self.config.get("user_defined", "templates_name").format(workdays))
+        return template_file if os.path.isfile(template_file) else None
+
+    def month_workdays(self, date):
+        """Returns number of workdays in the month of the given date, holidays excluded.
+
+        :param datetime.date date: Date in the month, day is not relevant
+        """
+        return self.calendar.month_workdays(date.year, date.month)
+
+    def hours_balance(self, records, workdays, rows=None):
+        """Returns the hours a month adds to the carryover, as the template computes it.
+
+        The template sums the worked hours of its day rows and subtracts
+        8 hours for every workday.
+
+        :param records: Records of the month, sorted by date
+        :param int workdays: Number of workdays in the month
+        :param int rows: Number of day rows in the template, defaults to workdays
+        :return: Worked hours minus 8 hours for every workday
+        """
+        rows = workdays if rows is None else rows
+        minutes = sum(record.work_minutes for record, _ in zip(records, range(rows)))
+        return minutes / 60 - workdays * 8
+
+    def month_layout(self, records, workdays):
+        """Returns the template file and the number of day rows of a month's timesheet.
+
+        A month with more records than its template file has day rows, e.g.
+        with records on holidays or weekends, is built from the built-in
+        layout instead, so no record is left out of the timesheet or its
+        balance.
+
+        :param records: Records of the month
+        :param int workdays: Number of workdays in the month
+        :return: Tuple (template file or None, rows)
+        """
+        template_file = self.template_location(workdays)
+        if template_file and len(records) > workdays:
+            template_file = None
+        return template_file, self.timesheet_rows(records, workdays, template_file)
+
+    def timesheet_rows(self, records, workdays, template_file):
+        """Returns the number of day rows of a month's timesheet.
+
+        Template files have one row per workday, built timesheets grow to
+        fit records on weekends too.
+
+        :param records: Records of the month
+        :param int workdays: Number of workdays in the month
+        :param str template_file: Template file used, or None
+        """
+        return workdays if template_file else max(workdays, len(records))
+
+    def write_closing(self, wb, closing_hours):
+        """Write the closing balance of a month as plain value into the 'Logging' sheet.
+
+        :param wb: Workbook created from a template
+        :param float closing_hours: Hours carried over into the next month
+        """
+        wb["Logging"].cell(row=4, column=1).value = "closing"
+        wb["Logging"].cell(row=4, column=2).value = closing_hours
+
+    def timesheet_values(self, date, records, carryover_hours):
+        """Returns name, month, carryover and records as cell values of a 'Timesheet' sheet.
+
+        :param datetime.date date: Date of the timesheet, only year and month are relevant
+        :param records: Records of the month, sorted by date
+        :param carryover_hours: Hours carried over from the previous month
+        :return: Dictionary {(row, column): value}
+        """
+        values = {}
+        values[(7, 4)] = self.config.get("user_defined", "name")
         month_year_str = "{} {}".format(date.strftime("%B"), date.year)
-        ws.cell(row=8, column=4).value = month_year_str
-        ws.cell(row=8, column=10).value = carryover_hours
+        values[(8, 4)] = month_year_str
+        values[(8, 10)] = carryover_hours
         row = 12
-        for record in self.records:
+        for record in records:
             col = 2
-            record_date =  datetime.strptime(record["date"], "%d.%m.%Y")
-            ws.cell(row=row, column=col).value = record_date.strftime("%A")
+            record_date = record.date
+            values[(row, col)] = record_date.strftime("%A")
             col += 1
-            ws.cell(row=row, column=col).value = record_date
+            values[(row, col)] = record_date
             col += 1
-            if "special" in record.keys() and record["special"] == "True":
-                ws.cell(row=row, column=9).value = 8.00
+            if record.special:
+                values[(row, 9)] = 8.00
                 col += 4
             else:
-                ws.cell(row=row, column=col).value = datetime.strptime(record["start_day"], "%H:%M").time()
+                values[(row, col)] = minutes_to_time(record.start_day)
                 col += 1
-                ws.cell(row=row, column=col).value = datetime.strptime(record["end_day"], "%H:%M").time()
+                values[(row, col)] = minutes_to_time(record.end_day)
                 col += 1
-                ws.cell(row=row, column=col).value = datetime.strptime(record["start_break"], "%H:%M").time()
+                values[(row, col)] = minutes_to_time(record.start_break)
                 col += 1
-                ws.cell(row=row, column=col).value = datetime.strptime(record["end_break"], "%H:%M").time()
+                values[(row, col)] = minutes_to_time(record.end_break)
                 col += 1
             col += 3
-            if record_date.strftime("%A") == "Freitag":
-                ws.cell(row=row, column=col).value = "=SUM(I{}:I{})".format(row-4, row)
+            # friday closes the week
+            if record_date.weekday() == 4:
+                values[(row, col)] = "=SUM(I{}:I{})".format(row-4, row)
             col += 1
-            ws.cell(row=row, column=col).value = record["comment"]
+            values[(row, col)] = record.comment
             row += 1
-        wb.save(export_file)
-        return True
+        return values
+
+    def fill_timesheet(self, ws, date, records, carryover_hours):
+        """Write name, month, carryover and records into a 'Timesheet' worksheet.
+
+        :param ws: Worksheet created from a template
+        :param datetime.date date: Date of the timesheet, only year and month are relevant
+        :param records: Records of the month, sorted by date
+        :param carryover_hours: Hours carried over from the previous month
+        """
+        for (row, column), value in self.timesheet_values(date, records, carryover_hours).items():
+            ws.cell(row=row, column=column).value = value
+
+    @timings.timed("build")
+    def build_workbook(self, date, records, workdays, rows, carryover_hours, closing_hours):
+        """Build a month's workbook from the built-in layout in write-only mode.
+
+        :param datetime.date date: Date of the timesheet, only year and month are relevant
+        :param records: Records of the month, sorted by date
+        :param int workdays: Number of workdays in the month
+        :param int rows: Number of day rows
+        :param carryover_hours: Hours carried over from the previous month
+        :param float closing_hours: Hours carried over into the next month
+        :return: Write-only workbook with 'Timesheet' and 'Logging' sheets
+        """
+        from openpyxl import Workbook
+        from .workbook import append_logging
+        from .workbook import append_timesheet
+        from .workbook import register_styles
+        wb = Workbook(write_only=True)
+        register_styles(wb)
+        values = self.timesheet_values(date, records, carryover_hours)
+        balance_row = append_timesheet(wb.create_sheet("Timesheet"), rows, workdays, values)
+        append_logging(wb.create_sheet("Logging"), balance_row, closing_hours)
+        return wb
+
+    def month_workbook(self, date, records, workdays, template_file, rows,
+                       carryover_hours, closing_hours, template_content=None):
+        """Returns a new workbook with a month's timesheet, from its template file or built.
+
+        :param datetime.date date: Date of the timesheet, only year and month are relevant
+        :param records: Records of the month, sorted by date
+        :param int workdays: Number of workdays in the month
+        :param str template_file: Template file to fill, or None
+        :param int rows: Number of day rows
+        :param carryover_hours: Hours carried over from the previous month
+        :param float closing_hours: Hours carried over into the next month
+        :param bytes template_content: Content of the template file, if already read
+        """
+        if not template_file:
+            return self.build_workbook(date, records, workdays, rows, carryover_hours, closing_hours)
+        from openpyxl import load_workbook
+        if template_content is not None:
+            import io
+            template_file = io.BytesIO(template_content)
+        with timings.span("template"):
+            wb = load_workbook(template_file)
+        with timings.span("fill"):
+            self.fill_timesheet(wb["Timesheet"], date, records, carryover_hours)
+            self.write_closing(wb, closing_hours)
+        return wb
+
+    @staticmethod
+    def digest(*parts):
+        """Returns a hex digest of the representation of some values."""
+        import hashlib
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def export_layout(self, template_file, workdays, rows):
+        """Returns a digest of everything a month's export is built from besides its values.
+
+        Template files count with their name, modification time and size,
+        the built-in layout with the code of the workbook module.
+
+        :param str template_file: Template file used, or None
+        :param int workdays: Number of workdays in the month
+        :param int rows: Number of day rows
+        """
+        if template_file:
+            stat = os.stat(template_file)
+            source = (os.path.abspath(template_file), stat.st_mtime_ns, stat.st_size)
+        else:
+            from . import workbook
+            with open(workbook.__file__, "rb") as f:
+                source = f.read()
+        return self.digest(source, workdays, rows)
+
+    def write_export(self, manifest, date, records, workdays, template_file, rows,
+                     carryover_hours, closing_hours, force=False, template_content=None):
+        """Write the export file of a month unless it's up to date.
+
+        The manifest holds a digest of the layout and of the values of the
+        last export. If nothing changed, the file is left alone; otherwise,
+        or with force, or if the file changed since, it's written anew.
+        Rewriting only the changed rows of the file was measured no faster
+        than writing it anew, loading and saving the file costs as much as
+        building it, see 'export-changed' in benchmarks/suite.py.
+
+        :param manifest: Manifest of the exports
+        :type manifest: :class:`ExportManifest`
+        :param datetime.date date: Date of the timesheet, only year and month are relevant
+        :param records: Records of the month, sorted by date
+        :param int workdays: Number of workdays in the month
+        :param str template_file: Template file to fill, or None
+        :param int rows: Number of day rows
+        :param carryover_hours: Hours carried over from the previous month
+        :param float closing_hours: Hours carried over into the next month
+        :param bool force: Write the file anew in any case
+        :param bytes template_content: Content of the template file, if already read
+        :return: 'unchanged' or 'written'
+        """
+        export_file = self.export_location(date.year, date.month)
+        with timings.span("digest"):
+            values = self.timesheet_values(date, records, carryover_hours)
+            layout = self.export_layout(template_file, workdays, rows)
+            digest = self.digest(layout, sorted(values.items()), closing_hours)
+        entry = None if force else manifest.current(date.year, date.month, export_file)
+        if entry is not None and entry["digest"] == digest:
+            return "unchanged"
+        with timings.span("workbook"):
+            wb = self.month_workbook(date, records, workdays, template_file, rows,
+                                     carryover_hours, closing_hours, template_content)
+        self.save_workbook(wb, None, export_file)
+        manifest.update(date.year, date.month, digest, export_file)
+        return "written"
+
+    @timings.timed("save")
+    def save_workbook(self, wb, target, export_file):
+        """Save a workbook to a file, a file object or into memory.
+
+        :param wb: Workbook to save
+        :param target: Name of file or binary file object to write to, bytes
+            or memoryview to get the content back without writing a file,
+            or None to write export_file
+        :param str export_file: Name of file in 'exports_dir'
+        :return: Content for bytes and memoryview, name of the written file
+            or the file object
+        """
+        if target is bytes or target is memoryview:
+            import io
+            buffer = io.BytesIO()
+            wb.save(buffer)
+            # a memoryview of the buffer avoids copying the content
+            return buffer.getvalue() if target is bytes else buffer.getbuffer()
+        if target is not None and not isinstance(target, (str, os.PathLike)):
+            wb.save(target)
+            return target
+        file = export_file if target is None else os.fspath(target)
+        if os.path.dirname(file):
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+        wb.save(file)
+        return file
+
+    @timings.timed("export")
+    def export(self, date, target=None, force=False):
+        """Export timesheet as .xlsx file
+
+        The month's file in 'exports_dir' is only written if its records,
+        carryover or layout changed since the last export, see :meth:`write_export`.
+
+        :param datetime.date date:  Date of the timesheet to be exported
+        :param target: Name of file or binary file object to write to, bytes
+            or memoryview to get the content back, see :meth:`save_workbook`;
+            None writes the month's file in 'exports_dir'
+        :param bool force: Write the month's file in 'exports_dir' anew, even if it's up to date
+        :return: True if written to 'exports_dir', else the result of
+            :meth:`save_workbook`
+        :raises TimesheetError: If the month has no records
+        """
+        # only exporting needs these, keep them off the startup path
+        import locale
+        from .manifest import ExportManifest
+        version = self.storage.version(date.year, date.month)
+        self.load_records(date)
+        if len(self.records) == 0:
+            raise TimesheetError("There are no records for {} {} to export.".format(date.strftime("%B"), date.year))
+
+        workdays = self.month_workdays(date)
+        template_file, rows = self.month_layout(self.records, workdays)
+        export_file = self.export_location(date.year, date.month)
+        with timings.span("carryover"):
+            ledger = Ledger(self.ledger_location())
+            carryover_hours = self.carryover_hours(ledger, *self.previous_month(date))
+            balance_hours = self.hours_balance(self.records, workdays, rows)
+
+        # set locale to use weekdays, months full name in german
+        locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
+        if target is None:
+            manifest = ExportManifest(self.manifest_location())
+            if self.write_export(manifest, date, self.records, workdays, template_file, rows,
+                                 carryover_hours, carryover_hours + balance_hours, force) != "unchanged":
+                with timings.span("manifest"):
+                    manifest.save()
+            saved = True
+        else:
+            wb = self.month_workbook(date, self.records, workdays, template_file, rows,
+                                     carryover_hours, carryover_hours + balance_hours)
+            saved = self.save_workbook(wb, target, export_file)
+        with timings.span("ledger"):
+            ledger.update(date.year, date.month, carryover_hours, balance_hours, version)
+            self.save_ledger(ledger)
+        return saved
+
+    @timings.timed("export_range")
+    def export_range(self, start, end, single_workbook=False, target=None, force=False):
+        """Export timesheets of several months in one pass.
+
+        Every month's records are loaded once, every template file is read
+        once and the carryover is passed on from month to month in memory
+        instead of reading it back from the previous export. Months without
+        records are skipped, their carryover is passed on unchanged. Files of
+        months that are up to date are left alone, see :meth:`write_export`.
+        Without template files, the workbooks are streamed in write-only mode, so a
+        single workbook of many months is built in constant memory.
+
+        :param datetime.date start: Date in the first month to export
+        :param datetime.date end: Date in the last month to export
+        :param bool single_workbook: Write all months as sheets of one workbook
+            instead of one file per month
+        :param target: Where to write the single workbook to, see :meth:`save_workbook`
+        :param bool force: Write every month's file anew, even if it's up to date,
+            see :meth:`write_export`
+        :return: List of exported files, with target the result of :meth:`save_workbook`
+        :raises TimesheetError: If none of the months has records
+        :raises ValueError: If target is given without single_workbook
+        """
+        if target is not None and not single_workbook:
+            raise ValueError("Exporting to a target needs a single workbook.")
+        # only exporting needs these, keep them off the startup path
+        import locale
+        from openpyxl import Workbook
+        from openpyxl import load_workbook
+        from .workbook import append_timesheet
+        from .workbook import copy_worksheet
+        from .workbook import register_styles
+        from .manifest import ExportManifest
+        months = []
+        month = start.replace(day=1)
+        while month <= end.replace(day=1):
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+        with timings.span("carryover"):
+            ledger = Ledger(self.ledger_location())
+            carryover_hours = self.carryover_hours(ledger, *self.previous_month(start))
+
+        # set locale to use weekdays, months full name in german
+        locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
+        templates = {}
+        bundle = None
+        manifest = None
+        exported = []
+        for month in months:
+            with timings.span("load_records", year=month.year, month=month.month):
+                version = self.storage.version(month.year, month.month)
+                records = self.storage.load(month.year, month.month)
+            if len(records) == 0:
+                continue
+            workdays = self.month_workdays(month)
+            template_file, rows = self.month_layout(records, workdays)
+            balance_hours = self.hours_balance(records, workdays, rows)
+            if single_workbook:
+                if bundle is None:
+                    # template files can only be copied into a regular workbook
+                    bundle = Workbook(write_only=not self.config.get("user_defined", "templates_dir"))
+                    if not bundle.write_only:
+                        bundle.remove(bundle.active)
+                    register_styles(bundle)
+                ws = bundle.create_sheet("{} {}".format(month.strftime("%B"), month.year))
+                if template_file:
+                    if workdays not in templates:
+                        templates[workdays] = load_workbook(template_file)["Timesheet"]
+                    copy_worksheet(templates[workdays], ws)
+                    self.fill_timesheet(ws, month, records, carryover_hours)
+                else:
+                    append_timesheet(ws, rows, workdays, self.timesheet_values(month, records, carryover_hours))
+            else:
+                if template_file and workdays not in templates:
+                    with open(template_file, "rb") as f:
+                        templates[workdays] = f.read()
+                if manifest is None:
+                    manifest = ExportManifest(self.manifest_location())
+                with timings.span("month", year=month.year, month=month.month):
+                    self.write_export(manifest, month, records, workdays, template_file, rows, carryover_hours,
+                                      carryover_hours + balance_hours, force, templates.get(workdays))
+                exported.append(self.export_location(month.year, month.month))
+            ledger.update(month.year, month.month, carryover_hours, balance_hours, version)
+            carryover_hours = carryover_hours + balance_hours
+        if not exported and bundle is None:
+            raise TimesheetError("There are no records from {} {} to {} {} to export.".format(
+                start.strftime("%B"), start.year, end.strftime("%B"), end.year))
+        if bundle is not None:
+            export_file = os.path.join(
+                self.config.get("user_defined", "exports_dir"),
+                self.config.get("user_defined", "bundle_name").format(
+                    start.year, "{:02d}".format(start.month), end.year, "{:02d}".format(end.month))
+            )
+            exported.append(self.save_workbook(bundle, target, export_file))
+        if manifest is not None:
+            with timings.span("manifest"):
+                manifest.save()
+        with timings.span("ledger"):
+            self.save_ledger(ledger)
+        return exported
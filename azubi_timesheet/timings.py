@@ -0,0 +1,102 @@
+import functools
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# functions called with every finished span, see add_hook()
+_hooks = []
+# names of the spans running in a thread, outermost first
+_local = threading.local()
+
+def add_hook(hook):
+    """Register a function called with every finished span.
+
+    The hook is called with the span's name, its duration in seconds and a
+    dictionary of attributes, e.g. {'year': 2019, 'month': 12}. Names of
+    nested spans are joined with dots, e.g. 'export.save'. Hooks run in the
+    thread that ran the span, so they must be quick and must not raise.
+
+        timings.add_hook(lambda name, seconds, attributes: histogram(name).observe(seconds))
+
+    :param hook: Function taking (name, seconds, attributes)
+    """
+    _hooks.append(hook)
+
+def remove_hook(hook):
+    """Unregister a function registered with :func:`add_hook`."""
+    _hooks.remove(hook)
+
+def active():
+    """Returns True if any hook is registered."""
+    return bool(_hooks)
+
+@contextmanager
+def span(name, **attributes):
+    """Context manager timing a phase for the registered hooks.
+
+    Without hooks it does nothing but yield.
+
+    :param str name: Name of the phase
+    :param attributes: Values describing the phase, passed on to the hooks
+    """
+    if not _hooks:
+        yield
+        return
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    path = ".".join(stack)
+    begin = perf_counter()
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - begin
+        stack.pop()
+        for hook in list(_hooks):
+            hook(path, seconds, attributes)
+
+def timed(name):
+    """Decorator running every call of a function in a span, see :func:`span`.
+
+    :param str name: Name of the phase
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class Timings(object):
+    """Hook summing up the spans by name, for a breakdown of where the time went."""
+    def __init__(self):
+        # {name: [calls, seconds]}
+        self.spans = {}
+
+    def __call__(self, name, seconds, attributes):
+        entry = self.spans.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def write(self, out, total=None):
+        """Write the spans as table, nested spans indented below their parents.
+
+        :param out: Text file to write to, e.g. sys.stderr
+        :param float total: Seconds the shares are relative to, defaults to
+            the sum of the outermost spans
+        """
+        if total is None:
+            total = sum(seconds for name, (_, seconds) in self.spans.items() if "." not in name)
+        out.write("{:32} {:>6} {:>10} {:>7}\n".format("phase", "calls", "ms", "share"))
+        for name in sorted(self.spans, key=lambda name: name.split(".")):
+            calls, seconds = self.spans[name]
+            depth = name.count(".")
+            label = "  " * depth + name.rsplit(".", 1)[-1]
+            share = seconds / total * 100 if total else 0.0
+            out.write("{:32} {:>6} {:>10.1f} {:>6.1f}%\n".format(label, calls, seconds * 1000, share))
+        if total:
+            out.write("{:32} {:>6} {:>10.1f}\n".format("total", "", total * 1000))
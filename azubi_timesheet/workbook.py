@@ -0,0 +1,237 @@
+"""
+Helpers around openpyxl workbooks, only imported when exporting.
+"""
+
+from copy import copy
+
+def copy_worksheet(source, target):
+    """Copy values, styles and layout of a worksheet into another one.
+
+    Unlike :meth:`openpyxl.workbook.Workbook.copy_worksheet` this works
+    across workbooks, so a parsed template can be reused for many sheets.
+
+    :param source: Worksheet to copy from
+    :param target: Worksheet to copy into
+    """
+    # styles are registered in the target workbook once per distinct style
+    styles = {}
+    for row in source.iter_rows():
+        for cell in row:
+            new_cell = target.cell(row=cell.row, column=cell.column, value=cell.value)
+            if not cell.has_style:
+                continue
+            key = tuple(cell._style)
+            if key in styles:
+                new_cell._style = copy(styles[key])
+                continue
+            new_cell.font = copy(cell.font)
+            new_cell.border = copy(cell.border)
+            new_cell.fill = copy(cell.fill)
+            new_cell.number_format = cell.number_format
+            new_cell.protection = copy(cell.protection)
+            new_cell.alignment = copy(cell.alignment)
+            styles[key] = copy(new_cell._style)
+    for key, dimension in source.column_dimensions.items():
+        target.column_dimensions[key].width = dimension.width
+        target.column_dimensions[key].hidden = dimension.hidden
+    for key, dimension in source.row_dimensions.items():
+        target.row_dimensions[key].height = dimension.height
+    for merged in source.merged_cells.ranges:
+        target.merge_cells(str(merged))
+    target.sheet_format = copy(source.sheet_format)
+    target.sheet_properties.pageSetUpPr = copy(source.sheet_properties.pageSetUpPr)
+    target.page_margins = copy(source.page_margins)
+    target.print_options = copy(source.print_options)
+    for key in ("orientation", "paperSize", "fitToWidth", "fitToHeight", "scale"):
+        setattr(target.page_setup, key, getattr(source.page_setup, key))
+    target.sheet_view.showGridLines = source.sheet_view.showGridLines
+
+# Layout of the 'Timesheet' sheet. Rows are numbered as in the static
+# templates: the header ends at row 11, day rows start at FIRST_ROW and
+# every row below them is given as offset from the last day row.
+FIRST_ROW = 12
+LAST_COLUMN = 14
+BACKGROUND_COLUMNS = 13
+BACKGROUND_FOOTER = 27
+FOOTER_ROWS = 38 - FIRST_ROW + 1
+BALANCE_FORMAT = "\\+#,##0.00;[RED]\\-#,##0.00;#,##0.00"
+GREEN = "FF7AC142"
+WHITE = "FFFFFFFF"
+
+# name: (font size, bold, fill, horizontal alignment, borders, number format, wrap text)
+STYLES = {
+    "ts_background": (10, False, WHITE, "center", "", "General", False),
+    "ts_plain": (10, False, None, None, "", "General", False),
+    "ts_title": (16, True, WHITE, "center", "", "General", False),
+    "ts_bold": (10, True, WHITE, "center", "", "General", False),
+    "ts_bold_left": (10, True, WHITE, "general", "", "General", False),
+    "ts_text": (10, False, WHITE, "general", "", "General", False),
+    "ts_label": (10, True, WHITE, "center", "lrtb", "General", False),
+    "ts_label_left": (10, True, WHITE, "left", "lrtb", "General", False),
+    "ts_label_right": (10, True, WHITE, "right", "lrtb", "General", False),
+    "ts_rule": (10, False, WHITE, "center", "b", "General", False),
+    "ts_carryover": (10, False, GREEN, "right", "lrtb", BALANCE_FORMAT, False),
+    "ts_cell": (10, False, WHITE, "center", "lrtb", "General", False),
+    "ts_date": (10, False, WHITE, "center", "lrtb", "DD/MM/YYYY", False),
+    "ts_time": (10, False, GREEN, "center", "lrtb", "H:MM", False),
+    "ts_break": (10, False, WHITE, "center", "lrtb", "0.00", False),
+    "ts_hours": (10, False, WHITE, "center", "lrtb", "#,##0.00", False),
+    "ts_balance": (10, False, WHITE, "center", "lrtb", BALANCE_FORMAT, False),
+    "ts_comment": (10, False, WHITE, "general", "lrtb", "General", False),
+    "ts_total": (10, False, WHITE, "right", "lrtb", BALANCE_FORMAT, False),
+    "ts_sum": (10, False, WHITE, "center", "", BALANCE_FORMAT, False),
+    "ts_note": (8, False, WHITE, "center", "", "General", True),
+}
+
+COLUMN_WIDTHS = {"A": 3.78, "B": 10.94, "C": 11.61, "D": 10.94, "J": 8.33,
+                 "K": 10.07, "L": 23.22, "M": 3.78, "N": 10.94}
+TITLE_HEIGHT = 25.35
+ROW_HEIGHT = 18.45
+
+# header rows: {row: [(column, value, style), ...]}, columns B-K of rows 1-5 are the title
+HEADER = {
+    5: [(2, "Stundenzettel", "ts_title")],
+    7: [(3, "Name:", "ts_label"), (4, None, "ts_label"), (5, None, "ts_label"),
+        (6, None, "ts_label"), (7, None, "ts_label")],
+    8: [(3, "Monat:", "ts_label"), (4, None, "ts_label"), (5, None, "ts_label"),
+        (6, None, "ts_label"), (7, None, "ts_label"), (8, "Stundenübertrag", "ts_label_right"),
+        (9, None, "ts_label_right"), (10, 0, "ts_carryover"), (11, None, "ts_carryover")],
+    10: [(3, "Datum", "ts_label"), (4, "Kommt", "ts_label"), (5, "Geht", "ts_label"),
+         (6, "P-Beginn", "ts_label"), (7, "P-Ende", "ts_label"), (8, "Pause", "ts_label"),
+         (9, "AZ", "ts_label"), (10, "GES-Stunden", "ts_label"), (11, None, "ts_label"),
+         (12, "Kommentar", "ts_label_left")],
+    11: [(column, None, "ts_rule") for column in range(2, 12)] + [(12, None, "ts_text")],
+}
+HEADER_MERGES = ("B5:K5", "D7:G7", "D8:G8", "H8:I8", "J8:K8", "J10:K10")
+
+# a day row, formulas are formatted with the row number
+DAY_ROW = [(2, None, "ts_cell"), (3, None, "ts_date"), (4, None, "ts_time"), (5, None, "ts_time"),
+           (6, None, "ts_time"), (7, None, "ts_time"),
+           (8, "=(HOUR(G{row}-F{row})*60+(MINUTE(G{row}-F{row})))/60", "ts_break"),
+           (9, "=((HOUR(E{row}-D{row})*60+(MINUTE(E{row}-D{row})))/60)-H{row}", "ts_hours"),
+           (10, '=IF(I{row} > 0,I{row}-8,"")', "ts_balance"), (11, None, "ts_hours"),
+           (12, None, "ts_comment")]
+
+# footer rows: {offset after last day row: [(column, value, style), ...]},
+# values are formatted with first and last day row, balance and totals row and workdays
+FOOTER = {
+    2: [(8, "Stundenübertrag", "ts_label_right"), (9, None, "ts_label_right"),
+        (10, "=I{totals}-D{totals}+J8", "ts_total"), (11, None, "ts_total")],
+    6: [(3, "Soll:", "ts_bold"), (4, "={workdays}*8", "ts_sum"), (8, "Gesamt:", "ts_bold_left"),
+        (9, "=SUM(I{first}:I{last})", "ts_sum")],
+    9: [(3, "Unterschrift Auszubildender", "ts_text"), (7, "Unterschrift Betreuer", "ts_text"),
+        (11, "Unterschrift Ausbilder", "ts_text")],
+    11: [(3, "____________________", "ts_text"), (7, "_____________________", "ts_text"),
+         (11, "_____________________", "ts_text")],
+}
+for offset in range(17, 24):
+    FOOTER[offset] = [(column, None, "ts_note") for column in range(3, 10)]
+FOOTER_MERGES = ("H{balance}:I{balance}", "J{balance}:K{balance}", "C{note}:I{note_end}")
+
+def register_styles(wb):
+    """Add the named styles of the timesheet layout to a workbook.
+
+    :param wb: Workbook, may be write-only
+    """
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+    hair = Side(style="hair")
+    for name, (size, bold, fill, horizontal, borders, number_format, wrap) in STYLES.items():
+        if name in wb.named_styles:
+            continue
+        style = NamedStyle(name=name, number_format=number_format)
+        style.font = Font(name="Verdana", sz=size, b=bold)
+        if fill:
+            style.fill = PatternFill(fill_type="solid", fgColor=fill)
+        if horizontal:
+            style.alignment = Alignment(horizontal=horizontal, vertical="center", wrap_text=wrap)
+        style.border = Border(left=hair if "l" in borders else Side(),
+                              right=hair if "r" in borders else Side(),
+                              top=hair if "t" in borders else Side(),
+                              bottom=hair if "b" in borders else Side())
+        wb.add_named_style(style)
+
+def layout_rows(rows, workdays):
+    """Generate the cells of a 'Timesheet' sheet with given number of day rows.
+
+    :param int rows: Number of day rows
+    :param int workdays: Number of workdays, 8 hours are expected for each
+    :return: Generator of (row, {column: (value, style)}) tuples, for every row
+    """
+    last = FIRST_ROW + rows - 1
+    fields = {"first": FIRST_ROW, "last": last, "workdays": workdays,
+              "balance": last + 2, "totals": last + 6}
+    for row in range(1, last + FOOTER_ROWS + 1):
+        cells = {}
+        if row <= last + BACKGROUND_FOOTER:
+            for column in range(1, BACKGROUND_COLUMNS + 1):
+                cells[column] = (None, "ts_background")
+        cells[LAST_COLUMN] = (None, "ts_plain")
+        if row <= 5:
+            for column in range(2, 12):
+                cells[column] = (None, "ts_title")
+        if row in HEADER:
+            specs = HEADER[row]
+        elif FIRST_ROW <= row <= last:
+            specs = [(column, value and value.format(row=row), style) for column, value, style in DAY_ROW]
+        else:
+            specs = FOOTER.get(row - last, [])
+            specs = [(column, value.format(**fields) if isinstance(value, str) else value, style)
+                     for column, value, style in specs]
+        for column, value, style in specs:
+            cells[column] = (value, style)
+        if row > last + BACKGROUND_FOOTER:
+            for column in range(1, BACKGROUND_COLUMNS + 1):
+                cells.setdefault(column, (None, "ts_plain"))
+        yield row, cells
+
+def append_timesheet(ws, rows, workdays, values=None):
+    """Write a 'Timesheet' sheet row by row into an empty worksheet.
+
+    Works with write-only worksheets, so many sheets can be streamed into
+    one workbook in constant memory.
+
+    :param ws: Empty worksheet of a workbook prepared with :func:`register_styles`
+    :param int rows: Number of day rows
+    :param int workdays: Number of workdays, 8 hours are expected for each
+    :param dict values: Cell values {(row, column): value} replacing the layout's values
+    :return: Row of the cell holding the closing balance, in column 10
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.worksheet.properties import PageSetupProperties
+    values = values or {}
+    last = FIRST_ROW + rows - 1
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    ws.sheet_properties.pageSetUpPr = PageSetupProperties(fitToPage=True)
+    ws.page_setup.orientation = "portrait"
+    # A4
+    ws.page_setup.paperSize = 9
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = 1
+    ws.sheet_view.showGridLines = False
+    fields = {"balance": last + 2, "note": last + 17, "note_end": last + 23}
+    for merged in HEADER_MERGES + tuple(merged.format(**fields) for merged in FOOTER_MERGES):
+        ws.merged_cells.add(merged)
+    for row, cells in layout_rows(rows, workdays):
+        ws.row_dimensions[row].height = TITLE_HEIGHT if row <= 5 else ROW_HEIGHT
+        line = []
+        for column in range(1, LAST_COLUMN + 1):
+            value, style = cells[column]
+            cell = WriteOnlyCell(ws, value=values.get((row, column), value))
+            cell.style = style
+            line.append(cell)
+        ws.append(line)
+    return last + 2
+
+def append_logging(ws, balance_row, closing_hours=None):
+    """Write the hidden 'Logging' sheet pointing to the closing balance.
+
+    :param ws: Empty worksheet
+    :param int balance_row: Row of the closing balance in the 'Timesheet' sheet
+    :param float closing_hours: Closing balance as plain value, if known
+    """
+    ws.sheet_state = "hidden"
+    ws.append([None, "carryover"])
+    ws.append(["row", balance_row])
+    ws.append(["column", 10])
+    ws.append(["closing", closing_hours])
@@ -0,0 +1,179 @@
+from array import array
+from datetime import date
+from datetime import timedelta
+
+# German federal states, by their ISO 3166-2:DE code
+STATES = {
+    "BW": "Baden-Württemberg",
+    "BY": "Bayern",
+    "BE": "Berlin",
+    "BB": "Brandenburg",
+    "HB": "Bremen",
+    "HH": "Hamburg",
+    "HE": "Hessen",
+    "MV": "Mecklenburg-Vorpommern",
+    "NI": "Niedersachsen",
+    "NW": "Nordrhein-Westfalen",
+    "RP": "Rheinland-Pfalz",
+    "SL": "Saarland",
+    "SN": "Sachsen",
+    "ST": "Sachsen-Anhalt",
+    "SH": "Schleswig-Holstein",
+    "TH": "Thüringen",
+}
+
+# (name, (month, day) or days after easter sunday, states or None for all, first year, last year)
+HOLIDAYS = (
+    ("Neujahr", (1, 1), None, None, None),
+    ("Heilige Drei Könige", (1, 6), ("BW", "BY", "ST"), None, None),
+    ("Internationaler Frauentag", (3, 8), ("BE",), 2019, None),
+    ("Internationaler Frauentag", (3, 8), ("MV",), 2023, None),
+    ("Karfreitag", -2, None, None, None),
+    ("Ostermontag", 1, None, None, None),
+    ("Tag der Arbeit", (5, 1), None, None, None),
+    ("Christi Himmelfahrt", 39, None, None, None),
+    ("Pfingstmontag", 50, None, None, None),
+    ("Fronleichnam", 60, ("BW", "BY", "HE", "NW", "RP", "SL"), None, None),
+    ("Mariä Himmelfahrt", (8, 15), ("SL",), None, None),
+    ("Weltkindertag", (9, 20), ("TH",), 2019, None),
+    ("Tag der Deutschen Einheit", (10, 3), None, None, None),
+    ("Reformationstag", (10, 31), ("BB", "MV", "SN", "ST", "TH"), None, None),
+    ("Reformationstag", (10, 31), ("HB", "HH", "NI", "SH"), 2018, None),
+    ("Reformationstag", (10, 31), None, 2017, 2017),
+    ("Allerheiligen", (11, 1), ("BW", "BY", "NW", "RP", "SL"), None, None),
+    ("Buß- und Bettag", None, ("SN",), None, None),
+    ("1. Weihnachtstag", (12, 25), None, None, None),
+    ("2. Weihnachtstag", (12, 26), None, None, None),
+)
+
+def easter_sunday(year):
+    """Returns the date of easter sunday in the gregorian calendar.
+
+    :param int year: Year
+    :rtype: :class:`datetime.date`
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month, day = divmod(h + l - 7 * m + 90, 25)
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+def holidays(year, state=""):
+    """Returns the public holidays of a year.
+
+    :param int year: Year
+    :param str state: Code of the federal state, e.g. 'BY', empty for the
+        federal holidays only
+    :return: Dictionary {date: name}
+    """
+    easter = easter_sunday(year)
+    days = {}
+    for name, when, states, first, last in HOLIDAYS:
+        if states is not None and state not in states:
+            continue
+        if (first is not None and year < first) or (last is not None and year > last):
+            continue
+        if when is None:
+            # wednesday before november 23rd
+            day = date(year, 11, 22)
+            day -= timedelta(days=(day.weekday() - 2) % 7)
+        elif isinstance(when, tuple):
+            day = date(year, *when)
+        else:
+            day = easter + timedelta(days=when)
+        days[day] = name
+    return days
+
+class WorkCalendar(object):
+    """Workdays of a federal state, weekends and public holidays excluded.
+
+    Every year is computed once into a mask with one byte per day and a
+    running count of workdays, shared by all calendars of the same state,
+    so checking a day or counting the workdays of any range is a lookup.
+    """
+    _years = {}
+
+    def __init__(self, state="", weekend_days=(5, 6)):
+        """Constructor.
+
+        :param str state: Code of the federal state, e.g. 'BY', empty for the
+            federal holidays only
+        :param tuple weekend_days: Days included in weekend; 5=sat, 6=sun
+        :raises ValueError: If the state is unknown
+        """
+        if state and state not in STATES:
+            raise ValueError("Unknown state '{}', expected one of: {}".format(state, ", ".join(sorted(STATES))))
+        self.state = state
+        self.weekend_days = tuple(weekend_days)
+
+    def year(self, year):
+        """Returns the workday mask and the running workday count of a year.
+
+        :param int year: Year
+        :return: Tuple (mask, counts): mask[i] is 1 if the i-th day of the year
+            is a workday, counts[i] is the number of workdays before it
+        :rtype: tuple(bytearray, array.array)
+        """
+        key = (self.state, self.weekend_days, year)
+        cached = self._years.get(key)
+        if cached is None:
+            first = date(year, 1, 1).toordinal()
+            size = date(year + 1, 1, 1).toordinal() - first
+            mask = bytearray(size)
+            weekday = date(year, 1, 1).weekday()
+            for i in range(size):
+                if (weekday + i) % 7 not in self.weekend_days:
+                    mask[i] = 1
+            for day in holidays(year, self.state):
+                mask[day.toordinal() - first] = 0
+            counts = array("H", [0])
+            for workday in mask:
+                counts.append(counts[-1] + workday)
+            cached = self._years[key] = (mask, counts)
+        return cached
+
+    def is_workday(self, day):
+        """Returns True if a day is neither on the weekend nor a holiday.
+
+        :param datetime.date day: Date
+        """
+        mask, _ = self.year(day.year)
+        return bool(mask[day.toordinal() - date(day.year, 1, 1).toordinal()])
+
+    def holiday(self, day):
+        """Returns the name of the holiday on a day or None.
+
+        :param datetime.date day: Date
+        """
+        return holidays(day.year, self.state).get(date(day.year, day.month, day.day))
+
+    def workdays(self, start, end):
+        """Returns the number of workdays from start to end, both included.
+
+        :param datetime.date start: First day
+        :param datetime.date end: Last day
+        :rtype: int
+        """
+        total = 0
+        for year in range(start.year, end.year + 1):
+            _, counts = self.year(year)
+            first = date(year, 1, 1).toordinal()
+            begin = start.toordinal() - first if year == start.year else 0
+            stop = end.toordinal() - first + 1 if year == end.year else len(counts) - 1
+            total += counts[stop] - counts[begin]
+        return max(total, 0)
+
+    def month_workdays(self, year, month):
+        """Returns the number of workdays in a month.
+
+        :param int year: Year of the month
+        :param int month: Month number, 1-12
+        :rtype: int
+        """
+        last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return self.workdays(date(year, month, 1), last)
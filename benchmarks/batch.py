@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Batch write check of azubi-timesheet.
+
+Runs the same random mix of adds, updates and deletes one call at a time
+and inside Timesheet.batch(), on fresh records directories, fails if the
+resulting records differ, and reports the time both take.
+
+    python benchmarks/batch.py --operations 1000 --storage json
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import date
+from datetime import time as daytime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from azubi_timesheet.timesheet import Timesheet
+
+WORK_HOURS = (daytime(8, 0), daytime(16, 30))
+BREAK_TIME = (daytime(12, 0), daytime(12, 30))
+
+def random_operations(count, months, seed):
+    """Returns random (method, date) pairs on the days of the first months of 2019.
+
+    :param int count: Number of operations
+    :param int months: Number of months the dates are spread over
+    :param int seed: Seed of the random generator
+    """
+    generator = random.Random(seed)
+    first = date(2019, 1, 1).toordinal()
+    last = date(2019 + (months - 1) // 12, (months - 1) % 12 + 1, 28).toordinal()
+    methods = ("add_record", "add_record", "update_record", "delete_record")
+    return [(generator.choice(methods), date.fromordinal(generator.randint(first, last)))
+            for _ in range(count)]
+
+def run(timesheet, operations):
+    for method, day in operations:
+        if method == "delete_record":
+            timesheet.delete_record(day)
+        else:
+            comment = "{} {}".format(method, day.isoformat())
+            getattr(timesheet, method)(day, WORK_HOURS, BREAK_TIME, comment, False)
+
+def records(timesheet, months):
+    """Returns the records of every month as lists of dictionaries, read back from disk."""
+    timesheet.close()
+    return [timesheet.storage.load(2019 + month // 12, month % 12 + 1).to_list() for month in range(months)]
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=1000,
+                        help="number of random operations")
+    parser.add_argument("--months", type=int, default=3,
+                        help="number of months the operations are spread over")
+    parser.add_argument("--storage", default="json", choices=("json", "sqlite"))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(args)
+    operations = random_operations(args.operations, args.months, args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = Timesheet(records_dir=os.path.join(directory, "single"),
+                           exports_dir=os.path.join(directory, "exports"), storage=args.storage)
+        begin = time.perf_counter()
+        run(single, operations)
+        single_seconds = time.perf_counter() - begin
+
+        batched = Timesheet(records_dir=os.path.join(directory, "batch"),
+                            exports_dir=os.path.join(directory, "exports"), storage=args.storage)
+        begin = time.perf_counter()
+        with batched.batch():
+            run(batched, operations)
+        batch_seconds = time.perf_counter() - begin
+
+        rolled_back = Timesheet(records_dir=os.path.join(directory, "rollback"),
+                                exports_dir=os.path.join(directory, "exports"), storage=args.storage)
+        try:
+            with rolled_back.batch():
+                run(rolled_back, operations)
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+
+        expected = records(single, args.months)
+        got = records(batched, args.months)
+        left = sum(map(len, records(rolled_back, args.months)))
+        single.close()
+        batched.close()
+        rolled_back.close()
+
+    print("{} operations on {} months, {} storage, {} records left".format(
+        len(operations), args.months, args.storage, sum(map(len, expected))))
+    print("one at a time: {:.1f} ms, batch: {:.1f} ms ({:.1f}x)".format(
+        single_seconds * 1000, batch_seconds * 1000, single_seconds / batch_seconds))
+    failed = False
+    if got != expected:
+        print("FAIL: batch wrote other records than one at a time", file=sys.stderr)
+        failed = True
+    if left:
+        print("FAIL: rolled back batch wrote {} records".format(left), file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Concurrent writers check of azubi-timesheet.
+
+Starts several processes adding distinct dates one record at a time, like
+many 'azubi-timesheet add' runs at once, fails if any record got lost, and
+reports the throughput. With 'shared' months all processes write the same
+months, with 'separate' months every process writes months of its own, so
+the per-month locks shouldn't slow it down against a single process.
+
+    python benchmarks/concurrency.py --processes 8 --records 62 --locking lock
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date
+from datetime import time as daytime
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from azubi_timesheet.timesheet import Timesheet
+
+WORK_HOURS = (daytime(8, 0), daytime(16, 30))
+BREAK_TIME = (daytime(12, 0), daytime(12, 30))
+
+def assign_dates(processes, records, layout):
+    """Returns the dates every process adds, distinct days from 2019 on.
+
+    :param int processes: Number of processes
+    :param int records: Number of records every process adds
+    :param str layout: 'shared' interleaves the days of all processes,
+        'separate' gives every process consecutive days
+    """
+    days = [date(2019, 1, 1) + timedelta(days=day) for day in range(processes * records)]
+    if layout == "shared":
+        return [days[number::processes] for number in range(processes)]
+    return [days[number * records:(number + 1) * records] for number in range(processes)]
+
+def add_records(overrides, dates, start):
+    start.wait()
+    timesheet = Timesheet(**overrides)
+    for day in dates:
+        timesheet.add_record(day, WORK_HOURS, BREAK_TIME, "process {}".format(os.getpid()), False)
+    timesheet.close()
+
+def run(overrides, assigned):
+    """Run one process per list of dates, returns the seconds they took together."""
+    start = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=add_records, args=(overrides, dates, start))
+               for dates in assigned]
+    for worker in workers:
+        worker.start()
+    begin = time.perf_counter()
+    start.set()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - begin
+    failed = [worker.exitcode for worker in workers if worker.exitcode]
+    if failed:
+        raise RuntimeError("{} processes failed".format(len(failed)))
+    return seconds
+
+def lost_records(overrides, assigned):
+    """Returns the assigned dates that have no record."""
+    timesheet = Timesheet(**overrides)
+    lost = []
+    for dates in assigned:
+        for day in dates:
+            if timesheet.storage.load(day.year, day.month).get(day) is None:
+                lost.append(day)
+    timesheet.close()
+    return lost
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=8,
+                        help="number of writing processes")
+    parser.add_argument("--records", type=int, default=62,
+                        help="number of records every process adds")
+    parser.add_argument("--storage", default="json", choices=("json", "sqlite"))
+    parser.add_argument("--locking", default="lock", choices=("lock", "optimistic"))
+    args = parser.parse_args(args)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for layout, processes in (("single", 1), ("shared", args.processes), ("separate", args.processes)):
+            overrides = {"records_dir": os.path.join(directory, layout),
+                         "exports_dir": os.path.join(directory, "exports"),
+                         "storage": args.storage, "locking": args.locking}
+            assigned = assign_dates(processes, args.records, layout)
+            seconds = run(overrides, assigned)
+            lost = lost_records(overrides, assigned)
+            results.append((layout, processes, processes * args.records, seconds, lost))
+
+    print("{} storage, locking '{}'".format(args.storage, args.locking))
+    print("{:10} {:>9} {:>8} {:>10} {:>10} {:>5}".format("months", "processes", "records", "seconds",
+                                                         "records/s", "lost"))
+    for layout, processes, records, seconds, lost in results:
+        print("{:10} {:>9} {:>8} {:>10.2f} {:>10.0f} {:>5}".format(layout, processes, records, seconds,
+                                                                   records / seconds, len(lost)))
+        for day in lost[:10]:
+            print("FAIL: {} months, record of {} got lost".format(layout, day.strftime("%d.%m.%Y")),
+                  file=sys.stderr)
+        failed = failed or bool(lost)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Startup time budget of the azubi-timesheet CLI.
+
+Runs 'python -X importtime' on the CLI module several times, reports the
+best cumulative import time and fails if it exceeds the budget or if a
+module that only some subcommands need, e.g. openpyxl for 'export', got
+imported.
+
+    python benchmarks/startup.py --budget-ms 60
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+MODULE = "azubi_timesheet.azubi_timesheet"
+# modules that must not be imported by add, update, delete and config,
+# locale is left out because argparse already imports it through gettext
+EXPORT_ONLY = ("openpyxl", "PIL")
+# modules only some subcommands need, imported where they're used
+DEFERRED = ("csv", "mmap", "azubi_timesheet.archive", "azubi_timesheet.workcalendar")
+# runs the config path end to end and prints the export only and deferred modules that got loaded
+CONFIG_LIST = ("import sys, io, contextlib\n"
+               "from azubi_timesheet.azubi_timesheet import main\n"
+               "with contextlib.redirect_stdout(io.StringIO()):\n"
+               "    main(['config', '--list'])\n"
+               "print(' '.join(sorted(m for m in sys.modules if m.split('.')[0] in {!r} or m in {!r})))")
+
+def import_time(runs):
+    """Returns the best cumulative import time of the CLI module in microseconds.
+
+    :param int runs: Number of interpreter launches
+    :rtype: int
+    """
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + MODULE],
+                                cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == MODULE:
+                cumulative = int(fields[1])
+                best = cumulative if best is None else min(best, cumulative)
+    return best
+
+def loaded_export_modules():
+    """Returns the export only and deferred modules that the 'config --list' path imports."""
+    result = subprocess.run([sys.executable, "-c", CONFIG_LIST.format(EXPORT_ONLY, DEFERRED)],
+                            cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return result.stdout.split()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of interpreter launches, the best one counts")
+    parser.add_argument("--budget-ms", type=float, default=60.0,
+                        help="maximum cumulative import time of the CLI module")
+    args = parser.parse_args(args)
+    failed = False
+    cumulative = import_time(args.runs)
+    print("import {}: {:.1f} ms (budget {:.1f} ms)".format(MODULE, cumulative / 1000, args.budget_ms))
+    if cumulative / 1000 > args.budget_ms:
+        print("FAIL: startup time exceeds budget", file=sys.stderr)
+        failed = True
+    modules = loaded_export_modules()
+    if modules:
+        print("FAIL: 'config --list' imported {}".format(", ".join(modules)), file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of azubi-timesheet.
+
+Generates synthetic records directories of several trainees over several
+years, then times adding, updating, deleting and loading records,
+exporting, reporting, reading the configuration and cold starts of the
+CLI through main() in a new interpreter. Every case runs on a fresh copy
+of the dataset, the best of some repeats counts, and one more run under
+tracemalloc measures its peak memory. Results can be saved as JSON
+baseline and compared against one, flagging cases that got slower or
+hungrier than a threshold allows.
+
+    python benchmarks/suite.py --trainees 3 --years 2 --save baseline.json
+    python benchmarks/suite.py --trainees 3 --years 2 --compare baseline.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import locale
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import date
+from datetime import time as daytime
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+from azubi_timesheet.timesheet import Timesheet
+from azubi_timesheet import report
+
+FIRST_YEAR = 2019
+BREAK_TIME = (daytime(12, 0), daytime(12, 30))
+# runs the CLI in a new interpreter with its configuration file in the dataset
+CLI = ("import sys\n"
+       "import azubi_timesheet.timesheet\n"
+       "azubi_timesheet.timesheet.CONFIG_FILE = sys.argv[1]\n"
+       "from azubi_timesheet.azubi_timesheet import main\n"
+       "main(sys.argv[2:])\n")
+# the same, printing the peak of memory traced since the interpreter started
+CLI_TRACED = CLI + ("import tracemalloc\n"
+                    "sys.stderr.write('peak %d\\n' % tracemalloc.get_traced_memory()[1])\n")
+
+class Dataset(object):
+    """Records directories of several trainees with the same synthetic records."""
+    def __init__(self, directory, trainees, years, records_per_month, storage, seed):
+        """Constructor.
+
+        :param str directory: Directory the trainees' directories are created in
+        :param int trainees: Number of trainees
+        :param int years: Number of years with records, from FIRST_YEAR on
+        :param int records_per_month: Number of records in every month, on its
+            first workdays
+        :param str storage: 'json' or 'sqlite'
+        :param int seed: Seed of the random generator of the times
+        """
+        self.directory = directory
+        self.trainees = trainees
+        self.storage = storage
+        self.months = [date(FIRST_YEAR + year, month, 1) for year in range(years) for month in range(1, 13)]
+        self.dates = []
+        for month in self.months:
+            day, count = month, 0
+            while day.month == month.month and count < records_per_month:
+                if day.weekday() < 5:
+                    self.dates.append(day)
+                    count += 1
+                day += timedelta(days=1)
+        self.free_dates = [date(FIRST_YEAR + years, 1, 1) + timedelta(days=day) for day in range(366)]
+        generator = random.Random(seed)
+        self.records = [{"date": day.strftime("%d.%m.%Y"),
+                         "start_day": "{:02d}:{:02d}".format(generator.randint(7, 9), generator.choice((0, 15, 30))),
+                         "end_day": "{:02d}:{:02d}".format(generator.randint(15, 18), generator.choice((0, 15, 30))),
+                         "start_break": "12:00",
+                         "end_break": "12:30",
+                         "comment": generator.choice(("", "Berufsschule", "Projekt", "Schulung"))}
+                        for day in self.dates]
+
+    def overrides(self, directory):
+        """Returns the configuration of every trainee in a copy of the dataset."""
+        return [{"name": "Trainee {}".format(number),
+                 "records_dir": os.path.join(directory, "trainee_{}".format(number), "records"),
+                 "exports_dir": os.path.join(directory, "trainee_{}".format(number), "exports"),
+                 "storage": self.storage,
+                 "socket": os.path.join(directory, "timesheet.sock")}
+                for number in range(self.trainees)]
+
+    def generate(self):
+        """Write the records of every trainee into the dataset directory."""
+        for overrides in self.overrides(self.directory):
+            timesheet = Timesheet(**overrides)
+            timesheet.import_records(self.records)
+            timesheet.close()
+
+    def copy(self, directory):
+        """Copy the dataset to a directory and return the configuration of its trainees."""
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.copytree(self.directory, directory)
+        return self.overrides(directory)
+
+def work_hours(number):
+    return (daytime(8, 0), daytime(16, number % 60))
+
+def each(trainees, operations):
+    """Yields (operation number, trainee's timesheet) for operations spread over the trainees."""
+    for number in range(operations):
+        yield number, trainees[number % len(trainees)]
+
+def case_add(trainees, dataset, operations):
+    for number, timesheet in each(trainees, operations):
+        timesheet.add_record(dataset.free_dates[number // len(trainees)], work_hours(number), BREAK_TIME, "", False)
+    return operations
+
+def case_update(trainees, dataset, operations):
+    for number, timesheet in each(trainees, operations):
+        day = dataset.dates[number // len(trainees) % len(dataset.dates)]
+        timesheet.update_record(day, work_hours(number), BREAK_TIME, "updated {}".format(number), False)
+    return operations
+
+def case_delete(trainees, dataset, operations):
+    operations = min(operations, len(dataset.dates) * len(trainees))
+    for number, timesheet in each(trainees, operations):
+        timesheet.delete_record(dataset.dates[number // len(trainees)])
+    return operations
+
+def case_load(trainees, dataset, operations):
+    for number, timesheet in each(trainees, operations):
+        timesheet.load_records(dataset.months[number // len(trainees) % len(dataset.months)])
+    return operations
+
+def case_export(trainees, dataset, operations):
+    for number, timesheet in each(trainees, operations):
+        timesheet.export(dataset.months[number // len(trainees) % len(dataset.months)], force=True)
+    return operations
+
+def case_export_unchanged(trainees, dataset, operations):
+    months = [dataset.months[number // len(trainees) % len(dataset.months)] for number in range(operations)]
+    for number, timesheet in each(trainees, operations):
+        timesheet.export(months[number])
+    # the second export of every month finds it up to date
+    begin = time.perf_counter()
+    for number, timesheet in each(trainees, operations):
+        timesheet.export(months[number])
+    return operations, time.perf_counter() - begin
+
+def case_export_changed(trainees, dataset, operations):
+    months = [dataset.months[number // len(trainees) % len(dataset.months)] for number in range(operations)]
+    for number, timesheet in each(trainees, operations):
+        timesheet.export(months[number])
+    # one record of every month changed, its export is written again
+    for number, timesheet in each(trainees, operations):
+        day = next(day for day in dataset.dates if (day.year, day.month) == (months[number].year, months[number].month))
+        timesheet.update_record(day, work_hours(number), BREAK_TIME, "changed {}".format(number), False)
+    begin = time.perf_counter()
+    for number, timesheet in each(trainees, operations):
+        timesheet.export(months[number])
+    return operations, time.perf_counter() - begin
+
+def case_export_range(trainees, dataset, operations):
+    months = dataset.months[:max(1, operations // len(trainees))]
+    for timesheet in trainees:
+        timesheet.export_range(months[0], months[-1], force=True)
+    return len(months) * len(trainees)
+
+def case_report(trainees, dataset, operations):
+    for timesheet in trainees:
+        report.report(timesheet, dataset.months[0], dataset.free_dates[0] - timedelta(days=1), "month")
+    return len(trainees)
+
+def case_config(trainees, dataset, operations):
+    for number in range(operations):
+        Timesheet._config_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            Timesheet(**dataset.overrides(dataset.directory)[0]).list_config()
+    return operations
+
+def cli(directory, overrides, arguments, traced=False):
+    """Run the CLI in a new interpreter, returns its peak traced memory if traced."""
+    config_file = os.path.join(directory, "timesheet.ini")
+    if not os.path.isfile(config_file):
+        with open(config_file, "w") as f:
+            f.write("[user_defined]\n" + "".join("{} = {}\n".format(*item) for item in overrides.items()))
+    env = dict(os.environ, PYTHONPATH=ROOT, XDG_RUNTIME_DIR=directory)
+    command = [sys.executable] + (["-X", "tracemalloc"] if traced else [])
+    command += ["-c", CLI_TRACED if traced else CLI, config_file] + arguments
+    result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    if traced:
+        return int(result.stderr.rsplit("peak ", 1)[1])
+    return None
+
+def cli_add_arguments(dataset, number):
+    day = dataset.free_dates[number]
+    return ["-n", "add", "-d", day.strftime("%d.%m.%Y"), "-w", "08:00-16:30", "-b", "12:00-12:30"]
+
+# name: (function, needs the german locale); cli cases run in new interpreters instead
+CASES = {
+    "add": (case_add, False),
+    "update": (case_update, False),
+    "delete": (case_delete, False),
+    "load": (case_load, False),
+    "export": (case_export, True),
+    "export-unchanged": (case_export_unchanged, True),
+    "export-changed": (case_export_changed, True),
+    "export-range": (case_export_range, True),
+    "report": (case_report, False),
+    "config": (case_config, False),
+}
+CLI_CASES = {
+    "cli-add": cli_add_arguments,
+    "cli-config": lambda dataset, number: ["config", "--list"],
+}
+
+def run_case(name, dataset, directory, operations, traced):
+    """Run a case on a fresh copy of the dataset.
+
+    :return: Tuple (operations, seconds, peak bytes or None)
+    """
+    overrides = dataset.copy(directory)
+    if name in CLI_CASES:
+        peak = None
+        begin = time.perf_counter()
+        for number in range(operations):
+            peak = cli(directory, overrides[0], CLI_CASES[name](dataset, number), traced)
+        return operations, time.perf_counter() - begin, peak
+    trainees = [Timesheet(**item) for item in overrides]
+    if traced:
+        tracemalloc.start()
+    try:
+        begin = time.perf_counter()
+        result = CASES[name][0](trainees, dataset, operations)
+        seconds = time.perf_counter() - begin
+        peak = tracemalloc.get_traced_memory()[1] if traced else None
+    finally:
+        if traced:
+            tracemalloc.stop()
+        for timesheet in trainees:
+            timesheet.close()
+    if isinstance(result, tuple):
+        result, seconds = result
+    return result, seconds, peak
+
+def german_locale():
+    """Returns True if the locale the exports need is installed."""
+    previous = locale.setlocale(locale.LC_TIME)
+    try:
+        locale.setlocale(locale.LC_TIME, "de_DE.UTF-8")
+    except locale.Error:
+        return False
+    locale.setlocale(locale.LC_TIME, previous)
+    return True
+
+def compare(results, baseline, threshold):
+    """Print every case against the baseline, returns the names of regressed cases.
+
+    A case regressed if its throughput dropped or its peak memory grew by
+    more than threshold, a fraction of the baseline.
+    """
+    regressed = []
+    print("{:18} {:>12} {:>12} {:>7} {:>10} {:>10} {:>7}".format(
+        "case", "base ops/s", "ops/s", "ratio", "base KiB", "peak KiB", "ratio"))
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print("{:18} not in baseline".format(name))
+            continue
+        speed = result["ops_per_second"] / base["ops_per_second"]
+        memory = result["peak_kib"] / base["peak_kib"] if base["peak_kib"] else 1.0
+        flags = []
+        if speed < 1 - threshold:
+            flags.append("SLOWER")
+        # a few KiB more of a tiny peak is noise
+        if memory > 1 + threshold and result["peak_kib"] - base["peak_kib"] > 64:
+            flags.append("MEMORY")
+        print("{:18} {:>12.1f} {:>12.1f} {:>7.2f} {:>10.0f} {:>10.0f} {:>7.2f} {}".format(
+            name, base["ops_per_second"], result["ops_per_second"], speed,
+            base["peak_kib"], result["peak_kib"], memory, " ".join(flags)).rstrip())
+        if flags:
+            regressed.append(name)
+    return regressed
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trainees", type=int, default=3)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--records-per-month", type=int, default=18)
+    parser.add_argument("--storage", default="json", choices=("json", "sqlite"))
+    parser.add_argument("--operations", type=int, default=300,
+                        help="operations of the add, update, delete, load and config cases")
+    parser.add_argument("--exports", type=int, default=12,
+                        help="months exported by the export cases")
+    parser.add_argument("--cli-runs", type=int, default=5,
+                        help="interpreters started by the cli cases")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="runs of every case, the best one counts")
+    parser.add_argument("--cases", default="",
+                        help="comma separated cases to run, default all: {}".format(
+                            ", ".join(list(CASES) + list(CLI_CASES))))
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed loss of throughput or growth of peak memory, as fraction")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(args)
+    names = [name.strip() for name in args.cases.split(",") if name.strip()] or list(CASES) + list(CLI_CASES)
+    unknown = [name for name in names if name not in CASES and name not in CLI_CASES]
+    if unknown:
+        parser.error("unknown cases: {}".format(", ".join(unknown)))
+    exports = german_locale()
+
+    dataset_params = {"trainees": args.trainees, "years": args.years,
+                      "records_per_month": args.records_per_month, "storage": args.storage}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        dataset = Dataset(os.path.join(directory, "dataset"), args.trainees, args.years,
+                          args.records_per_month, args.storage, args.seed)
+        begin = time.perf_counter()
+        dataset.generate()
+        print("dataset: {} trainees, {} records each, {} storage, generated in {:.2f} s".format(
+            args.trainees, len(dataset.records), args.storage, time.perf_counter() - begin))
+        for name in names:
+            if name in CASES and CASES[name][1] and not exports:
+                print("{:18} skipped, locale de_DE.UTF-8 is not installed".format(name))
+                continue
+            if name in CLI_CASES:
+                operations = args.cli_runs
+            elif name.startswith("export"):
+                operations = args.exports
+            else:
+                operations = args.operations
+            runs = [run_case(name, dataset, os.path.join(directory, "run"), operations, False)
+                    for _ in range(args.repeats)]
+            done, seconds, _ = min(runs, key=lambda run: run[1])
+            peak = run_case(name, dataset, os.path.join(directory, "run"), operations, True)[2]
+            results[name] = {"operations": done,
+                             "seconds": round(seconds, 6),
+                             "ops_per_second": round(done / seconds, 2),
+                             "peak_kib": round(peak / 1024, 1)}
+            print("{:18} {:>6} ops {:>10.2f} ms {:>10.1f} ops/s {:>10.0f} KiB peak".format(
+                name, done, seconds * 1000, done / seconds, peak / 1024))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "dataset": dataset_params, "results": results}, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("dataset") != dataset_params:
+            print("Warning: baseline was taken with dataset {}".format(baseline.get("dataset")),
+                  file=sys.stderr)
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print("FAIL: regressions in {}".format(", ".join(regressed)), file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Workday calendar check of azubi-timesheet.
+
+Counts the workdays of random date ranges with WorkCalendar and with
+Timesheet.netto_workdays, fails if they disagree, and reports the time
+both take. Ranges without holidays are compared as they are, all others
+with their holidays passed on to netto_workdays.
+
+    python benchmarks/workdays.py --ranges 20000 --state BY
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from azubi_timesheet.timesheet import Timesheet
+from azubi_timesheet.workcalendar import WorkCalendar
+from azubi_timesheet.workcalendar import holidays
+
+def random_ranges(count, seed):
+    """Returns random (start, end) date pairs between 2000 and 2040.
+
+    :param int count: Number of ranges
+    :param int seed: Seed of the random generator
+    """
+    generator = random.Random(seed)
+    first = date(2000, 1, 1).toordinal()
+    ranges = []
+    for _ in range(count):
+        start = date.fromordinal(first + generator.randrange(40 * 365))
+        ranges.append((start, start + timedelta(days=generator.randrange(800))))
+    return ranges
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ranges", type=int, default=20000,
+                        help="number of random date ranges")
+    parser.add_argument("--state", default="",
+                        help="federal state code, e.g. BY, empty for federal holidays only")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(args)
+    timesheet = Timesheet()
+    calendar = WorkCalendar(args.state)
+    ranges = random_ranges(args.ranges, args.seed)
+    days_off = {}
+    for start, end in ranges:
+        for year in range(start.year, end.year + 1):
+            if year not in days_off:
+                days_off[year] = sorted(holidays(year, args.state))
+    holiday_lists = [[day for year in range(start.year, end.year + 1) for day in days_off[year]
+                      if start <= day <= end] for start, end in ranges]
+
+    begin = time.perf_counter()
+    expected = [timesheet.netto_workdays(start, end, days, weekend_days=(5, 6))
+                for (start, end), days in zip(ranges, holiday_lists)]
+    netto_seconds = time.perf_counter() - begin
+    begin = time.perf_counter()
+    counted = [calendar.workdays(start, end) for start, end in ranges]
+    calendar_seconds = time.perf_counter() - begin
+
+    mismatches = [(start, end, want, got) for (start, end), want, got in zip(ranges, expected, counted)
+                  if want != got]
+    plain = sum(1 for days in holiday_lists if not days)
+    print("{} ranges ({} without holidays), state '{}'".format(len(ranges), plain, args.state))
+    print("netto_workdays: {:.1f} ms, WorkCalendar: {:.1f} ms".format(netto_seconds * 1000,
+                                                                      calendar_seconds * 1000))
+    for start, end, want, got in mismatches[:10]:
+        print("FAIL: {} to {}: netto_workdays {}, WorkCalendar {}".format(start, end, want, got),
+              file=sys.stderr)
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
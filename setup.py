@@ -47,6 +47,7 @@ setup(
         ],
     keywords="azubi timesheet python track hours",
     install_requires=list(requires(REQUIRES)),
+    extras_require={"report": ["numpy"]},
     packages=find_packages(),
     include_package_data=True,
     zip_safe=False
@@ -0,0 +1,62 @@
+import pytest
+from datetime import time
+from azubi_timesheet import timesheet as timesheet_module
+from azubi_timesheet.timesheet import Timesheet
+
+WORK_HOURS = (time(8, 0), time(16, 30))
+BREAK_TIME = (time(12, 0), time(12, 30))
+
+@pytest.fixture(autouse=True)
+def config_file(tmp_path, monkeypatch):
+    """Keeps the configuration file of every test in its temporary directory."""
+    file = str(tmp_path / "timesheet.ini")
+    monkeypatch.setattr(timesheet_module, "CONFIG_FILE", file)
+    Timesheet._config_cache.clear()
+    yield file
+    Timesheet._config_cache.clear()
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage_name(request):
+    return request.param
+
+@pytest.fixture
+def make_timesheet(tmp_path, storage_name):
+    """Returns a function creating timesheets on the same records directory,
+    closed when the test ends."""
+    created = []
+    def make(**overrides):
+        config = {"records_dir": str(tmp_path / "records"),
+                  "exports_dir": str(tmp_path / "exports"),
+                  "storage": storage_name}
+        config.update(overrides)
+        timesheet = Timesheet(**config)
+        created.append(timesheet)
+        return timesheet
+    yield make
+    for timesheet in created:
+        timesheet.close()
+
+@pytest.fixture
+def configured(tmp_path, config_file, storage_name):
+    """Configures records and exports directories in the test's configuration
+    file, for tests running the command line."""
+    with open(config_file, "w") as f:
+        f.write("[user_defined]\n"
+                "records_dir = {}\n"
+                "exports_dir = {}\n"
+                "storage = {}\n"
+                "socket = {}\n".format(tmp_path / "records", tmp_path / "exports", storage_name,
+                                       tmp_path / "timesheet.sock"))
+    return config_file
+
+@pytest.fixture
+def german_locale():
+    """Skips tests exporting timesheets if the German locale that export sets is missing."""
+    import locale
+    saved = locale.setlocale(locale.LC_TIME)
+    try:
+        locale.setlocale(locale.LC_TIME, "de_DE.UTF-8")
+    except locale.Error:
+        pytest.skip("locale de_DE.UTF-8 is not installed")
+    yield
+    locale.setlocale(locale.LC_TIME, saved)
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from datetime import datetime
+from azubi_timesheet import aio
+from azubi_timesheet.aio import AsyncTimesheet
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+@pytest.fixture
+def overrides(tmp_path, storage_name):
+    return {"records_dir": str(tmp_path / "records"),
+            "exports_dir": str(tmp_path / "exports"),
+            "storage": storage_name}
+
+def test_concurrent_loads_share_one_read(overrides, monkeypatch):
+    reads = []
+    def load(overrides, year, month):
+        reads.append((year, month))
+        return real_load(overrides, year, month)
+    real_load = aio.load
+    monkeypatch.setattr(aio, "load", load)
+    async def run():
+        async with AsyncTimesheet(**overrides) as timesheet:
+            await timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+            loaded = await asyncio.gather(*(timesheet.load_records(datetime(2024, 1, day)) for day in (1, 10, 31)))
+            feb = await timesheet.load_records(datetime(2024, 2, 1))
+            return loaded, feb
+    loaded, feb = asyncio.run(run())
+    assert loaded[0] is loaded[1] is loaded[2]
+    assert [record.date for record in loaded[0]] == [datetime(2024, 1, 10)]
+    assert len(feb) == 0
+    assert reads == [(2024, 1), (2024, 2)]
+
+def test_loads_wait_for_pending_changes(overrides):
+    async def run():
+        async with AsyncTimesheet(**overrides) as timesheet:
+            date = datetime(2024, 1, 10)
+            return await asyncio.gather(
+                timesheet.add_record(date, WORK_HOURS, BREAK_TIME, "first", False),
+                timesheet.add_record(date, WORK_HOURS, BREAK_TIME, "second", False),
+                timesheet.load_records(date))
+    first, second, records = asyncio.run(run())
+    assert (first, second) == (True, False)
+    assert [record.comment for record in records] == ["first"]
+
+def test_export_to_bytes(overrides, german_locale):
+    pytest.importorskip("openpyxl")
+    async def run():
+        async with AsyncTimesheet(export_workers=1, **overrides) as timesheet:
+            await timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+            return await asyncio.gather(timesheet.export(datetime(2024, 1, 1), bytes),
+                                        timesheet.export(datetime(2024, 1, 1), memoryview))
+    content, view = asyncio.run(run())
+    assert content[:2] == b"PK"
+    assert bytes(view[:2]) == b"PK"
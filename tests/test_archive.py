@@ -0,0 +1,75 @@
+import threading
+from datetime import datetime
+from azubi_timesheet.archive import Archive
+from azubi_timesheet.records import Record
+from azubi_timesheet.records import RecordStore
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def test_write_and_load_round_trip(tmp_path):
+    january = RecordStore([Record(datetime(2024, 1, 2).toordinal(), 480, 990, 720, 750, "Schule ü", False),
+                           Record(datetime(2024, 1, 3).toordinal(), 0, 0, 0, 0, "", True)])
+    march = RecordStore([Record(datetime(2024, 3, 1).toordinal(), 420, 900, 720, 735, "Projekt", False)])
+    file = str(tmp_path / "timesheet_2024.archive")
+    Archive.write(file, {1: january, 3: march})
+    archive = Archive(file)
+    try:
+        assert archive.months() == [1, 3]
+        assert archive.load(1).to_list() == january.to_list()
+        assert archive.load(3).to_list() == march.to_list()
+        assert list(archive.month_columns(1)["start_day"]) == [480, 0]
+    finally:
+        archive.close()
+
+def test_archived_by_another_instance(make_timesheet):
+    day = datetime(2024, 1, 10)
+    timesheet = make_timesheet()
+    assert timesheet.add_record(day, WORK_HOURS, BREAK_TIME, "before", False)
+    # a long lived instance, e.g. the daemon, knows the year has no archive
+    assert not timesheet.storage.archived(2024, 1)
+    assert make_timesheet().archive_records(datetime(2024, 2, 1)) == 1
+    assert timesheet.storage.archived(2024, 1)
+    assert timesheet.add_record(datetime(2024, 1, 11), WORK_HOURS, BREAK_TIME, "after", False)
+    comments = [record.comment for record in make_timesheet().storage.load(2024, 1)]
+    assert comments == ["before", "after"]
+
+def test_unarchived_by_another_instance(make_timesheet):
+    timesheet = make_timesheet()
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.archive_records(datetime(2024, 2, 1))
+    assert len(timesheet.storage.load(2024, 1)) == 1
+    assert make_timesheet().delete_record(datetime(2024, 1, 10))
+    assert len(timesheet.storage.load(2024, 1)) == 0
+    assert not timesheet.storage.archived(2024, 1)
+
+def test_concurrent_changes_of_one_archive(make_timesheet):
+    timesheet = make_timesheet()
+    for month in range(1, 7):
+        timesheet.add_record(datetime(2024, month, 10), WORK_HOURS, BREAK_TIME, "", False)
+    assert timesheet.archive_records(datetime(2024, 7, 1)) == 6
+    writers = [make_timesheet() for _ in range(6)]
+    start = threading.Barrier(len(writers))
+    def add(writer, month):
+        start.wait()
+        writer.add_record(datetime(2024, month, 11), WORK_HOURS, BREAK_TIME, "", False)
+        # SQLite connections belong to the thread that opened them
+        writer.close()
+    threads = [threading.Thread(target=add, args=(writer, month))
+               for month, writer in enumerate(writers, 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check = make_timesheet()
+    for month in range(1, 7):
+        assert [record.date.day for record in check.storage.load(2024, month)] == [10, 11]
+    assert not check.storage.archive(2024)
+
+def test_months_skip_archive_removed_meanwhile(make_timesheet, monkeypatch):
+    timesheet = make_timesheet()
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.archive_records(datetime(2024, 2, 1))
+    timesheet.add_record(datetime(2024, 2, 10), WORK_HOURS, BREAK_TIME, "", False)
+    # the 2023 archive is listed but removed before it is opened
+    monkeypatch.setattr(timesheet.storage, "archive_years", lambda: [2023, 2024])
+    assert timesheet.storage.months() == [(2024, 1), (2024, 2)]
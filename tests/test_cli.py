@@ -0,0 +1,21 @@
+import io
+import json
+from azubi_timesheet.azubi_timesheet import write_rows
+
+ROWS = [{"period": "2019-10", "hours": 8.0, "special": False},
+        {"period": "2019-11", "hours": 12.25, "special": True}]
+FIELDS = ("period", "hours", "special")
+
+def written(file_format):
+    out = io.StringIO()
+    write_rows(ROWS, FIELDS, file_format, out)
+    return out.getvalue()
+
+def test_write_rows_table():
+    assert written("table").splitlines() == ["period   hours  special",
+                                             "2019-10    8.0  False",
+                                             "2019-11  12.25  True"]
+
+def test_write_rows_csv_and_json():
+    assert written("csv").splitlines() == ["period,hours,special", "2019-10,8.0,False", "2019-11,12.25,True"]
+    assert json.loads(written("json")) == ROWS
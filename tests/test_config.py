@@ -0,0 +1,29 @@
+import configparser
+from azubi_timesheet.timesheet import Timesheet
+
+def stored(config_file):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return dict(config["user_defined"])
+
+def test_set_config_keeps_overrides_in_memory(tmp_path, config_file):
+    timesheet = Timesheet(records_dir=str(tmp_path / "records"))
+    assert timesheet.set_config("name", "Bob")
+    assert stored(config_file) == {"name": "Bob"}
+    assert timesheet.config.get("user_defined", "records_dir") == str(tmp_path / "records")
+    assert timesheet.config.get("user_defined", "name") == "Bob"
+    other = Timesheet()
+    assert other.config.get("user_defined", "name") == "Bob"
+    assert other.config.get("user_defined", "records_dir") != str(tmp_path / "records")
+
+def test_set_config_keeps_other_keys(config_file):
+    assert Timesheet().set_config("name", "Bob")
+    assert Timesheet().set_config("state", "BY")
+    assert stored(config_file) == {"name": "Bob", "state": "BY"}
+    assert Timesheet().config.get("user_defined", "state") == "BY"
+
+def test_set_config_rejects_invalid_values(config_file):
+    timesheet = Timesheet()
+    assert not timesheet.set_config("storage", "csv")
+    assert not timesheet.set_config("state", "XX")
+    assert not timesheet.set_config("records_name", "x")
@@ -0,0 +1,55 @@
+import os
+import threading
+import pytest
+from datetime import datetime
+from azubi_timesheet.azubi_timesheet import main
+from azubi_timesheet.daemon import CachedTimesheet
+from azubi_timesheet.daemon import TimesheetServer
+from azubi_timesheet.daemon import request
+from azubi_timesheet.timesheet import Timesheet
+
+@pytest.fixture
+def daemon(tmp_path, configured):
+    """Runs the daemon in a thread, configured in the test's configuration file."""
+    socket_file = str(tmp_path / "timesheet.sock")
+    server = TimesheetServer(socket_file)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield socket_file
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+def add(day, comment):
+    main(["-n", "add", "-d", day, "-w", "08:00-16:30", "-b", "12:00-12:30", "-c", comment])
+
+def test_archive_while_serving(daemon):
+    add("10.01.2024", "before")
+    assert request(daemon, "query", date=datetime(2024, 1, 10))["comment"] == "before"
+    main(["archive", "--before", "02.2024"])
+    assert Timesheet().storage.archived(2024, 1)
+    add("11.01.2024", "after")
+    assert request(daemon, "query", date=datetime(2024, 1, 10))["comment"] == "before"
+    timesheet = Timesheet()
+    assert [record.comment for record in timesheet.storage.load(2024, 1)] == ["before", "after"]
+    timesheet.close()
+
+def test_cache_notices_replaced_month(configured, storage_name):
+    if storage_name != "json":
+        pytest.skip("replaces records files")
+    add("10.01.2024", "aaaa")
+    timesheet = CachedTimesheet()
+    storage = timesheet.storage
+    storage.compact(2024, 1)
+    assert [record.comment for record in storage.load(2024, 1)] == ["aaaa"]
+    # replaced atomically within one mtime tick, same size
+    location = storage.location(2024, 1)
+    stat = os.stat(location)
+    with open(location, encoding="utf-8") as f:
+        content = f.read().replace("aaaa", "bbbb")
+    with open(location + ".new", "w", encoding="utf-8") as f:
+        f.write(content)
+    os.utime(location + ".new", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(location + ".new", location)
+    assert [record.comment for record in storage.load(2024, 1)] == ["bbbb"]
+    timesheet.close()
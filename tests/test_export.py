@@ -0,0 +1,132 @@
+import io
+import os
+import pytest
+from datetime import datetime
+from azubi_timesheet.azubi_timesheet import main
+from azubi_timesheet.ledger import Ledger
+from azubi_timesheet.manifest import ExportManifest
+from azubi_timesheet.timesheet import PROGRAM_PATH
+from azubi_timesheet.timesheet import TimesheetError
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+openpyxl = pytest.importorskip("openpyxl")
+
+def add_days(timesheet, month, days):
+    for day in days:
+        timesheet.add_record(datetime(2024, month, day), WORK_HOURS, BREAK_TIME, "", False)
+
+def test_export_range(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8, 9, 10))
+    add_days(timesheet, 3, (4, 5))
+    exported = timesheet.export_range(datetime(2024, 1, 1), datetime(2024, 3, 1))
+    assert exported == [timesheet.export_location(2024, 1), timesheet.export_location(2024, 3)]
+    assert not os.path.exists(timesheet.export_location(2024, 2))
+    ledger = Ledger(timesheet.ledger_location())
+    assert sorted(ledger.entries) == ["2024-01", "2024-03"]
+    # February has no records and passes the carryover on unchanged
+    assert ledger.get(2024, 3)["carryover"] == ledger.closing(2024, 1)
+    wb = openpyxl.load_workbook(exported[1])
+    assert wb["Timesheet"].cell(row=8, column=10).value == ledger.closing(2024, 1)
+    assert wb["Logging"].cell(row=4, column=2).value == ledger.closing(2024, 3)
+
+def test_export_range_single_workbook(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8, 9))
+    add_days(timesheet, 2, (5,))
+    exported = timesheet.export_range(datetime(2024, 1, 1), datetime(2024, 3, 1), single_workbook=True)
+    assert len(exported) == 1
+    assert os.path.basename(exported[0]) == "timesheet_2024_01_to_2024_03.xlsx"
+    assert len(openpyxl.load_workbook(exported[0]).sheetnames) == 2
+    assert not os.path.exists(timesheet.export_location(2024, 1))
+
+def test_export_range_matches_single_exports(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8, 9, 10))
+    add_days(timesheet, 2, (5, 6))
+    timesheet.export_range(datetime(2024, 1, 1), datetime(2024, 2, 1))
+    ranged = Ledger(timesheet.ledger_location()).entries
+    os.remove(timesheet.ledger_location())
+    timesheet.export(datetime(2024, 1, 1))
+    timesheet.export(datetime(2024, 2, 1))
+    assert Ledger(timesheet.ledger_location()).entries == ranged
+
+def test_export_range_without_records(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8,))
+    with pytest.raises(TimesheetError):
+        timesheet.export_range(datetime(2024, 2, 1), datetime(2024, 4, 1))
+    with pytest.raises(ValueError):
+        timesheet.export_range(datetime(2024, 1, 1), datetime(2024, 1, 1), target=bytes)
+
+def test_records_beyond_template_rows(make_timesheet, german_locale):
+    timesheet = make_timesheet(templates_dir=os.path.join(PROGRAM_PATH, "data", "templates"))
+    # 23 weekdays, 21 workdays with one template row each
+    for day in range(1, 32):
+        if datetime(2019, 5, day).weekday() < 5:
+            timesheet.add_record(datetime(2019, 5, day), WORK_HOURS, BREAK_TIME, "", day in (1, 30))
+    assert timesheet.month_layout(timesheet.storage.load(2019, 5), 21) == (None, 23)
+    timesheet.export(datetime(2019, 5, 1))
+    wb = openpyxl.load_workbook(timesheet.export_location(2019, 5))
+    assert wb["Logging"].cell(row=4, column=2).value == 16.0
+    timesheet.delete_record(datetime(2019, 5, 1))
+    timesheet.delete_record(datetime(2019, 5, 30))
+    records = timesheet.storage.load(2019, 5)
+    assert timesheet.month_layout(records, 21) == (timesheet.template_location(21), 21)
+
+def test_export_targets(make_timesheet, tmp_path, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8, 9))
+    date = datetime(2024, 1, 1)
+    content = timesheet.export(date, target=bytes)
+    assert content[:2] == b"PK"
+    view = timesheet.export(date, target=memoryview)
+    assert isinstance(view, memoryview) and bytes(view[:2]) == b"PK"
+    stream = io.BytesIO()
+    assert timesheet.export(date, target=stream) is stream
+    assert stream.getvalue()[:2] == b"PK"
+    file = tmp_path / "elsewhere" / "january.xlsx"
+    assert timesheet.export(date, target=file) == str(file)
+    for exported in (io.BytesIO(content), io.BytesIO(view), io.BytesIO(stream.getvalue()), file):
+        wb = openpyxl.load_workbook(exported)
+        assert wb["Logging"].cell(row=4, column=2).value == -160.0
+    assert not os.path.exists(timesheet.export_location(2024, 1))
+    assert timesheet.export(date) is True
+    assert os.path.isfile(timesheet.export_location(2024, 1))
+
+def test_export_range_target(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8,))
+    add_days(timesheet, 2, (5,))
+    content, = timesheet.export_range(datetime(2024, 1, 1), datetime(2024, 2, 1), True, target=bytes)
+    assert len(openpyxl.load_workbook(io.BytesIO(content)).sheetnames) == 2
+    assert not os.path.exists(timesheet.export_location(2024, 1))
+
+def test_export_to_stdout(configured, capsysbinary, german_locale):
+    main(["-n", "add", "-d", "08.01.2024", "-w", "08:00-16:30", "-b", "12:00-12:30"])
+    main(["-n", "add", "-d", "05.02.2024", "-w", "08:00-16:30", "-b", "12:00-12:30"])
+    capsysbinary.readouterr()
+    main(["-n", "export", "-d", "08.01.2024", "--stdout"])
+    assert openpyxl.load_workbook(io.BytesIO(capsysbinary.readouterr().out)).sheetnames == ["Timesheet", "Logging"]
+    main(["-n", "export", "--from", "01.2024", "--to", "02.2024", "--single-workbook", "--stdout"])
+    assert len(openpyxl.load_workbook(io.BytesIO(capsysbinary.readouterr().out)).sheetnames) == 2
+
+def test_export_skips_unchanged_months(make_timesheet, german_locale):
+    timesheet = make_timesheet()
+    add_days(timesheet, 1, (8, 9))
+    manifest = ExportManifest(timesheet.manifest_location())
+    records = timesheet.storage.load(2024, 1)
+    def write(force=False):
+        return timesheet.write_export(manifest, datetime(2024, 1, 1), records, 22, None, 22, 0, -144.0, force)
+    assert write() == "written"
+    assert write() == "unchanged"
+    assert write(force=True) == "written"
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    records = timesheet.storage.load(2024, 1)
+    assert write() == "written"
+    # changed by someone else
+    with open(timesheet.export_location(2024, 1), "ab") as f:
+        f.write(b"\0")
+    assert write() == "written"
+    assert write() == "unchanged"
@@ -0,0 +1,41 @@
+import json
+import pytest
+from datetime import datetime
+from azubi_timesheet.azubi_timesheet import main
+from azubi_timesheet.timesheet import Timesheet
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def row(day, comment=""):
+    return {"date": day, "start_day": "08:00", "end_day": "16:30",
+            "start_break": "12:00", "end_break": "12:30", "comment": comment}
+
+def test_import_reports_conflicts(make_timesheet):
+    timesheet = make_timesheet()
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "existing", False)
+    conflicts = timesheet.import_records([row("10.01.2024", "imported"), row("11.01.2024", "first"),
+                                          row("11.01.2024", "twice"), row("05.02.2024")])
+    assert sorted((record.date, record.comment) for record in conflicts) == [
+        (datetime(2024, 1, 10), "imported"), (datetime(2024, 1, 11), "twice")]
+    storage = make_timesheet().storage
+    assert [record.comment for record in storage.load(2024, 1)] == ["existing", "first"]
+    assert [record.date for record in storage.load(2024, 2)] == [datetime(2024, 2, 5)]
+
+def test_import_rejects_invalid_records(make_timesheet):
+    timesheet = make_timesheet()
+    with pytest.raises(ValueError):
+        timesheet.import_records([row("11.01.2024"), row("2024-01-12")])
+    assert timesheet.storage.months() == []
+
+def test_import_command(configured, tmp_path, capsys):
+    records_file = tmp_path / "records.jsonl"
+    records_file.write_text("\n".join(json.dumps(row(day)) for day in ("10.01.2024", "11.01.2024")) + "\n")
+    assert main(["import", "-f", str(records_file)]) == 0
+    with pytest.raises(SystemExit) as exit:
+        main(["import", "-f", str(records_file)])
+    assert exit.value.code == 1
+    assert capsys.readouterr().err.splitlines() == ["Skipped record for 10.01.2024, date already exists.",
+                                                    "Skipped record for 11.01.2024, date already exists."]
+    timesheet = Timesheet()
+    assert len(timesheet.storage.load(2024, 1)) == 2
+    timesheet.close()
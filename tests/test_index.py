@@ -0,0 +1,86 @@
+import os
+import shutil
+from datetime import datetime
+from datetime import time
+from azubi_timesheet.index import RecordIndex
+from azubi_timesheet.index import words
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def days(records):
+    return [record.date.day for record in records]
+
+def fill(timesheet):
+    # fridays 04.10. and 01.11.2019, mondays 07.10. and 11.11.2019
+    timesheet.add_record(datetime(2019, 10, 4), WORK_HOURS, BREAK_TIME, "Projekt Alpha", False)
+    timesheet.add_record(datetime(2019, 10, 7), WORK_HOURS, BREAK_TIME, "Berufsschule", False)
+    timesheet.add_record(datetime(2019, 11, 1), WORK_HOURS, BREAK_TIME, "Urlaub", True)
+    timesheet.add_record(datetime(2019, 11, 11), (time(8, 0), time(18, 0)), BREAK_TIME, "projekt Beta", False)
+
+def test_words():
+    assert words("Projekt Alpha, projekt-beta!") == ["alpha", "beta", "projekt"]
+
+def test_filters(make_timesheet):
+    timesheet = make_timesheet()
+    fill(timesheet)
+    assert days(timesheet.query()) == [4, 7, 1, 11]
+    assert days(timesheet.query(words=["PROJEKT"])) == [4, 11]
+    assert days(timesheet.query(words=["projekt", "beta"])) == [11]
+    assert days(timesheet.query(contains="ojekt b")) == [11]
+    assert days(timesheet.query(contains="alpha beta")) == []
+    assert days(timesheet.query(weekdays={4})) == [4, 1]
+    assert days(timesheet.query(special=True)) == [1]
+    assert days(timesheet.query(special=False, min_hours=9)) == [11]
+    assert days(timesheet.query(max_hours=8)) == [4, 7, 1]
+    assert days(timesheet.query(start=datetime(2019, 10, 5), end=datetime(2019, 11, 10))) == [7, 1]
+
+def test_built_on_first_query_and_kept_up_to_date(make_timesheet):
+    timesheet = make_timesheet()
+    fill(timesheet)
+    assert not os.path.exists(timesheet.index_location())
+    timesheet.query()
+    index = RecordIndex(timesheet.index_location())
+    assert index.indexed() == [(2019, 10), (2019, 11)]
+    timesheet.update_record(datetime(2019, 10, 4), WORK_HOURS, BREAK_TIME, "Gamma", False)
+    timesheet.delete_record(datetime(2019, 10, 7))
+    timesheet.add_record(datetime(2019, 12, 2), WORK_HOURS, BREAK_TIME, "Delta", False)
+    index = RecordIndex(timesheet.index_location())
+    assert index.indexed() == [(2019, 10), (2019, 11), (2019, 12)]
+    assert index.load(2019, 10)["tokens"] == {"gamma": [datetime(2019, 10, 4).toordinal()]}
+    assert days(timesheet.query(words=["alpha"])) == []
+    assert days(timesheet.query(words=["gamma"])) == [4]
+    assert days(timesheet.query(words=["delta"])) == [2]
+
+def test_batch_keeps_index_up_to_date(make_timesheet):
+    timesheet = make_timesheet()
+    fill(timesheet)
+    timesheet.query()
+    with timesheet.batch():
+        timesheet.add_record(datetime(2019, 12, 2), WORK_HOURS, BREAK_TIME, "Delta", False)
+        timesheet.delete_record(datetime(2019, 11, 11))
+    index = RecordIndex(timesheet.index_location())
+    assert "beta" not in index.load(2019, 11)["tokens"]
+    assert "delta" in index.load(2019, 12)["tokens"]
+
+def test_months_changed_behind_its_back(make_timesheet, tmp_path):
+    timesheet = make_timesheet()
+    fill(timesheet)
+    timesheet.query()
+    # written while the index was somewhere else, e.g. by another installation
+    moved = str(tmp_path / "moved_index")
+    shutil.move(timesheet.index_location(), moved)
+    make_timesheet().add_record(datetime(2019, 11, 12), WORK_HOURS, BREAK_TIME, "Epsilon", False)
+    make_timesheet().delete_record(datetime(2019, 10, 4))
+    make_timesheet().delete_record(datetime(2019, 10, 7))
+    shutil.move(moved, timesheet.index_location())
+    assert days(timesheet.query(words=["epsilon"])) == [12]
+    assert days(timesheet.query(words=["alpha"])) == []
+    assert RecordIndex(timesheet.index_location()).indexed() == [(2019, 11)]
+
+def test_torn_month_file_is_indexed_again(make_timesheet):
+    timesheet = make_timesheet()
+    fill(timesheet)
+    timesheet.query()
+    with open(RecordIndex(timesheet.index_location()).location(2019, 10), "w") as f:
+        f.write('{"stamp": ')
+    assert days(timesheet.query(words=["alpha"])) == [4]
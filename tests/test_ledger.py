@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import pytest
+from datetime import datetime
+from datetime import time
+from azubi_timesheet.ledger import Ledger
+from azubi_timesheet.records import parse_minutes
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def add_months(timesheet, months):
+    for month in months:
+        timesheet.add_record(datetime(2024, month, 10), WORK_HOURS, BREAK_TIME, "", False)
+
+def test_rebuild(make_timesheet):
+    timesheet = make_timesheet()
+    add_months(timesheet, (1, 2, 4))
+    assert timesheet.rebuild_ledger() == 3
+    ledger = Ledger(timesheet.ledger_location())
+    assert sorted(ledger.entries) == ["2024-01", "2024-02", "2024-04"]
+    assert ledger.closing(2024, 4) == ledger.closing(2024, 2) + ledger.get(2024, 4)["balance"]
+
+def test_change_invalidates_later_months(make_timesheet):
+    timesheet = make_timesheet()
+    add_months(timesheet, (1, 2, 3))
+    timesheet.rebuild_ledger()
+    timesheet.add_record(datetime(2024, 2, 11), WORK_HOURS, BREAK_TIME, "", False)
+    assert sorted(Ledger(timesheet.ledger_location()).entries) == ["2024-01"]
+
+def test_change_while_computing_is_not_undone(make_timesheet):
+    exporter = make_timesheet()
+    add_months(exporter, (1, 2, 3))
+    exporter.rebuild_ledger()
+    exporter.invalidate_ledger(2024, 2)
+    # an export computing February and March from the January entry
+    ledger = Ledger(exporter.ledger_location())
+    exporter.carryover_hours(ledger, 2024, 3)
+    assert sorted(ledger.written) == ["2024-02", "2024-03"]
+    # meanwhile someone else changes March
+    make_timesheet().update_record(datetime(2024, 3, 10), (time(8, 0), time(18, 0)), BREAK_TIME, "", False)
+    exporter.save_ledger(ledger)
+    assert sorted(Ledger(exporter.ledger_location()).entries) == ["2024-01", "2024-02"]
+
+def test_dropped_base_entry_is_not_used(make_timesheet):
+    exporter = make_timesheet()
+    add_months(exporter, (1, 2, 3))
+    exporter.rebuild_ledger()
+    exporter.invalidate_ledger(2024, 3)
+    ledger = Ledger(exporter.ledger_location())
+    exporter.carryover_hours(ledger, 2024, 3)
+    # January changes after the export read its entry
+    make_timesheet().delete_record(datetime(2024, 1, 10))
+    exporter.save_ledger(ledger)
+    assert Ledger(exporter.ledger_location()).entries == {}
+
+def add_may_2019(timesheet):
+    """Records every weekday of May 2019, the holidays 1 and 30 May as special days."""
+    for day in range(1, 32):
+        date = datetime(2019, 5, day)
+        if date.weekday() < 5:
+            special = day in (1, 30)
+            timesheet.add_record(date, WORK_HOURS, BREAK_TIME, "", special)
+
+def test_export_and_rebuild_agree(make_timesheet, german_locale):
+    pytest.importorskip("openpyxl")
+    timesheet = make_timesheet()
+    add_may_2019(timesheet)
+    timesheet.export(datetime(2019, 5, 1))
+    exported = Ledger(timesheet.ledger_location()).get(2019, 5)
+    timesheet.rebuild_ledger()
+    assert Ledger(timesheet.ledger_location()).get(2019, 5) == exported
+    # 23 records of 8 hours, 21 workdays
+    assert exported["balance"] == 16.0
+
+def edit_by_hand(timesheet, storage_name, date, end_day):
+    """Change the end of a workday without going through the timesheet."""
+    storage = timesheet.storage
+    if storage_name == "json":
+        storage.compact(date.year, date.month)
+        location = storage.location(date.year, date.month)
+        with open(location, encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            if record["date"] == date.strftime("%d.%m.%Y"):
+                record["end_day"] = end_day
+        with open(location, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+    else:
+        connection = sqlite3.connect(storage.location())
+        with connection:
+            connection.execute("UPDATE records SET end_day = ? WHERE date = ?",
+                               (parse_minutes(end_day), date.toordinal()))
+        connection.close()
+
+def test_records_changed_by_hand(make_timesheet, storage_name):
+    timesheet = make_timesheet()
+    add_months(timesheet, (1, 2, 3))
+    timesheet.rebuild_ledger()
+    before = Ledger(timesheet.ledger_location())
+    edit_by_hand(timesheet, storage_name, datetime(2024, 1, 10), "18:30")
+    ledger = Ledger(timesheet.ledger_location())
+    assert timesheet.carryover_hours(ledger, 2024, 2) == before.closing(2024, 2) + 2
+    timesheet.save_ledger(ledger)
+    after = Ledger(timesheet.ledger_location())
+    assert after.closing(2024, 1) == before.closing(2024, 1) + 2
+    assert after.closing(2024, 2) == before.closing(2024, 2) + 2
+    # computed from the old January, dropped
+    assert "2024-03" not in after.entries
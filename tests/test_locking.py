@@ -0,0 +1,135 @@
+import os
+import threading
+import multiprocessing
+import pytest
+from datetime import datetime
+from datetime import timedelta
+from azubi_timesheet.manifest import ExportManifest
+from azubi_timesheet.storage import file_lock
+from azubi_timesheet.timesheet import Timesheet
+from azubi_timesheet.timesheet import TimesheetError
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def run_threads(*targets):
+    start = threading.Barrier(len(targets))
+    def run(target):
+        start.wait()
+        target()
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_adds_while_archiving(make_timesheet):
+    make_timesheet().add_record(datetime(2024, 1, 1), WORK_HOURS, BREAK_TIME, "", False)
+    writer, archiver = make_timesheet(), make_timesheet()
+    def add():
+        for day in range(2, 32):
+            assert writer.add_record(datetime(2024, 1, day), WORK_HOURS, BREAK_TIME, "", False)
+        writer.close()
+    def archive():
+        for _ in range(30):
+            archiver.archive_records(datetime(2024, 2, 1))
+        archiver.close()
+    run_threads(add, archive)
+    assert len(make_timesheet().storage.load(2024, 1)) == 31
+
+def test_adds_while_migrating(make_timesheet, storage_name):
+    if storage_name != "json":
+        pytest.skip("migrates records files only")
+    make_timesheet().add_record(datetime(2024, 1, 1), WORK_HOURS, BREAK_TIME, "", False)
+    writer, migrator = make_timesheet(), make_timesheet()
+    def add():
+        for day in range(2, 32):
+            assert writer.add_record(datetime(2024, 1, day), WORK_HOURS, BREAK_TIME, "", False)
+    def migrate():
+        migrator.migrate_records()
+    run_threads(add, migrate)
+    json_records = len(make_timesheet().storage.load(2024, 1))
+    sqlite_records = len(make_timesheet(storage="sqlite").storage.load(2024, 1))
+    assert json_records + sqlite_records == 31
+
+def take_lock(file):
+    with file_lock(file):
+        pass
+
+def test_forked_child_does_not_keep_locks(tmp_path):
+    lock_file = str(tmp_path / "month.lock")
+    with file_lock(lock_file):
+        child = multiprocessing.get_context("fork").Process(target=take_lock, args=(lock_file,))
+        child.start()
+    child.join(10)
+    if child.exitcode is None:
+        child.kill()
+    assert child.exitcode == 0
+
+def add_records(config, days, start):
+    start.wait()
+    timesheet = Timesheet(**config)
+    for day in days:
+        timesheet.add_record(day, WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.close()
+
+@pytest.mark.parametrize("locking", ["lock", "optimistic"])
+def test_processes_adding_to_the_same_months(tmp_path, storage_name, locking):
+    config = {"records_dir": str(tmp_path / "records"), "exports_dir": str(tmp_path / "exports"),
+              "storage": storage_name, "locking": locking}
+    days = [datetime(2024, 1, 1) + timedelta(days=day) for day in range(4 * 15)]
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    workers = [context.Process(target=add_records, args=(config, days[number::4], start))
+               for number in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0] * 4
+    timesheet = Timesheet(**config)
+    try:
+        stored = [record.date for month in (1, 2, 3) for record in timesheet.storage.load(2024, month)]
+    finally:
+        timesheet.close()
+    assert stored == days
+
+def test_manifests_saved_at_once_keep_each_others_entries(tmp_path):
+    file = str(tmp_path / "timesheet_exports.json")
+    ExportManifest(file).save()
+    manifests = [ExportManifest(file) for _ in range(12)]
+    for month, manifest in enumerate(manifests, 1):
+        manifest.update(2024, month, "digest {}".format(month), str(tmp_path / "missing.xlsx"))
+    run_threads(*(manifest.save for manifest in manifests))
+    entries = ExportManifest(file).entries
+    assert sorted(entries) == ["2024-{:02d}".format(month) for month in range(1, 13)]
+    assert entries["2024-03"]["digest"] == "digest 3"
+
+def test_batch_keeps_changes_of_others(make_timesheet):
+    writer, other = make_timesheet(), make_timesheet()
+    for day in (1, 5, 6):
+        writer.add_record(datetime(2024, 10, day), WORK_HOURS, BREAK_TIME, "before", False)
+    with pytest.raises(TimesheetError) as error:
+        with writer.batch():
+            assert writer.add_record(datetime(2024, 10, 2), WORK_HOURS, BREAK_TIME, "from batch", False)
+            assert writer.add_record(datetime(2024, 10, 4), WORK_HOURS, BREAK_TIME, "from batch", False)
+            assert writer.update_record(datetime(2024, 10, 1), WORK_HOURS, BREAK_TIME, "from batch", False)
+            assert writer.delete_record(datetime(2024, 10, 5))
+            assert writer.update_record(datetime(2024, 10, 6), WORK_HOURS, BREAK_TIME, "from batch", False)
+            # another writer changes the month meanwhile
+            assert other.add_record(datetime(2024, 10, 2), WORK_HOURS, BREAK_TIME, "from other", False)
+            assert other.add_record(datetime(2024, 10, 3), WORK_HOURS, BREAK_TIME, "from other", False)
+            assert other.update_record(datetime(2024, 10, 5), WORK_HOURS, BREAK_TIME, "from other", False)
+            assert other.delete_record(datetime(2024, 10, 6))
+    assert "02.10.2024, 05.10.2024, 06.10.2024" in str(error.value)
+    stored = [(record.date.day, record.comment) for record in make_timesheet().storage.load(2024, 10)]
+    assert stored == [(1, "from batch"), (2, "from other"), (3, "from other"), (4, "from batch"), (5, "from other")]
+
+def test_lock_files_kept_out_of_records_dir(make_timesheet):
+    timesheet = make_timesheet()
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.archive_records(datetime(2024, 2, 1))
+    timesheet.add_record(datetime(2024, 2, 10), WORK_HOURS, BREAK_TIME, "", False)
+    records_dir = timesheet.config.get("user_defined", "records_dir")
+    assert not [name for name in os.listdir(records_dir) if name.endswith(".lock")]
+    assert os.listdir(os.path.join(records_dir, "timesheet_locks"))
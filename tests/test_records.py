@@ -0,0 +1,44 @@
+import pytest
+from datetime import date
+from datetime import datetime
+from azubi_timesheet.records import Record
+from azubi_timesheet.records import RecordStore
+from azubi_timesheet.records import format_minutes
+from azubi_timesheet.records import parse_minutes
+
+def test_record_from_and_to_dict():
+    content = {"date": "10.01.2024", "start_day": "08:00", "end_day": "16:30",
+               "start_break": "12:00", "end_break": "12:30", "comment": "Schule", "special": "False"}
+    record = Record.from_dict(content)
+    assert record == Record(date(2024, 1, 10).toordinal(), 480, 990, 720, 750, "Schule", False)
+    assert record.date == datetime(2024, 1, 10)
+    assert record.break_minutes == 30
+    assert record.work_minutes == 480
+    assert record.to_dict() == content
+
+def test_record_defaults():
+    record = Record.from_dict({"date": " 11.01.2024 ", "start_day": "", "special": "true"})
+    assert (record.start_day, record.end_day, record.comment, record.special) == (0, 0, "", True)
+    assert record.work_minutes == 8 * 60
+    with pytest.raises(ValueError):
+        Record.from_dict({"date": "2024-01-11"})
+
+def test_minutes():
+    assert parse_minutes("07:45") == 465
+    assert parse_minutes(None) == 0
+    assert format_minutes(465) == "07:45"
+
+def test_record_store():
+    days = [date(2024, 1, day) for day in (20, 3, 11)]
+    store = RecordStore(Record(day.toordinal(), comment=str(day.day)) for day in days)
+    assert len(store) == 3
+    assert [record.date.day for record in store] == [3, 11, 20]
+    assert date(2024, 1, 11) in store
+    assert datetime(2024, 1, 11) in store
+    assert store.get(date(2024, 1, 12)) is None
+    store.put(Record(date(2024, 1, 11).toordinal(), comment="replaced"))
+    store.put(Record(date(2024, 1, 1).toordinal()))
+    assert [record.comment for record in store] == ["", "3", "replaced", "20"]
+    assert store.pop(date(2024, 1, 3)).comment == "3"
+    assert store.pop(date(2024, 1, 3)) is None
+    assert [entry["date"] for entry in store.to_list()] == ["01.01.2024", "11.01.2024", "20.01.2024"]
@@ -0,0 +1,65 @@
+import json
+import pytest
+from datetime import datetime
+from datetime import time
+from azubi_timesheet import report as report_module
+from azubi_timesheet.azubi_timesheet import main
+from azubi_timesheet.report import report
+from azubi_timesheet.timesheet import Timesheet
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def add_records(timesheet):
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.add_record(datetime(2024, 1, 11), (time(8, 0), time(18, 0)), BREAK_TIME, "", False)
+    timesheet.add_record(datetime(2024, 1, 12), WORK_HOURS, BREAK_TIME, "Urlaub", True)
+    timesheet.add_record(datetime(2024, 2, 5), WORK_HOURS, BREAK_TIME, "", False)
+    # outside the reported range
+    timesheet.add_record(datetime(2024, 1, 9), WORK_HOURS, BREAK_TIME, "", False)
+
+@pytest.fixture(params=["numpy", "arrays"])
+def summing(request, monkeypatch):
+    """Runs a test summing up with NumPy, if installed, and with plain arrays."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(report_module, "numpy", None)
+    return request.param
+
+def test_report_by_month(make_timesheet, summing):
+    timesheet = make_timesheet()
+    add_records(timesheet)
+    rows = report(timesheet, datetime(2024, 1, 10), datetime(2024, 2, 29))
+    assert [(row["period"], row["from"], row["to"]) for row in rows] == [
+        ("2024-01", "10.01.2024", "31.01.2024"), ("2024-02", "01.02.2024", "29.02.2024")]
+    january, february = rows
+    assert (january["workdays"], january["records"], january["special_days"]) == (16, 3, 1)
+    assert (january["worked_hours"], january["break_hours"], january["expected_hours"]) == (25.5, 1.0, 128)
+    assert (january["overtime_hours"], january["balance_hours"]) == (-102.5, -102.5)
+    assert (february["workdays"], february["records"], february["worked_hours"]) == (21, 1, 8.0)
+    assert (february["overtime_hours"], february["balance_hours"]) == (-160.0, -262.5)
+
+def test_report_by_week_and_year(make_timesheet, summing):
+    timesheet = make_timesheet()
+    add_records(timesheet)
+    weeks = report(timesheet, datetime(2024, 1, 10), datetime(2024, 1, 21), "week")
+    assert [(row["period"], row["records"], row["worked_hours"]) for row in weeks] == [
+        ("2024-W02", 3, 25.5), ("2024-W03", 0, 0.0)]
+    years = report(timesheet, datetime(2023, 12, 1), datetime(2024, 12, 31), "year")
+    assert [(row["period"], row["records"]) for row in years] == [("2023", 0), ("2024", 5)]
+
+def test_report_reads_archives(make_timesheet, summing):
+    timesheet = make_timesheet()
+    add_records(timesheet)
+    before = report(timesheet, datetime(2024, 1, 1), datetime(2024, 2, 29))
+    timesheet.archive_records(datetime(2024, 2, 1))
+    assert timesheet.storage.archived(2024, 1)
+    assert report(timesheet, datetime(2024, 1, 1), datetime(2024, 2, 29)) == before
+
+def test_report_command(configured, capsys):
+    timesheet = Timesheet()
+    add_records(timesheet)
+    timesheet.close()
+    main(["-n", "report", "--from", "10.01.2024", "--to", "29.02.2024", "--format", "json"])
+    rows = json.loads(capsys.readouterr().out)
+    assert [row["balance_hours"] for row in rows] == [-102.5, -262.5]
@@ -0,0 +1,67 @@
+import os
+import pytest
+import sqlite3
+from datetime import datetime
+from datetime import time
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+def test_version_changes_with_every_write(make_timesheet):
+    timesheet = make_timesheet()
+    storage = timesheet.storage
+    empty = storage.version(2024, 1)
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    added = storage.version(2024, 1)
+    assert added != empty
+    storage.load(2024, 1)
+    assert storage.version(2024, 1) == added
+    timesheet.update_record(datetime(2024, 1, 10), (time(8, 0), time(17, 0)), BREAK_TIME, "", False)
+    updated = storage.version(2024, 1)
+    assert updated != added
+    timesheet.add_record(datetime(2024, 2, 10), WORK_HOURS, BREAK_TIME, "", False)
+    assert storage.version(2024, 1) == updated
+
+def test_journal_replay(make_timesheet, storage_name):
+    if storage_name != "json":
+        pytest.skip("journals belong to the JSON storage")
+    timesheet = make_timesheet()
+    storage = timesheet.storage
+    for day in (10, 11, 12):
+        timesheet.add_record(datetime(2024, 1, day), WORK_HOURS, BREAK_TIME, str(day), False)
+    timesheet.update_record(datetime(2024, 1, 11), WORK_HOURS, BREAK_TIME, "changed", False)
+    timesheet.delete_record(datetime(2024, 1, 12))
+    journal = storage.journal_location(2024, 1)
+    assert os.path.isfile(journal)
+    # a crash while appending leaves a torn line
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "date": "13.01')
+    timesheet.add_record(datetime(2024, 1, 14), WORK_HOURS, BREAK_TIME, "14", False)
+    comments = [record.comment for record in make_timesheet().storage.load(2024, 1)]
+    assert comments == ["10", "changed", "14"]
+    storage.compact(2024, 1)
+    assert not os.path.isfile(journal)
+    assert [record.comment for record in storage.load(2024, 1)] == comments
+
+def test_sqlite_months_table(make_timesheet, storage_name):
+    if storage_name != "sqlite":
+        pytest.skip("the months table belongs to the SQLite storage")
+    timesheet = make_timesheet()
+    for month in (1, 2, 3):
+        timesheet.add_record(datetime(2024, month, 10), WORK_HOURS, BREAK_TIME, "", False)
+    timesheet.add_record(datetime(2024, 2, 29), WORK_HOURS, BREAK_TIME, "", False)
+    location = timesheet.storage.location()
+    timesheet.close()
+    connection = sqlite3.connect(location)
+    with connection:
+        # a replaced record fires no delete trigger
+        connection.execute("INSERT OR REPLACE INTO records SELECT * FROM records WHERE date = ?",
+                           (datetime(2024, 3, 10).toordinal(),))
+        connection.execute("DELETE FROM records WHERE date = ?", (datetime(2024, 2, 10).toordinal(),))
+        connection.execute("UPDATE records SET date = ? WHERE date = ?",
+                           (datetime(2024, 4, 1).toordinal(), datetime(2024, 1, 10).toordinal()))
+    assert make_timesheet().storage.months() == [(2024, 2), (2024, 3), (2024, 4)]
+    # written before the table existed
+    with connection:
+        connection.execute("DROP TABLE months")
+    connection.close()
+    assert make_timesheet().storage.months() == [(2024, 2), (2024, 3), (2024, 4)]
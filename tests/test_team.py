@@ -0,0 +1,47 @@
+import json
+import os
+import pytest
+from datetime import datetime
+from azubi_timesheet.azubi_timesheet import main
+from azubi_timesheet.team import team_export
+from azubi_timesheet.timesheet import Timesheet
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+pytest.importorskip("openpyxl")
+
+@pytest.fixture
+def roster(tmp_path):
+    """Two trainees with records in January 2024 and one without any."""
+    entries = []
+    for name, days in (("Anna", (8, 9)), ("Ben", ()), ("Cem", (10,))):
+        entry = {"name": name,
+                 "records_dir": str(tmp_path / name / "records"),
+                 "exports_dir": str(tmp_path / name / "exports")}
+        timesheet = Timesheet(records_dir=entry["records_dir"], exports_dir=entry["exports_dir"])
+        for day in days:
+            timesheet.add_record(datetime(2024, 1, day), WORK_HOURS, BREAK_TIME, "", False)
+        timesheet.close()
+        entries.append(entry)
+    return entries
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_team_export(roster, workers, german_locale):
+    results = team_export(roster + [{"name": "Dora"}], datetime(2024, 1, 1), workers=workers)
+    assert [(result["name"], result["success"]) for result in results] == [
+        ("Anna", True), ("Ben", False), ("Cem", True), ("Dora", False)]
+    assert results[0]["files"] == [os.path.join(roster[0]["exports_dir"], "timesheet_2024_01.xlsx")]
+    assert os.path.isfile(results[0]["files"][0])
+    assert results[1]["error"].startswith("TimesheetError: There are no records")
+    assert results[3]["error"] == "KeyError: 'records_dir'"
+    assert all(result["seconds"] >= 0 for result in results)
+
+def test_team_export_command(roster, tmp_path, capsys, german_locale):
+    roster_file = tmp_path / "roster.jsonl"
+    roster_file.write_text("".join(json.dumps(entry) + "\n" for entry in roster))
+    with pytest.raises(SystemExit) as exit:
+        main(["team-export", "-r", str(roster_file), "--from", "01.2024", "-j", "1"])
+    assert exit.value.code == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[:2] for line in lines[:3]] == [["Anna", "ok"], ["Ben", "FAILED"], ["Cem", "ok"]]
+    assert lines[3] == "2 exported, 1 failed"
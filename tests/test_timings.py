@@ -0,0 +1,78 @@
+import io
+import os
+import threading
+import pytest
+from datetime import datetime
+from azubi_timesheet import timings
+from azubi_timesheet.azubi_timesheet import main
+from .conftest import BREAK_TIME
+from .conftest import WORK_HOURS
+
+@pytest.fixture
+def spans():
+    """Collects the finished spans while the test runs."""
+    collected = []
+    hook = lambda name, seconds, attributes: collected.append((name, attributes))
+    timings.add_hook(hook)
+    yield collected
+    timings.remove_hook(hook)
+
+@timings.timed("outer")
+def outer():
+    with timings.span("inner", month=1):
+        pass
+    with timings.span("inner", month=2):
+        pass
+
+def test_nested_spans(spans):
+    outer()
+    assert spans == [("outer.inner", {"month": 1}), ("outer.inner", {"month": 2}), ("outer", {})]
+
+def test_spans_without_hooks():
+    assert not timings.active()
+    outer()
+    with timings.span("anything"):
+        pass
+
+def test_spans_of_threads_are_apart(spans):
+    with timings.span("main"):
+        thread = threading.Thread(target=outer)
+        thread.start()
+        thread.join()
+    assert [name for name, _ in spans] == ["outer.inner", "outer.inner", "outer", "main"]
+
+def test_write_timings():
+    collected = timings.Timings()
+    collected("export", 0.5, {})
+    collected("export.save", 0.25, {})
+    collected("export.save", 0.125, {})
+    out = io.StringIO()
+    collected.write(out)
+    lines = [line.split() for line in out.getvalue().splitlines()]
+    assert lines == [["phase", "calls", "ms", "share"],
+                     ["export", "1", "500.0", "100.0%"],
+                     ["save", "2", "375.0", "75.0%"],
+                     ["total", "500.0"]]
+
+def test_export_phases(make_timesheet, spans, german_locale):
+    pytest.importorskip("openpyxl")
+    timesheet = make_timesheet()
+    timesheet.add_record(datetime(2024, 1, 10), WORK_HOURS, BREAK_TIME, "", False)
+    del spans[:]
+    timesheet.export(datetime(2024, 1, 1))
+    names = [name for name, _ in spans]
+    for phase in ("export.load_records", "export.carryover", "export.workbook.build",
+                  "export.save", "export.ledger", "export"):
+        assert phase in names
+    assert names[-1] == "export"
+    assert ("export.load_records", {"year": 2024, "month": 1}) in spans
+
+def test_timings_and_profile_options(configured, tmp_path, capsys):
+    profile = str(tmp_path / "add.prof")
+    main(["-n", "--timings", "--profile", profile, "add", "-d", "10.01.2024",
+          "-w", "08:00-16:30", "-b", "12:00-12:30"])
+    err = capsys.readouterr().err
+    assert err.splitlines()[0].split() == ["phase", "calls", "ms", "share"]
+    assert "write_records" in err
+    assert os.path.getsize(profile) > 0
+    assert not timings.active()
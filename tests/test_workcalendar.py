@@ -0,0 +1,52 @@
+import random
+import pytest
+from datetime import date
+from datetime import timedelta
+from azubi_timesheet.timesheet import Timesheet
+from azubi_timesheet.workcalendar import WorkCalendar
+from azubi_timesheet.workcalendar import easter_sunday
+from azubi_timesheet.workcalendar import holidays
+
+@pytest.mark.parametrize("day", [date(1818, 3, 22), date(1943, 4, 25), date(2000, 4, 23),
+                                 date(2019, 4, 21), date(2024, 3, 31), date(2025, 4, 20),
+                                 date(2038, 4, 25)])
+def test_easter_sunday(day):
+    assert easter_sunday(day.year) == day
+
+def test_holidays_of_state():
+    federal = holidays(2024)
+    assert federal[date(2024, 3, 29)] == "Karfreitag"
+    assert federal[date(2024, 4, 1)] == "Ostermontag"
+    assert date(2024, 11, 1) not in federal
+    bavarian = holidays(2024, "BY")
+    assert bavarian[date(2024, 11, 1)] == "Allerheiligen"
+    assert holidays(2024, "SN")[date(2024, 11, 20)] == "Buß- und Bettag"
+
+def test_unknown_state():
+    with pytest.raises(ValueError):
+        WorkCalendar("XX")
+
+@pytest.mark.parametrize("state", ["", "BY", "SN"])
+def test_workdays_match_netto_workdays(tmp_path, state):
+    timesheet = Timesheet(records_dir=str(tmp_path / "records"), exports_dir=str(tmp_path / "exports"))
+    calendar = WorkCalendar(state)
+    generator = random.Random(state)
+    first = date(2000, 1, 1).toordinal()
+    try:
+        for _ in range(500):
+            start = date.fromordinal(first + generator.randrange(40 * 365))
+            end = start + timedelta(days=generator.randrange(800))
+            days_off = [day for year in range(start.year, end.year + 1)
+                        for day in holidays(year, state) if start <= day <= end]
+            assert calendar.workdays(start, end) == timesheet.netto_workdays(start, end, days_off,
+                                                                            weekend_days=(5, 6))
+    finally:
+        timesheet.close()
+
+def test_month_workdays():
+    calendar = WorkCalendar("BY")
+    # 23 weekdays, new year and epiphany
+    assert calendar.month_workdays(2025, 1) == 21
+    assert calendar.month_workdays(2024, 12) == 20
+    assert not calendar.is_workday(date(2025, 1, 6))
+    assert calendar.is_workday(date(2025, 1, 7))